@@ -0,0 +1,178 @@
+# admission.py
+"""
+Admission control for the FastAPI `/query` routes.
+
+Every query is classified into a route class (``research``, ``image`` or
+``text``) with the same local heuristics the agents use, and each class has its
+own limits:
+
+- at most ``ADMISSION_<ROUTE>_MAX_CONCURRENCY`` queries are forwarded to the
+  manager at once,
+- at most ``ADMISSION_<ROUTE>_MAX_QUEUE`` more wait for a slot, for at most
+  ``ADMISSION_MAX_QUEUE_TIME`` seconds.
+
+A query arriving at a full queue is rejected at once with ``429``; one that
+waited too long is rejected with ``503``. Both carry a ``Retry-After`` estimated
+from the recent service time of the route, so clients back off instead of piling
+more work onto an overloaded Gemini quota, and the queries that are admitted
+keep a flat latency.
+"""
+
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from agent.metrics import REGISTRY
+from routing import LocalRouter, is_research_query
+
+ADMISSION_MAX_QUEUE_TIME = float(os.getenv("ADMISSION_MAX_QUEUE_TIME", "10"))
+
+# (max concurrency, max queue) per route class
+DEFAULT_LIMITS = {
+    "research": (8, 32),
+    "image": (4, 16),
+    "text": (32, 64),
+}
+
+IN_FLIGHT = REGISTRY.gauge(
+    "admission_in_flight_requests",
+    "Queries admitted and being processed, per route class.",
+    ["route"],
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "admission_queue_depth",
+    "Queries waiting for an admission slot, per route class.",
+    ["route"],
+)
+QUEUE_SECONDS = REGISTRY.histogram(
+    "admission_queue_seconds",
+    "Time admitted queries waited for a slot.",
+    ["route"],
+)
+REJECTIONS = REGISTRY.counter(
+    "admission_rejections_total",
+    "Queries rejected by admission control.",
+    ["route", "reason"],
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a query is not admitted.
+
+    Attributes:
+        status_code: ``429`` when the queue is full, ``503`` when the wait timed out.
+        retry_after: Suggested seconds before retrying.
+    """
+
+    def __init__(self, route: str, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.route = route
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class RouteLimiter:
+    """Bounded concurrency plus a bounded, time-limited wait queue for one route.
+
+    Args:
+        route: Name of the route class, used in metrics and errors.
+        max_concurrency: Queries processed at the same time.
+        max_queue: Queries allowed to wait for a slot.
+        max_queue_time: Seconds a query may wait before it is rejected.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        max_concurrency: int,
+        max_queue: int,
+        max_queue_time: float = ADMISSION_MAX_QUEUE_TIME,
+    ):
+        self.route = route
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        # Moving average of the time a query holds a slot, for Retry-After
+        self.service_time = 1.0
+
+    def retry_after(self) -> int:
+        """Estimate the seconds until a new query would get a slot."""
+        backlog = (self.waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(backlog * self.service_time))
+
+    def _reject(self, status_code: int, reason: str, detail: str):
+        REJECTIONS.inc(route=self.route, reason=reason)
+        return AdmissionRejected(self.route, status_code, self.retry_after(), detail)
+
+    async def acquire(self) -> None:
+        """Wait for a slot, raising `AdmissionRejected` if none is available in time."""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            raise self._reject(
+                429, "queue_full", f"Too many {self.route} queries, try again later."
+            )
+        self.waiting += 1
+        QUEUE_DEPTH.inc(route=self.route)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.max_queue_time)
+        except asyncio.TimeoutError:
+            raise self._reject(
+                503, "queue_timeout", f"The {self.route} queue is overloaded."
+            ) from None
+        finally:
+            self.waiting -= 1
+            QUEUE_DEPTH.inc(-1, route=self.route)
+        QUEUE_SECONDS.observe(time.monotonic() - started, route=self.route)
+        self.in_flight += 1
+        IN_FLIGHT.inc(route=self.route)
+
+    def release(self, held: float) -> None:
+        """Free a slot held for `held` seconds."""
+        self.service_time = 0.8 * self.service_time + 0.2 * held
+        self.in_flight -= 1
+        IN_FLIGHT.inc(-1, route=self.route)
+        self._slots.release()
+
+
+class AdmissionController:
+    """Classifies queries and applies the limits of their route class."""
+
+    def __init__(self, limits: dict[str, tuple[int, int]] = DEFAULT_LIMITS):
+        self.router = LocalRouter()
+        self.limiters = {}
+        for route, (max_concurrency, max_queue) in limits.items():
+            prefix = f"ADMISSION_{route.upper()}"
+            self.limiters[route] = RouteLimiter(
+                route,
+                int(os.getenv(f"{prefix}_MAX_CONCURRENCY", max_concurrency)),
+                int(os.getenv(f"{prefix}_MAX_QUEUE", max_queue)),
+            )
+
+    def classify(self, text: str) -> str:
+        """Return the route class of a query: ``image``, ``research`` or ``text``."""
+        # Ambiguous queries are routed by the manager's LLM; treat them by keywords
+        if self.router.classify(text) == "image_agent":
+            return "image"
+        return "research" if is_research_query(text) else "text"
+
+    async def acquire(self, text: str) -> RouteLimiter:
+        """Admit a query, returning the limiter whose slot it now holds."""
+        limiter = self.limiters[self.classify(text)]
+        await limiter.acquire()
+        return limiter
+
+    @asynccontextmanager
+    async def admit(self, text: str):
+        """Hold an admission slot for a query for the duration of the block."""
+        limiter = await self.acquire(text)
+        started = time.monotonic()
+        try:
+            yield limiter
+        finally:
+            limiter.release(time.monotonic() - started)
@@ -0,0 +1,120 @@
+# agent_server.py
+import asyncio
+import json
+import os
+import queue
+import threading
+
+from flask import Response, request
+from python_a2a import Message
+from python_a2a.server.http import create_flask_app
+
+# Seconds a stream may stay silent before it is closed with an error event
+STREAM_IDLE_TIMEOUT = float(os.getenv("STREAM_IDLE_TIMEOUT", "300"))
+
+_END = object()
+
+
+def _running_on(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def bind_to_loop(agent, loop: asyncio.AbstractEventLoop) -> None:
+    """Make an agent's async `handle_message` callable from python_a2a's Flask server.
+
+    The Flask routes (and the task routes of `A2AServer`, which call
+    `self.handle_message` internally) run in worker threads and expect a `Message`
+    back. The handler is replaced on the instance by a version that runs the
+    original coroutine on `loop`, so the agent's semaphores, caches and async
+    Gemini clients always live on one long-lived event loop.
+    """
+    handle_message = agent.handle_message
+
+    def handle_message_on_loop(message):
+        result = handle_message(message)
+        # Calls from the agent's own coroutines (on `loop`) still get an awaitable
+        if asyncio.iscoroutine(result) and not _running_on(loop):
+            return asyncio.run_coroutine_threadsafe(result, loop).result()
+        return result
+
+    agent.handle_message = handle_message_on_loop
+
+
+def stream_view(agent, loop: asyncio.AbstractEventLoop):
+    """Flask view streaming `agent.stream_response` as server-sent events.
+
+    Replaces python_a2a's `/stream` handler, which runs every stream on its own
+    event loop, stops reading once the agent's generator has finished (dropping
+    chunks still queued) and cuts streams off after 60 seconds. Here the whole
+    stream runs as one task on `loop` and every chunk is delivered, in the same
+    event format the python_a2a client expects.
+    """
+
+    def handle_streaming_request():
+        data = request.get_json()
+        if "message" in data and isinstance(data["message"], dict):
+            data = data["message"]
+        message = Message.from_dict(data)
+        chunks: queue.Queue = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in agent.stream_response(message):
+                    chunks.put(chunk)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(_END)
+
+        def generate():
+            future = asyncio.run_coroutine_threadsafe(pump(), loop)
+            index = 0
+            try:
+                yield ": SSE stream established\n\n"
+                while True:
+                    try:
+                        chunk = chunks.get(timeout=STREAM_IDLE_TIMEOUT)
+                    except queue.Empty:
+                        chunk = TimeoutError("Streaming timed out")
+                    if isinstance(chunk, Exception):
+                        error = {"error": str(chunk)}
+                        yield f"event: error\ndata: {json.dumps(error)}\n\n"
+                        return
+                    if chunk is _END:
+                        last = {"content": "", "index": index, "append": True}
+                        last["lastChunk"] = True
+                        yield f"data: {json.dumps(last)}\n\n"
+                        return
+                    event = {"content": chunk, "index": index, "append": True}
+                    yield f"data: {json.dumps(event)}\n\n"
+                    index += 1
+            finally:
+                # Stop the agent's work when the client goes away early
+                future.cancel()
+
+        response = Response(generate(), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    return handle_streaming_request
+
+
+def run_agent_server(agent, host: str, port: int) -> None:
+    """Serve an A2A agent whose handlers are coroutines (blocks until shutdown).
+
+    Args:
+        agent: The A2AServer instance.
+        host: Host to bind to.
+        port: Port to listen on.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+    bind_to_loop(agent, loop)
+    app = create_flask_app(agent)
+    app.view_functions["handle_streaming_request"] = stream_view(agent, loop)
+    print(f"Starting A2A server on http://{host}:{port}/a2a")
+    app.run(host=host, port=port, threaded=True)
@@ -1,3 +1,15 @@
-from agent.graph import graph
+__all__ = ["graph", "durable_graph"]
 
-__all__ = ["graph"]
+
+def __getattr__(name):
+    # Build the graph lazily so helper modules such as `agent.clients` can be
+    # imported by the A2A agents without requiring the research graph's setup.
+    if name in ("graph", "durable_graph"):
+        import importlib
+
+        graph_module = importlib.import_module("agent.graph")
+        # Importing the submodule bound `agent.graph` to it; rebind to the graph
+        globals()["graph"] = graph_module.graph
+        globals()["durable_graph"] = graph_module.durable_graph
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,89 @@
+import math
+import time
+from typing import Optional
+
+from agent.configuration import Configuration
+from agent.instrumentation import NODE_SECONDS
+from agent.prompts import web_searcher_instructions
+from agent.rate_limit import GEMINI_OUTPUT_TOKENS, estimate_tokens
+
+# Time and token budgets of one research run. Callers may pass an absolute
+# `deadline` (UNIX time) and a `token_budget` in the graph input; the nodes use
+# them to size the search fan-out, to decide whether another loop fits and to
+# keep `answer_reserve_seconds` / `answer_reserve_tokens` for finalize_answer.
+# Step durations are estimated from the node timings this process has observed,
+# falling back to the defaults below until there is history.
+DEFAULT_STEP_SECONDS = {"web_research": 8.0, "reflection": 6.0}
+# A search costs its own call, and its result is read again by reflection and
+# by the final answer
+SEARCH_TOKENS = estimate_tokens(web_searcher_instructions) + 2 * GEMINI_OUTPUT_TOKENS
+REFLECTION_TOKENS = 2 * GEMINI_OUTPUT_TOKENS
+
+
+class ResearchBudget:
+    """Remaining time and tokens of a research run.
+
+    Args:
+        deadline: Absolute UNIX time by which the answer is needed, if any.
+        token_budget: Tokens the whole run may spend, or 0 for no limit.
+        tokens_used: Tokens spent so far.
+        configurable: The run's configuration.
+    """
+
+    def __init__(
+        self,
+        deadline: Optional[float],
+        token_budget: int,
+        tokens_used: int,
+        configurable: Configuration,
+    ):
+        """Create the budget of a run from its limits and what it spent so far."""
+        self.deadline = deadline
+        self.token_budget = token_budget
+        self.tokens_used = tokens_used
+        self.configurable = configurable
+
+    @classmethod
+    def from_state(cls, state: dict, configurable: Configuration) -> "ResearchBudget":
+        """Build the budget from graph state, defaulting to the configured token budget."""
+        return cls(
+            state.get("deadline"),
+            state.get("token_budget") or configurable.token_budget,
+            state.get("tokens_used") or 0,
+            configurable,
+        )
+
+    def seconds_left(self) -> float:
+        """Seconds until the deadline (negative once passed), or infinity without one."""
+        if self.deadline is None:
+            return math.inf
+        return self.deadline - time.time()
+
+    def tokens_left(self) -> float:
+        """Tokens the run may still spend, or infinity without a token budget."""
+        if not self.token_budget:
+            return math.inf
+        return self.token_budget - self.tokens_used
+
+    def search_window(self) -> float:
+        """Seconds the web searches may take while leaving time for reflection and the answer."""
+        return (
+            self.seconds_left()
+            - NODE_SECONDS.mean(DEFAULT_STEP_SECONDS["reflection"], node="reflection")
+            - self.configurable.answer_reserve_seconds
+        )
+
+    def searches_that_fit(self, wanted: int) -> int:
+        """How many of `wanted` searches (plus a reflection) fit in the budget (may be 0)."""
+        tokens = (
+            self.tokens_left() - REFLECTION_TOKENS - self.configurable.answer_reserve_tokens
+        )
+        by_tokens = max(0, math.floor(tokens / SEARCH_TOKENS)) if tokens < math.inf else wanted
+        window = self.search_window()
+        if window < math.inf:
+            wave = NODE_SECONDS.mean(DEFAULT_STEP_SECONDS["web_research"], node="web_research")
+            per_wave = self.configurable.max_parallel_searches or wanted
+            by_time = max(0, math.floor(window / wave)) * per_wave
+        else:
+            by_time = wanted
+        return min(wanted, by_tokens, by_time)
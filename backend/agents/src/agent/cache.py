@@ -0,0 +1,346 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, punctuation and whitespace so near-identical queries share a cache key."""
+    text = _PUNCTUATION.sub(" ", text.casefold())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache with a per-entry TTL and hit/miss counters.
+
+    Args:
+        max_entries: Maximum number of entries before the least recently used is evicted.
+        ttl: Default time to live of an entry in seconds.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        """Create an empty cache."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for `key`, or `default` if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store `value` under `key`, expiring after `ttl` seconds (default: the cache TTL)."""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Remove `key` from the cache if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        """Return whether `key` holds an unexpired entry, without counting a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.time()
+
+    def __len__(self) -> int:
+        """Return the number of entries, expired ones not yet evicted included."""
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        """Return hit, miss and eviction counters plus the current size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self),
+        }
+
+
+class SQLiteCache(TTLCache):
+    """LRU/TTL cache persisted in a SQLite file so several processes can share it.
+
+    Values must be JSON serializable. Counters are tracked per process. The size
+    limit is enforced by a sweep every few writes rather than on every write, so
+    the table may briefly hold up to `sweep_interval` extra entries per process.
+
+    Args:
+        path: Path of the SQLite database file.
+        max_entries: Maximum number of entries before the least recently used is evicted.
+        ttl: Default time to live of an entry in seconds.
+        sweep_interval: Writes between size checks (default: 1/16 of
+            `max_entries`, at most 256).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        sweep_interval: Optional[int] = None,
+    ):
+        """Open (and create if needed) the cache table in `path`."""
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.path = path
+        if sweep_interval is None:
+            sweep_interval = min(256, max_entries // 16)
+        self.sweep_interval = max(1, sweep_interval)
+        self._writes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)"
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for `key`, or `default` if missing or expired."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.misses += 1
+                return default
+            self._db.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store `value` under `key`, expiring after `ttl` seconds (default: the cache TTL)."""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._writes += 1
+            if self._writes >= self.sweep_interval:
+                self._writes = 0
+                self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        """Delete expired entries, then the least recently used ones over the size limit."""
+        self._db.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def delete(self, key: str) -> None:
+        """Remove `key` from the cache if present."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def __contains__(self, key: str) -> bool:
+        """Return whether `key` holds an unexpired entry, without counting a hit or miss."""
+        row = self._db.execute(
+            "SELECT expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def __len__(self) -> int:
+        """Return the number of rows, expired ones not yet swept included."""
+        return self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def make_cache(
+    backend: str = "memory",
+    path: Optional[str] = None,
+    max_entries: int = 1024,
+    ttl: float = 3600.0,
+) -> TTLCache:
+    """Create a cache for the given backend name ("memory" or "sqlite").
+
+    Args:
+        backend: Cache backend, "sqlite" shares entries between processes using `path`.
+        path: SQLite database file, required for the "sqlite" backend.
+        max_entries: Maximum number of entries.
+        ttl: Default time to live of an entry in seconds.
+    """
+    if backend == "memory":
+        return TTLCache(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("The sqlite cache backend requires a path")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteCache(path, max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+class SingleFlight:
+    """Coalesces concurrent async calls with the same key into one call.
+
+    The first caller of a key starts the call as a task; callers arriving while
+    it runs await the same task and get its result or exception. A cancelled
+    caller does not cancel the call for the others; the call is cancelled once
+    every caller went away.
+    """
+
+    def __init__(self):
+        """Create a group without calls in flight."""
+        # Running call and number of callers waiting for it, by key
+        self._calls: dict[str, list] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Return the result of `func()` for `key` and whether it was shared with an earlier caller."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            task = asyncio.ensure_future(func())
+            call = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda done: self._finished(key, done))
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0]), shared
+        finally:
+            call[1] -= 1
+            if not call[1] and not call[0].done():
+                # Unregister before cancelling so no new caller joins the dying call
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call[0].cancel()
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        if key in self._calls and self._calls[key][0] is task:
+            del self._calls[key]
+        # Retrieve the exception so it is not reported when every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        """Return the number of calls in flight."""
+        return len(self._calls)
+
+
+class _Broadcast:
+    """Items of one shared stream, its outcome and its consumers."""
+
+    def __init__(self):
+        self.items: list = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.consumers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class StreamFlight:
+    """Shares one async stream between concurrent consumers with the same key.
+
+    The first consumer of a key starts the stream in a task; consumers arriving
+    while it runs first replay the items produced so far, then follow it live.
+    Every consumer sees the stream's exception (a cancellation included), and
+    the stream is cancelled once every consumer went away.
+    """
+
+    def __init__(self):
+        """Create a group without streams running."""
+        self._streams: dict[str, _Broadcast] = {}
+
+    def subscribe(
+        self, key: str, factory: Callable[[], AsyncIterator[Any]]
+    ) -> tuple[AsyncIterator[Any], bool]:
+        """Return the items of the stream for `key` and whether it was already running."""
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            broadcast.task = asyncio.ensure_future(self._pump(broadcast, factory()))
+            broadcast.task.add_done_callback(
+                lambda task: self._finished(key, broadcast, task)
+            )
+        # Counted now, not on first iteration, so the stream isn't cancelled under it
+        broadcast.consumers += 1
+        return self._consume(key, broadcast), shared
+
+    async def _pump(self, broadcast: _Broadcast, stream: AsyncIterator[Any]) -> None:
+        try:
+            async for item in stream:
+                broadcast.items.append(item)
+                broadcast.notify()
+        except Exception as e:
+            broadcast.error = e
+
+    def _finished(self, key: str, broadcast: _Broadcast, task: asyncio.Task) -> None:
+        # Also runs for a stream cancelled before it started; consumers see the
+        # cancellation instead of a stream that just ends
+        if task.cancelled():
+            broadcast.error = asyncio.CancelledError()
+        broadcast.done = True
+        broadcast.notify()
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    async def _consume(self, key: str, broadcast: _Broadcast) -> AsyncIterator[Any]:
+        position = 0
+        try:
+            while True:
+                if position < len(broadcast.items):
+                    position += 1
+                    yield broadcast.items[position - 1]
+                elif broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    await broadcast.wait()
+        finally:
+            broadcast.consumers -= 1
+            if not broadcast.consumers and not broadcast.done:
+                # Unregister before cancelling so no new consumer joins the dying stream
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+                broadcast.task.cancel()
+
+    def __len__(self) -> int:
+        """Return the number of streams running."""
+        return len(self._streams)
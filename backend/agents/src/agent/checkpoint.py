@@ -0,0 +1,528 @@
+import atexit
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.metrics import REGISTRY
+
+# Checkpoints of research runs, keyed by thread id, so that a run that failed or
+# whose process died resumes from its last completed step instead of repeating
+# the query generation and every paid-for search. RESEARCH_CHECKPOINTER selects
+# the backend: "sqlite" (default) persists checkpoints to RESEARCH_CHECKPOINT_PATH,
+# shared by the replicas on a host, "memory" keeps them in the process and "none"
+# disables checkpointing.
+# The SQLite saver serves the graph from memory and writes behind: a background
+# thread commits the queued checkpoints in one transaction per batch, at most
+# RESEARCH_CHECKPOINT_FLUSH_INTERVAL seconds after they were taken, so a crash
+# loses at most that much progress. A process that does not hold a thread in
+# memory (e.g. a restarted replica) loads it from the file on first access.
+RESEARCH_CHECKPOINTER = os.getenv("RESEARCH_CHECKPOINTER", "sqlite")
+RESEARCH_CHECKPOINT_PATH = os.getenv(
+    "RESEARCH_CHECKPOINT_PATH",
+    str(Path(__file__).resolve().parents[3] / ".cache" / "research_checkpoints.sqlite"),
+)
+RESEARCH_CHECKPOINT_FLUSH_INTERVAL = float(
+    os.getenv("RESEARCH_CHECKPOINT_FLUSH_INTERVAL", "0.2")
+)
+# Threads untouched for this long are dropped from memory (they stay on disk)
+RESEARCH_CHECKPOINT_IDLE = float(os.getenv("RESEARCH_CHECKPOINT_IDLE", "600"))
+# Threads untouched for this long are deleted from disk
+RESEARCH_CHECKPOINT_TTL = float(os.getenv("RESEARCH_CHECKPOINT_TTL", "86400"))
+
+FLUSH_SECONDS = REGISTRY.histogram(
+    "research_checkpoint_flush_seconds", "Time to commit one batch of checkpoints."
+)
+FLUSHED_ROWS = REGISTRY.counter(
+    "research_checkpoint_rows_total", "Checkpoint rows written to SQLite, per table.", ["table"]
+)
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    "thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, "
+    "type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, "
+    "parent_checkpoint_id TEXT, created_at REAL, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))",
+    "CREATE TABLE IF NOT EXISTS writes ("
+    "thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER, "
+    "channel TEXT, type TEXT, value BLOB, task_path TEXT, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))",
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    "thread_id TEXT, checkpoint_ns TEXT, channel TEXT, version TEXT, type TEXT, value BLOB, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, channel, version))",
+    "CREATE INDEX IF NOT EXISTS checkpoints_created ON checkpoints (created_at)",
+]
+
+
+@dataclass
+class _Thread:
+    """Checkpoint rows of one thread held in memory, in the layout of the SQLite tables."""
+
+    # (checkpoint_ns, checkpoint_id) -> (checkpoint, metadata, parent_checkpoint_id)
+    checkpoints: dict[tuple[str, str], tuple] = field(default_factory=dict)
+    # (checkpoint_ns, checkpoint_id) -> (task_id, idx) -> (task_id, channel, value, task_path)
+    writes: defaultdict[tuple[str, str], dict] = field(
+        default_factory=lambda: defaultdict(dict)
+    )
+    # (checkpoint_ns, channel, version) -> value
+    blobs: dict[tuple[str, str, str], tuple[str, bytes]] = field(default_factory=dict)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+        }
+    }
+
+
+class BatchedSQLiteSaver(BaseCheckpointSaver[str]):
+    """Checkpointer serving from memory and persisting to SQLite in background batches.
+
+    Only the public `BaseCheckpointSaver` interface is implemented; the rows are
+    kept in memory per thread exactly as they are stored in the tables.
+
+    Args:
+        path: Path of the SQLite database file.
+        flush_interval: Seconds a checkpoint may wait before its batch is committed.
+        idle: Seconds after which an unused thread is dropped from memory.
+        ttl: Seconds after which an unused thread is deleted from the file.
+        serde: Serializer of checkpoints, metadata and channel values.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = RESEARCH_CHECKPOINT_FLUSH_INTERVAL,
+        idle: float = RESEARCH_CHECKPOINT_IDLE,
+        ttl: float = RESEARCH_CHECKPOINT_TTL,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        """Create the saver; the file is opened on first use."""
+        super().__init__(serde=serde)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.idle = idle
+        self.ttl = ttl
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        # Guards the reader connection, the writer start and the two maps below
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writer: Optional[threading.Thread] = None
+        self._threads: dict[str, _Thread] = {}
+        # Threads deleted in memory whose rows are not deleted from disk yet
+        self._pending_deletes: set[str] = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        with db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                db.execute(statement)
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = self._connect()
+        return self._db
+
+    # Loading
+
+    def _thread(self, thread_id: str) -> Optional[_Thread]:
+        """Return a thread's rows, loading them from disk unless they are in memory."""
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if thread is None and thread_id not in self._pending_deletes:
+                thread = self._load(thread_id)
+            if thread is not None:
+                thread.last_used = time.monotonic()
+            return thread
+
+    def _load(self, thread_id: str) -> Optional[_Thread]:
+        with self._lock:
+            db = self._reader()
+            checkpoints = db.execute(
+                "SELECT checkpoint_ns, checkpoint_id, type, checkpoint, metadata_type, "
+                "metadata, parent_checkpoint_id FROM checkpoints WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+            if not checkpoints:
+                return None
+            writes = db.execute(
+                "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, "
+                "task_path FROM writes WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+            blobs = db.execute(
+                "SELECT checkpoint_ns, channel, version, type, value FROM blobs "
+                "WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+        thread = _Thread()
+        for ns, checkpoint_id, type_, checkpoint, metadata_type, metadata, parent in checkpoints:
+            thread.checkpoints[(ns, checkpoint_id)] = (
+                (type_, checkpoint),
+                (metadata_type, metadata),
+                parent,
+            )
+        for ns, checkpoint_id, task_id, idx, channel, type_, value, task_path in writes:
+            thread.writes[(ns, checkpoint_id)][(task_id, idx)] = (
+                task_id,
+                channel,
+                (type_, value),
+                task_path,
+            )
+        for ns, channel, version, type_, value in blobs:
+            thread.blobs[(ns, channel, version)] = (type_, value)
+        return self._threads.setdefault(thread_id, thread)
+
+    def _new_thread(self, thread_id: str) -> _Thread:
+        # Drop idle threads from memory when new ones start; they stay on disk
+        now = time.monotonic()
+        with self._lock:
+            for idle_thread in [
+                t for t, thread in self._threads.items() if now - thread.last_used > self.idle
+            ]:
+                del self._threads[idle_thread]
+            return self._threads.setdefault(thread_id, _Thread())
+
+    def _tuple(
+        self, thread_id: str, thread: _Thread, ns: str, checkpoint_id: str
+    ) -> CheckpointTuple:
+        checkpoint, metadata, parent = thread.checkpoints[(ns, checkpoint_id)]
+        checkpoint = self.serde.loads_typed(checkpoint)
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = thread.blobs.get((ns, channel, version))
+            if blob is not None and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob)
+        # The order the writes of a super-step were applied in: task path, task id, index
+        writes = [
+            write
+            for _, write in sorted(
+                thread.writes.get((ns, checkpoint_id), {}).items(),
+                key=lambda item: (item[1][3], item[0][0], item[0][1]),
+            )
+        ]
+        return CheckpointTuple(
+            config=_config(thread_id, ns, checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed(metadata),
+            parent_config=_config(thread_id, ns, parent) if parent else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for task_id, channel, value, _ in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Return the checkpoint of `config`, or the thread's latest one without a checkpoint id.
+
+        See `BaseCheckpointSaver.get_tuple`.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        thread = self._thread(thread_id)
+        if thread is None:
+            return None
+        checkpoint_id = get_checkpoint_id(config) or max(
+            (id_ for checkpoint_ns, id_ in thread.checkpoints if checkpoint_ns == ns),
+            default=None,
+        )
+        if (ns, checkpoint_id) not in thread.checkpoints:
+            return None
+        return self._tuple(thread_id, thread, ns, checkpoint_id)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints, newest first, of one thread or (without `config`) of all.
+
+        See `BaseCheckpointSaver.list`. `filter` matches metadata values exactly.
+        """
+        if config:
+            thread_ids = [config["configurable"]["thread_id"]]
+        else:
+            with self._lock:
+                on_disk = self._reader().execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints"
+                ).fetchall()
+                thread_ids = sorted(set(self._threads) | {row[0] for row in on_disk})
+        ns = config["configurable"].get("checkpoint_ns") if config else None
+        wanted_id = get_checkpoint_id(config) if config else None
+        before_id = get_checkpoint_id(before) if before else None
+        for thread_id in thread_ids:
+            thread = self._thread(thread_id)
+            if thread is None:
+                continue
+            for checkpoint_ns, checkpoint_id in sorted(
+                thread.checkpoints, key=lambda key: key[1], reverse=True
+            ):
+                if ns is not None and checkpoint_ns != ns:
+                    continue
+                if wanted_id and checkpoint_id != wanted_id:
+                    continue
+                if before_id and checkpoint_id >= before_id:
+                    continue
+                if filter:
+                    metadata = self.serde.loads_typed(
+                        thread.checkpoints[(checkpoint_ns, checkpoint_id)][1]
+                    )
+                    if any(metadata.get(k) != v for k, v in filter.items()):
+                        continue
+                if limit is not None:
+                    if limit <= 0:
+                        return
+                    limit -= 1
+                yield self._tuple(thread_id, thread, checkpoint_ns, checkpoint_id)
+
+    # Writing
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint with the channel values that changed and queue it for disk.
+
+        See `BaseCheckpointSaver.put`.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"]["checkpoint_ns"]
+        thread = self._thread(thread_id) or self._new_thread(thread_id)
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values")
+        blobs = []
+        for channel, version in new_versions.items():
+            blob = (
+                self.serde.dumps_typed(values[channel])
+                if channel in values
+                else ("empty", b"")
+            )
+            thread.blobs[(ns, channel, version)] = blob
+            blobs.append((thread_id, ns, channel, version, *blob))
+        stored = (
+            self.serde.dumps_typed(checkpoint),
+            self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+            config["configurable"].get("checkpoint_id"),
+        )
+        thread.checkpoints[(ns, checkpoint["id"])] = stored
+        self._enqueue(
+            "checkpoints",
+            [(thread_id, ns, checkpoint["id"], *stored[0], *stored[1], stored[2], time.time())],
+        )
+        self._enqueue("blobs", blobs)
+        return _config(thread_id, ns, checkpoint["id"])
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store the pending writes of a task and queue them for disk.
+
+        See `BaseCheckpointSaver.put_writes`.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        thread = self._thread(thread_id) or self._new_thread(thread_id)
+        stored = thread.writes[(ns, checkpoint_id)]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+            # Regular writes are saved once; special ones (errors, interrupts) replaced
+            if key[1] >= 0 and key in stored:
+                continue
+            stored[key] = (task_id, channel, self.serde.dumps_typed(value), task_path)
+            rows.append((thread_id, ns, checkpoint_id, *key, channel, *stored[key][2], task_path))
+        self._enqueue("writes", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Drop a thread from memory and queue the deletion of its rows on disk."""
+        with self._lock:
+            self._threads.pop(thread_id, None)
+            self._pending_deletes.add(thread_id)
+        self._enqueue("delete", [thread_id])
+
+    def get_next_version(self, current: Optional[str], channel: None = None) -> str:
+        """Return an increasing version: a counter plus a random part, as strings sort."""
+        if current is None:
+            counter = 0
+        elif isinstance(current, int):
+            counter = current
+        else:
+            counter = int(current.split(".")[0])
+        return f"{counter + 1:032}.{random.random():016}"
+
+    # The rows are served from memory, so the async interface runs the sync one
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Async version of `get_tuple`."""
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Async version of `list`."""
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Async version of `put`."""
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Async version of `put_writes`."""
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Async version of `delete_thread`."""
+        self.delete_thread(thread_id)
+
+    def _enqueue(self, table: str, rows: list) -> None:
+        if not rows:
+            return
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._write_loop, name="checkpoint-writer", daemon=True
+                    )
+                    self._writer.start()
+                    # Commit what is still queued when the process exits normally
+                    atexit.register(self.flush, self.flush_interval + 5.0)
+        self._queue.put((table, rows))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Commit everything queued so far; return False if it took longer than `timeout`."""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def _write_loop(self) -> None:
+        db = self._connect()
+        self._prune(db)
+        pruned_at = time.monotonic()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1][0] != "flush":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(db, batch)
+            if time.monotonic() - pruned_at > 3600:
+                self._prune(db)
+                pruned_at = time.monotonic()
+
+    def _commit(self, db: sqlite3.Connection, batch: list) -> None:
+        started = time.perf_counter()
+        flushed = []
+        with db:
+            # Queue order is kept, so a thread's deletion follows its writes
+            for table, rows in batch:
+                if table == "flush":
+                    flushed.append(rows)
+                elif table == "delete":
+                    for statement in ("checkpoints", "writes", "blobs"):
+                        db.executemany(
+                            f"DELETE FROM {statement} WHERE thread_id = ?",
+                            [(thread_id,) for thread_id in rows],
+                        )
+                else:
+                    placeholders = ", ".join("?" * len(rows[0]))
+                    db.executemany(
+                        f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows
+                    )
+                    FLUSHED_ROWS.inc(len(rows), table=table)
+        with self._lock:
+            for table, rows in batch:
+                if table == "delete":
+                    self._pending_deletes.difference_update(rows)
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        for done in flushed:
+            done.set()
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        """Delete the threads whose last checkpoint is older than the TTL."""
+        expired = "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?"
+        cutoff = time.time() - self.ttl
+        with db:
+            for table in ("writes", "blobs", "checkpoints"):
+                db.execute(f"DELETE FROM {table} WHERE thread_id IN ({expired})", (cutoff,))
+
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """Return the process-wide research checkpointer, or None if checkpointing is disabled."""
+    global _checkpointer
+    if _checkpointer is None and RESEARCH_CHECKPOINTER != "none":
+        if RESEARCH_CHECKPOINTER == "memory":
+            _checkpointer = InMemorySaver()
+        elif RESEARCH_CHECKPOINTER == "sqlite":
+            _checkpointer = BatchedSQLiteSaver(RESEARCH_CHECKPOINT_PATH)
+        else:
+            raise ValueError(f"Unknown research checkpointer: {RESEARCH_CHECKPOINTER}")
+    return _checkpointer
+
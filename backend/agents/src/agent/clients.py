@@ -0,0 +1,112 @@
+import os
+import threading
+from typing import Any, Optional
+
+from google.genai import Client, types
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+# Process-wide registry of Gemini clients. Every client owns its own HTTP
+# transport, so constructing one per node execution means a fresh connection
+# (and TLS handshake) per LLM call. Clients are created lazily on first use and
+# shared by all graph nodes and agents running in the same process.
+_lock = threading.Lock()
+# Points every Gemini client at another endpoint, e.g. the fake Gemini server of
+# the offline benchmarks (benchmarks/fake_gemini.py)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+_chat_models: dict[tuple, Any] = {}
+_genai_clients: dict[Optional[str], Client] = {}
+_stats = {
+    "chat_model_constructions": 0,
+    "chat_model_reuses": 0,
+    "genai_client_constructions": 0,
+    "genai_client_reuses": 0,
+}
+
+
+def _chat_model_endpoint() -> dict[str, Any]:
+    """Keyword arguments pointing `ChatGoogleGenerativeAI` at GEMINI_BASE_URL."""
+    if not GEMINI_BASE_URL:
+        return {}
+    kwargs: dict[str, Any] = {"client_options": {"api_endpoint": GEMINI_BASE_URL}}
+    # Older releases talk gRPC unless told otherwise
+    if "transport" in ChatGoogleGenerativeAI.model_fields:
+        kwargs["transport"] = "rest"
+    return kwargs
+
+
+def get_chat_model(
+    model: str,
+    temperature: float,
+    max_retries: int = 2,
+    schema: Optional[type] = None,
+    api_key: Optional[str] = None,
+):
+    """Return a shared `ChatGoogleGenerativeAI`, optionally bound to a structured output schema.
+
+    Models are keyed on (model, temperature, max_retries, schema, api_key). Structured
+    variants wrap the shared base model so they reuse its connection.
+
+    Args:
+        model: Gemini model name.
+        temperature: Sampling temperature.
+        max_retries: Number of retries performed by the client.
+        schema: Optional pydantic model passed to `with_structured_output`.
+        api_key: API key, defaults to the GEMINI_API_KEY environment variable.
+
+    Returns:
+        The cached chat model (or structured output runnable when `schema` is set).
+    """
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    key = (model, temperature, max_retries, schema, api_key)
+    with _lock:
+        if key in _chat_models:
+            _stats["chat_model_reuses"] += 1
+            return _chat_models[key]
+
+        base_key = (model, temperature, max_retries, None, api_key)
+        if base_key not in _chat_models:
+            _chat_models[base_key] = ChatGoogleGenerativeAI(
+                model=model,
+                temperature=temperature,
+                max_retries=max_retries,
+                api_key=api_key,
+                **_chat_model_endpoint(),
+            )
+            _stats["chat_model_constructions"] += 1
+        if schema is not None:
+            _chat_models[key] = _chat_models[base_key].with_structured_output(schema)
+        return _chat_models[key]
+
+
+def get_genai_client(api_key: Optional[str] = None) -> Client:
+    """Return the shared `google.genai.Client` for an API key.
+
+    Args:
+        api_key: API key, defaults to the GEMINI_API_KEY environment variable.
+    """
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    with _lock:
+        if api_key in _genai_clients:
+            _stats["genai_client_reuses"] += 1
+        else:
+            http_options = (
+                types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+            )
+            _genai_clients[api_key] = Client(api_key=api_key, http_options=http_options)
+            _stats["genai_client_constructions"] += 1
+        return _genai_clients[api_key]
+
+
+def client_stats() -> dict[str, int]:
+    """Return construction and reuse counters of the client registry."""
+    with _lock:
+        return dict(_stats)
+
+
+def reset_clients() -> None:
+    """Drop all cached clients and counters (used by benchmarks)."""
+    with _lock:
+        _chat_models.clear()
+        _genai_clients.clear()
+        for name in _stats:
+            _stats[name] = 0
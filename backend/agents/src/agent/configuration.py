@@ -46,6 +46,88 @@ class Configuration(BaseModel):
         metadata={"description": "The maximum number of research loops to perform."},
     )
 
+    max_parallel_searches: int = Field(
+        default=8,
+        metadata={
+            "description": "The maximum number of web searches of one research loop running at once (0 for no limit)."
+        },
+    )
+
+    search_timeout: float = Field(
+        default=60.0,
+        metadata={
+            "description": "Seconds after which a single web search is abandoned (0 for no deadline)."
+        },
+    )
+
+    search_quorum: int = Field(
+        default=0,
+        metadata={
+            "description": "Number of successful web searches after which the loop moves on to reflection, cancelling the rest (0 waits for all)."
+        },
+    )
+
+    search_time_budget: float = Field(
+        default=0.0,
+        metadata={
+            "description": "Seconds after which the loop moves on to reflection with the searches finished so far, once at least one succeeded (0 for no budget)."
+        },
+    )
+
+    token_budget: int = Field(
+        default=0,
+        metadata={
+            "description": "The maximum number of tokens one research run may spend (0 for no budget). A `token_budget` in the graph input takes precedence."
+        },
+    )
+
+    answer_reserve_seconds: float = Field(
+        default=10.0,
+        metadata={
+            "description": "Seconds before the run's deadline kept free for finalize_answer."
+        },
+    )
+
+    answer_reserve_tokens: int = Field(
+        default=4000,
+        metadata={
+            "description": "Tokens of the run's budget kept free for finalize_answer."
+        },
+    )
+
+    research_digest: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to fold each loop's results into a running digest, so reflection sees the digest plus the new results instead of every result."
+        },
+    )
+
+    answer_from_digest: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether finalize_answer is prompted with the digest instead of every result (requires research_digest)."
+        },
+    )
+
+    digest_model: str = Field(
+        default="gemini-2.0-flash",
+        metadata={
+            "description": "The name of the language model that updates the research digest."
+        },
+    )
+
+    digest_max_words: int = Field(
+        default=600,
+        metadata={"description": "The target maximum length of the research digest in words."},
+    )
+
+    use_search_cache: bool = Field(
+        default=True,
+        metadata={
+            "description": "Whether to reuse cached web research results for repeated search queries."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -0,0 +1,245 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Any
+
+from agent.metrics import REGISTRY
+from agent.utils import SHORT_URL_PATTERN
+
+# Cross-result deduplication of the research state. Parallel searches often cite
+# the same pages and repeat the same facts, and everything they return ends up
+# in the reflection and answer prompts:
+# - `canonicalize_sources` gives every cited page one short url per run, so
+#   repeated citations of a page read the same everywhere;
+# - `merge_sources` (reducer of `sources_gathered`) keeps one source per short url;
+# - `merge_results` (reducer of `web_research_result`) drops sentences that are
+#   near-duplicates of one already kept, moving their citation markers onto the
+#   kept sentence when it is part of the same update.
+# Near-duplicate means a Jaccard similarity of the sentences' word shingles of at
+# least RESEARCH_DEDUP_THRESHOLD (0 disables sentence deduplication). Candidates
+# are found with MinHash locality-sensitive hashing and then compared exactly.
+# The index built by a merge travels with the merged list in the graph state (it
+# is not checkpointed), so the accumulated results of a run are not split and
+# hashed again on every loop.
+RESEARCH_DEDUP_THRESHOLD = float(os.getenv("RESEARCH_DEDUP_THRESHOLD", "0.8"))
+# Shorter sentences (headings, list labels) are always kept
+MIN_SENTENCE_WORDS = 6
+SHINGLE_WORDS = 3
+# 8 bands of 2 rows: pairs above 0.7 similarity share a band with p > 0.99
+NUM_BANDS = 8
+BAND_ROWS = 2
+NUM_PERMUTATIONS = NUM_BANDS * BAND_ROWS
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(b"a%d" % i, digest_size=8).digest(), "big") | 1,
+        int.from_bytes(hashlib.blake2b(b"b%d" % i, digest_size=8).digest(), "big"),
+    )
+    for i in range(NUM_PERMUTATIONS)
+]
+
+# A citation marker inserted by `insert_citation_markers`: " [label](short_url)"
+MARKER_PATTERN = re.compile(r" ?\[[^\]\n]*\]\([^)\s]+\)")
+# Sentence end (markers right after the punctuation belong to the sentence) or line break
+BOUNDARY_PATTERN = re.compile(r"[.!?]\x00*(\s+)|(\s*\n\s*)")
+WORD_PATTERN = re.compile(r"\w+")
+
+REMOVED = REGISTRY.counter(
+    "research_dedup_removed_total",
+    "Duplicate sentences and sources removed from the research state.",
+    ["kind"],
+)
+
+
+def canonicalize_sources(
+    results: list[str], sources: list[dict[str, Any]], short_urls: dict[str, str]
+) -> tuple[list[str], list[dict[str, Any]]]:
+    """Rewrite the short urls of already cited pages to the one they were first given.
+
+    Args:
+        results: Research texts with citation markers.
+        sources: The sources cited in `results`.
+        short_urls: Short url of every page cited so far in the run, by original
+            url. Pages first cited in `sources` are added to it.
+
+    Returns:
+        The texts and sources using one short url per page.
+    """
+    aliases = {}
+    canonical_sources = []
+    for source in sources:
+        short_url = source.get("short_url")
+        if short_url:
+            canonical = short_urls.setdefault(source["value"], short_url)
+            if canonical != short_url:
+                aliases[short_url] = canonical
+                source = {**source, "short_url": canonical}
+        canonical_sources.append(source)
+    if not aliases:
+        return results, canonical_sources
+
+    def substitute(match):
+        return aliases.get(match.group(0), match.group(0))
+
+    return [SHORT_URL_PATTERN.sub(substitute, text) for text in results], canonical_sources
+
+
+def merge_sources(
+    existing: list[dict[str, Any]], new: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """Reducer of `sources_gathered`: append the sources whose short url is not there yet."""
+    merged = list(existing)
+    seen = {source.get("short_url") for source in existing}
+    for source in new:
+        short_url = source.get("short_url")
+        if short_url is None or short_url not in seen:
+            seen.add(short_url)
+            merged.append(source)
+    REMOVED.inc(len(existing) + len(new) - len(merged), kind="sources")
+    return merged
+
+
+def _split_sentences(text: str) -> list[list[str]]:
+    """Split a text into [sentence, separator] pairs that join back to the text."""
+    # Mask the markers so dots in their urls are not taken as sentence ends
+    masked = MARKER_PATTERN.sub(lambda m: "\x00" * len(m.group(0)), text)
+    sentences = []
+    position = 0
+    for match in BOUNDARY_PATTERN.finditer(masked):
+        start, end = match.span(1) if match.group(1) is not None else match.span(2)
+        sentences.append([text[position:start], text[start:end]])
+        position = end
+    if position < len(text):
+        sentences.append([text[position:], ""])
+    return sentences
+
+
+@lru_cache(maxsize=65536)
+def _shingles(sentence: str) -> tuple[frozenset, tuple]:
+    """Hashed word shingles of a sentence and their LSH band keys (empty if too short)."""
+    words = WORD_PATTERN.findall(MARKER_PATTERN.sub("", sentence).lower())
+    if len(words) < MIN_SENTENCE_WORDS:
+        return frozenset(), ()
+    shingles = frozenset(
+        int.from_bytes(
+            hashlib.blake2b(
+                " ".join(words[i : i + SHINGLE_WORDS]).encode(), digest_size=8
+            ).digest(),
+            "big",
+        )
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    )
+    signature = [
+        min(((a * h + b) & _MASK) % _PRIME for h in shingles) for a, b in _PERMUTATIONS
+    ]
+    bands = tuple(
+        (band, *signature[band * BAND_ROWS : (band + 1) * BAND_ROWS])
+        for band in range(NUM_BANDS)
+    )
+    return shingles, bands
+
+
+class _SentenceIndex:
+    """LSH index of kept sentences, each a [sentence, separator] pair."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.bands: dict[tuple, list[tuple[frozenset, list[str]]]] = {}
+
+    def find(self, shingles: frozenset, bands: tuple):
+        """Return a kept sentence similar to one with these shingles, if any."""
+        for key in bands:
+            for other, sentence in self.bands.get(key, ()):
+                if len(shingles & other) >= self.threshold * len(shingles | other):
+                    return sentence
+        return None
+
+    def add(self, shingles: frozenset, bands: tuple, sentence: list[str]) -> None:
+        for key in bands:
+            self.bands.setdefault(key, []).append((shingles, sentence))
+
+
+def _move_markers(duplicate: str, kept: list[str]) -> None:
+    """Append the citation markers of a dropped sentence that the kept one lacks."""
+    missing = [
+        marker
+        for marker in MARKER_PATTERN.findall(duplicate)
+        if marker.strip() not in kept[0]
+    ]
+    if missing:
+        kept[0] += "".join(
+            marker if marker.startswith(" ") else f" {marker}" for marker in missing
+        )
+
+
+class _MergedResults(list):
+    """Result of `merge_results`, carrying its sentence index for the next merge."""
+
+    __slots__ = ("_kept",)
+
+
+def _index_of(existing: list[str]) -> tuple[_SentenceIndex, list[list[list[str]]]]:
+    """Return the sentence index and split texts of `existing`.
+
+    Reuses the index of the merge that produced `existing`; an index is used
+    once, since merging into it changes it.
+    """
+    kept = getattr(existing, "_kept", None)
+    if kept is not None:
+        existing._kept = None
+        index, texts = kept
+        return index, list(texts)
+    index = _SentenceIndex(RESEARCH_DEDUP_THRESHOLD)
+    texts = [_split_sentences(text) for text in existing]
+    for sentences in texts:
+        for sentence in sentences:
+            shingles, bands = _shingles(sentence[0])
+            if shingles:
+                index.add(shingles, bands, sentence)
+    return index, texts
+
+
+def merge_results(existing: list[str], new: list[str]) -> list[str]:
+    """Reducer of `web_research_result`: append new results without repeated sentences.
+
+    Sentences of `new` that are near-duplicates of a sentence already kept (in
+    `existing` or earlier in `new`) are dropped. When the kept sentence is from
+    `new`, the dropped one's citation markers move to it; sentences of
+    `existing` are never changed, since they may already be folded into the
+    research digest. Results left empty are dropped.
+    """
+    if RESEARCH_DEDUP_THRESHOLD <= 0 or not new:
+        return list(existing) + list(new)
+    index, texts = _index_of(existing)
+
+    removed = 0
+    # Sentences of `new` kept so far, the only ones markers may move onto
+    fresh = set()
+    for text in new:
+        kept = []
+        for sentence in _split_sentences(text):
+            shingles, bands = _shingles(sentence[0])
+            if shingles:
+                duplicate_of = index.find(shingles, bands)
+                if duplicate_of is not None:
+                    if id(duplicate_of) in fresh:
+                        _move_markers(sentence[0], duplicate_of)
+                    # Keep paragraph breaks when the dropped sentence ended one
+                    if kept and "\n" in sentence[1] and "\n" not in kept[-1][1]:
+                        kept[-1][1] = sentence[1]
+                    removed += 1
+                    continue
+                index.add(shingles, bands, sentence)
+                fresh.add(id(sentence))
+            kept.append(sentence)
+        if any(sentence[0].strip() for sentence in kept):
+            texts.append(kept)
+    REMOVED.inc(removed, kind="sentences")
+    merged = _MergedResults(
+        "".join(s + separator for s, separator in sentences).strip() for sentences in texts
+    )
+    merged._kept = (index, texts)
+    return merged
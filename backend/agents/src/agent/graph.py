@@ -1,73 +1,94 @@
+import asyncio
+import math
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
 
-from agent.tools_and_schemas import SearchQueryList, Reflection
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.config import get_stream_writer
+from langgraph.graph import END, START, StateGraph
 from langgraph.types import Send
-from langgraph.graph import StateGraph
-from langgraph.graph import START, END
-from langchain_core.runnables import RunnableConfig
-from google.genai import Client
 
-from agent.state import (
-    OverallState,
-    QueryGenerationState,
-    ReflectionState,
-    WebSearchState,
-)
+from agent.budget import ResearchBudget
+from agent.checkpoint import get_checkpointer
+from agent.clients import get_chat_model, get_genai_client
 from agent.configuration import Configuration
+from agent.dedup import canonicalize_sources
+from agent.instrumentation import (
+    SEARCH_OUTCOMES,
+    instrument_node,
+    llm_retry_counter,
+    record_llm_call,
+    record_loop,
+    with_llm_metrics,
+)
 from agent.prompts import (
+    answer_instructions,
+    digest_instructions,
     get_current_date,
     query_writer_instructions,
-    web_searcher_instructions,
     reflection_instructions,
-    answer_instructions,
+    web_searcher_instructions,
+)
+from agent.rate_limit import estimate_tokens, get_rate_limiter, usage_tokens
+from agent.search_cache import get_search_cache
+from agent.state import (
+    OverallState,
+    QueryGenerationState,
+    ReflectionState,
+    WebResearchState,
+    WebSearchState,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
+from agent.tools_and_schemas import Reflection, SearchQueryList
 from agent.utils import (
     get_citations,
     get_research_topic,
     insert_citation_markers,
+    replace_short_urls,
     resolve_urls,
 )
 
 load_dotenv()
 
+# How often the sync web_research fan-out checks search deadlines and the time budget
+_POLL_INTERVAL = 0.05
+
 if os.getenv("GEMINI_API_KEY") is None:
     raise ValueError("GEMINI_API_KEY is not set")
 
-# Used for Google Search API
-genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
 
+def _tokens_spent(prompt: str, result) -> int:
+    """Tokens reported for an LLM call, or an estimate when the result carries no usage."""
+    return usage_tokens(result) or int(estimate_tokens(prompt))
 
-# Nodes
-def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
-    """LangGraph node that generates a search queries based on the User's question.
-
-    Uses Gemini 2.0 Flash to create an optimized search query for web research based on
-    the User's question.
-
-    Args:
-        state: Current graph state containing the User's question
-        config: Configuration for the runnable, including LLM provider settings
 
-    Returns:
-        Dictionary with state update, including search_query key containing the generated query
-    """
+# Nodes
+def _query_generation_prompt(state: OverallState, config: RunnableConfig):
+    """Build the structured query-writer LLM and its prompt for `generate_query`."""
     configurable = Configuration.from_runnable_config(config)
 
     # check for custom initial search query count
     if state.get("initial_search_query_count") is None:
         state["initial_search_query_count"] = configurable.number_of_initial_queries
+    # Size the fan-out to the time and tokens left, but always search at least once
+    state["initial_search_query_count"] = max(
+        1,
+        ResearchBudget.from_state(state, configurable).searches_that_fit(
+            state["initial_search_query_count"]
+        ),
+    )
 
-    # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
+    # Gemini 2.0 Flash, shared across node executions
+    # Retries are scheduled by the shared rate limiter
+    structured_llm = get_chat_model(
+        configurable.query_generator_model,
         temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+        max_retries=0,
+        schema=SearchQueryList,
     )
-    structured_llm = llm.with_structured_output(SearchQueryList)
 
     # Format the prompt
     current_date = get_current_date()
@@ -76,81 +97,455 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
         research_topic=get_research_topic(state["messages"]),
         number_queries=state["initial_search_query_count"],
     )
+    return structured_llm, configurable.query_generator_model, formatted_prompt
+
+
+def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
+    """LangGraph node that generates a search queries based on the User's question.
+
+    Uses Gemini 2.0 Flash to create an optimized search query for web research based on
+    the User's question.
+
+    Args:
+        state: Current graph state containing the User's question
+        config: Configuration for the runnable, including LLM provider settings
+
+    Returns:
+        Dictionary with state update, including search_query key containing the generated query
+    """
+    structured_llm, model, formatted_prompt = _query_generation_prompt(state, config)
     # Generate the search queries
-    result = structured_llm.invoke(formatted_prompt)
-    return {"query_list": result.query}
+    result = get_rate_limiter().call(
+        model,
+        "research",
+        formatted_prompt,
+        lambda: structured_llm.invoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _query_update(state, formatted_prompt, result)
+
+
+async def agenerate_query(
+    state: OverallState, config: RunnableConfig
+) -> QueryGenerationState:
+    """Async version of `generate_query`, used when the graph runs via `ainvoke`/`astream`."""
+    structured_llm, model, formatted_prompt = _query_generation_prompt(state, config)
+    result = await get_rate_limiter().acall(
+        model,
+        "research",
+        formatted_prompt,
+        lambda: structured_llm.ainvoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _query_update(state, formatted_prompt, result)
+
+
+def _query_update(
+    state: OverallState, prompt: str, result: SearchQueryList
+) -> QueryGenerationState:
+    return {
+        # The model may write more queries than were asked for
+        "query_list": result.query[: state["initial_search_query_count"]],
+        "loop_started_at": time.time(),
+        "tokens_used": _tokens_spent(prompt, result),
+    }
 
 
 def continue_to_web_research(state: QueryGenerationState):
     """LangGraph node that sends the search queries to the web research node.
 
-    This is used to spawn n number of web research nodes, one for each search query.
+    All queries of a loop go to one `web_research` execution, which schedules them
+    with bounded concurrency and can move on before the slowest one finishes.
     """
     return [
-        Send("web_research", {"search_query": search_query, "id": int(idx)})
-        for idx, search_query in enumerate(state["query_list"])
+        Send(
+            "web_research",
+            {
+                "searches": [
+                    {"search_query": search_query, "id": int(idx)}
+                    for idx, search_query in enumerate(state["query_list"])
+                ],
+                "deadline": state.get("deadline"),
+            },
+        )
     ]
 
 
-def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
-    """LangGraph node that performs web research using the native Google Search API tool.
-
-    Executes a web search using the native Google Search API tool in combination with Gemini 2.0 Flash.
-
-    Args:
-        state: Current graph state containing the search query and research loop count
-        config: Configuration for the runnable, including search API settings
-
-    Returns:
-        Dictionary with state update, including sources_gathered, research_loop_count, and web_research_results
-    """
-    # Configure
+def _web_search_request(state: WebSearchState, config: RunnableConfig) -> dict:
+    """Build the keyword arguments of the grounded search call for `web_research`."""
     configurable = Configuration.from_runnable_config(config)
     formatted_prompt = web_searcher_instructions.format(
         current_date=get_current_date(),
         research_topic=state["search_query"],
     )
-
-    # Uses the google genai client as the langchain client doesn't return grounding metadata
-    response = genai_client.models.generate_content(
-        model=configurable.query_generator_model,
-        contents=formatted_prompt,
-        config={
+    return {
+        "model": configurable.query_generator_model,
+        "contents": formatted_prompt,
+        "config": {
             "tools": [{"google_search": {}}],
             "temperature": 0,
         },
-    )
+    }
+
+
+def _cached_web_research(
+    state: WebSearchState, config: RunnableConfig, request: dict
+) -> Optional[OverallState]:
+    """Return a cached `web_research` update for this search query, if any."""
+    if not Configuration.from_runnable_config(config).use_search_cache:
+        return None
+    return get_search_cache().get(state["search_query"], request["model"], state["id"])
+
+
+def _web_research_update(
+    state: WebSearchState, config: RunnableConfig, request: dict, response
+) -> OverallState:
+    """Turn a grounded search response into the `web_research` state update."""
+    grounding_chunks = response.candidates[0].grounding_metadata.grounding_chunks
     # resolve the urls to short urls for saving tokens and time
-    resolved_urls = resolve_urls(
-        response.candidates[0].grounding_metadata.grounding_chunks, state["id"]
-    )
+    resolved_urls = resolve_urls(grounding_chunks, state["id"])
     # Gets the citations and adds them to the generated text
     citations = get_citations(response, resolved_urls)
     modified_text = insert_citation_markers(response.text, citations)
     sources_gathered = [item for citation in citations for item in citation["segments"]]
 
-    return {
+    update = {
         "sources_gathered": sources_gathered,
         "search_query": [state["search_query"]],
         "web_research_result": [modified_text],
     }
+    if Configuration.from_runnable_config(config).use_search_cache:
+        get_search_cache().set(
+            state["search_query"], request["model"], state["id"], update, grounding_chunks
+        )
+    return update
 
 
-def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
-    """LangGraph node that identifies knowledge gaps and generates potential follow-up queries.
+def _search(state: WebSearchState, config: RunnableConfig) -> OverallState:
+    """Run one grounded web search (or serve it from the search cache)."""
+    request = _web_search_request(state, config)
+    cached = _cached_web_research(state, config, request)
+    if cached is not None:
+        return cached
 
-    Analyzes the current summary to identify areas for further research and generates
-    potential follow-up queries. Uses structured output to extract
-    the follow-up query in JSON format.
+    # Uses the google genai client as the langchain client doesn't return grounding metadata
+    started = time.perf_counter()
+    response = get_rate_limiter().call(
+        request["model"],
+        "search",
+        request["contents"],
+        lambda: get_genai_client().models.generate_content(**request),
+        on_retry=llm_retry_counter(config, request["model"]),
+    )
+    record_llm_call(
+        "web_research",
+        request["model"],
+        time.perf_counter() - started,
+        request["contents"],
+        getattr(response, "usage_metadata", None),
+    )
+    update = _web_research_update(state, config, request, response)
+    return {**update, "tokens_used": _tokens_spent(request["contents"], response)}
+
+
+async def _asearch(state: WebSearchState, config: RunnableConfig) -> OverallState:
+    """Async version of `_search` using the non-blocking genai client."""
+    request = _web_search_request(state, config)
+    cached = _cached_web_research(state, config, request)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    response = await get_rate_limiter().acall(
+        request["model"],
+        "search",
+        request["contents"],
+        lambda: get_genai_client().aio.models.generate_content(**request),
+        on_retry=llm_retry_counter(config, request["model"]),
+    )
+    record_llm_call(
+        "web_research",
+        request["model"],
+        time.perf_counter() - started,
+        request["contents"],
+        getattr(response, "usage_metadata", None),
+    )
+    update = _web_research_update(state, config, request, response)
+    return {**update, "tokens_used": _tokens_spent(request["contents"], response)}
+
+
+def _fan_out_limits(state: WebResearchState, config: RunnableConfig):
+    """Return (max in flight, per-search timeout, quorum, time budget) for a batch."""
+    configurable = Configuration.from_runnable_config(config)
+    n = len(state["searches"])
+    budget = configurable.search_time_budget or None
+    # Move on in time for reflection and the answer before the run's deadline
+    window = ResearchBudget(state.get("deadline"), 0, 0, configurable).search_window()
+    if window < math.inf:
+        budget = max(0.0, min(budget or math.inf, window))
+    return (
+        configurable.max_parallel_searches or n,
+        configurable.search_timeout or None,
+        min(configurable.search_quorum or n, n),
+        budget,
+    )
+
+
+def _progress_writer():
+    """Return the graph's custom stream writer (a no-op outside a graph run)."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda chunk: None
+
+
+def _record_search(outcome: str, update: Optional[OverallState] = None) -> None:
+    SEARCH_OUTCOMES.inc(outcome=outcome)
+    if update is not None:
+        # Each search is streamed as soon as it finishes, like the former branches
+        _progress_writer()(("web_research", update))
+
+
+def _merge_searches(
+    state: WebResearchState, updates: list[OverallState], errors: list[Exception]
+) -> OverallState:
+    """Combine the finished searches, in query order, into one state update.
+
+    Pages cited by several searches, in this or an earlier loop, keep the short
+    url they were first given.
+    """
+    if not updates:
+        raise errors[0] if errors else TimeoutError("No web search finished in time")
+    updates = sorted(updates, key=lambda update: update["search_id"])
+    results, sources = canonicalize_sources(
+        [r for u in updates for r in u["web_research_result"]],
+        [s for u in updates for s in u["sources_gathered"]],
+        dict(state.get("short_urls") or {}),
+    )
+    return {
+        "sources_gathered": sources,
+        "search_query": [q for u in updates for q in u["search_query"]],
+        "web_research_result": results,
+        "tokens_used": sum(u.get("tokens_used", 0) for u in updates),
+    }
+
+
+def web_research(state: WebResearchState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that performs web research using the native Google Search API tool.
+
+    Executes the loop's web searches using the native Google Search API tool in
+    combination with Gemini 2.0 Flash. At most `max_parallel_searches` run at once
+    and each is abandoned after `search_timeout`. The node returns once
+    `search_quorum` searches succeeded or, when at least one did, after
+    `search_time_budget`; failed and unfinished searches are dropped.
+
+    Threads cannot be interrupted: queued searches are cancelled, but searches
+    already running when they time out or the node returns keep running in the
+    background. They are still billed and still fill the search cache, their
+    results are unused. Such searches are counted as ``abandoned`` (or
+    ``timeout``) in `research_search_outcomes_total`. `aweb_research`, used by
+    `ainvoke`/`astream` and thus by the agents, cancels them instead.
 
     Args:
-        state: Current graph state containing the running summary and research topic
-        config: Configuration for the runnable, including LLM provider settings
+        state: The searches of this research loop (query and id of each)
+        config: Configuration for the runnable, including search API and fan-out settings
 
     Returns:
-        Dictionary with state update, including search_query key containing the generated follow-up query
+        Dictionary with state update, including sources_gathered, search_query, and web_research_results
+    """
+    max_in_flight, timeout, quorum, budget = _fan_out_limits(state, config)
+    started = time.monotonic()
+    updates, errors = [], []
+    pool = ThreadPoolExecutor(max_workers=max_in_flight)
+    futures = {
+        pool.submit(_search, search, config): search for search in state["searches"]
+    }
+    deadlines = {}
+    pending = set(futures)
+    try:
+        while pending and len(updates) < quorum:
+            now = time.monotonic()
+            # A search's deadline starts when it gets a worker
+            for future in pending:
+                if future.running() and future not in deadlines and timeout:
+                    deadlines[future] = now + timeout
+            expired = {f for f in pending if deadlines.get(f, float("inf")) <= now}
+            for future in expired:
+                errors.append(TimeoutError(f"Web search timed out after {timeout}s"))
+                _record_search("timeout")
+            pending -= expired
+            if budget is not None and updates and now - started >= budget:
+                break
+            done, pending = wait(
+                pending, timeout=_POLL_INTERVAL, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    update = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    _record_search("error")
+                    continue
+                updates.append({**update, "search_id": futures[future]["id"]})
+                _record_search("ok", update)
+    finally:
+        for future in pending:
+            # Queued searches never start; running ones finish (and bill) unused
+            _record_search("dropped" if future.cancel() else "abandoned")
+        pool.shutdown(wait=False, cancel_futures=True)
+    return _merge_searches(state, updates, errors)
+
+
+async def aweb_research(state: WebResearchState, config: RunnableConfig) -> OverallState:
+    """Async version of `web_research`; stragglers are cancelled."""
+    max_in_flight, timeout, quorum, budget = _fan_out_limits(state, config)
+    slots = asyncio.Semaphore(max_in_flight)
+
+    async def run(search: WebSearchState) -> OverallState:
+        async with slots:
+            return await asyncio.wait_for(_asearch(search, config), timeout)
+
+    tasks = {asyncio.create_task(run(search)): search for search in state["searches"]}
+    budget_ends = time.monotonic() + budget if budget is not None else None
+    updates, errors = [], []
+    pending = set(tasks)
+    try:
+        while pending and len(updates) < quorum:
+            # The time budget only applies once there is something to reflect on
+            wait_for = (
+                max(0.0, budget_ends - time.monotonic())
+                if budget_ends is not None and updates
+                else None
+            )
+            done, pending = await asyncio.wait(
+                pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                try:
+                    update = task.result()
+                except TimeoutError as e:
+                    errors.append(e)
+                    _record_search("timeout")
+                    continue
+                except Exception as e:
+                    errors.append(e)
+                    _record_search("error")
+                    continue
+                updates.append({**update, "search_id": tasks[task]["id"]})
+                _record_search("ok", update)
+    finally:
+        for task in pending:
+            task.cancel()
+            _record_search("dropped")
+    return _merge_searches(state, updates, errors)
+
+
+def _max_research_loops(state: OverallState, configurable: Configuration) -> int:
+    if state.get("max_research_loops") is not None:
+        return state["max_research_loops"]
+    return configurable.max_research_loops
+
+
+def _research_summaries(state: OverallState, use_digest: bool, separator: str) -> str:
+    """Join the research results for a prompt.
+
+    With `use_digest`, results already folded into the research digest are
+    replaced by the digest, so the prompt stays bounded across loops.
+    """
+    results = state["web_research_result"]
+    digest = state.get("research_digest") if use_digest else None
+    if not digest:
+        return separator.join(results)
+    new_results = results[state.get("digested_results", 0) :]
+    return separator.join([f"Digest of earlier findings:\n{digest}", *new_results])
+
+
+def continue_to_digest(state: OverallState, config: RunnableConfig) -> str:
+    """LangGraph routing function that decides whether to update the research digest.
+
+    The digest runs next to reflection and is only updated when a later prompt
+    reads it: another loop may follow, or finalize_answer is prompted with it.
     """
     configurable = Configuration.from_runnable_config(config)
+    if not configurable.research_digest:
+        return END
+    if configurable.answer_from_digest:
+        return "update_digest"
+    # Reflection increments research_loop_count after this decision
+    last_loop = state.get("research_loop_count", 0) + 1 >= _max_research_loops(
+        state, configurable
+    )
+    if last_loop or _skip_reflection(state, config):
+        return END
+    return "update_digest"
+
+
+def _digest_prompt(state: OverallState, config: RunnableConfig):
+    """Build the digest LLM and its prompt for `update_digest`."""
+    configurable = Configuration.from_runnable_config(config)
+    results = state["web_research_result"]
+    formatted_prompt = digest_instructions.format(
+        research_topic=get_research_topic(state["messages"]),
+        max_words=configurable.digest_max_words,
+        digest=state.get("research_digest") or "(empty)",
+        new_results="\n\n---\n\n".join(results[state.get("digested_results", 0) :]),
+    )
+    llm = get_chat_model(configurable.digest_model, temperature=0, max_retries=0)
+    return llm, configurable.digest_model, formatted_prompt
+
+
+def _digest_update(state: OverallState, prompt: str, result) -> OverallState:
+    return {
+        "research_digest": result.content.strip(),
+        "digested_results": len(state["web_research_result"]),
+        "tokens_used": _tokens_spent(prompt, result),
+    }
+
+
+def update_digest(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that folds the latest research results into the running digest.
+
+    Runs in the same step as reflection, so it adds no latency to the loop. The
+    digest keeps each distinct fact once with its citation markers, and later
+    reflection (and optionally answer) prompts read it in place of the results
+    it covers.
+
+    Args:
+        state: Current graph state containing the research results and digest
+        config: Configuration for the runnable, including the digest model
+
+    Returns:
+        Dictionary with state update, including research_digest and the number of results it covers
+    """
+    llm, model, formatted_prompt = _digest_prompt(state, config)
+    result = get_rate_limiter().call(
+        model,
+        "research",
+        formatted_prompt,
+        lambda: llm.invoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _digest_update(state, formatted_prompt, result)
+
+
+async def aupdate_digest(state: OverallState, config: RunnableConfig) -> OverallState:
+    """Async version of `update_digest`."""
+    llm, model, formatted_prompt = _digest_prompt(state, config)
+    result = await get_rate_limiter().acall(
+        model,
+        "research",
+        formatted_prompt,
+        lambda: llm.ainvoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _digest_update(state, formatted_prompt, result)
+
+
+def _reflection_prompt(state: OverallState, config: RunnableConfig):
+    """Build the structured reasoning LLM and its prompt for `reflection`."""
+    configurable = Configuration.from_runnable_config(config)
     # Increment the research loop count and get the reasoning model
     state["research_loop_count"] = state.get("research_loop_count", 0) + 1
     reasoning_model = state.get("reasoning_model") or configurable.reasoning_model
@@ -160,26 +555,87 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     formatted_prompt = reflection_instructions.format(
         current_date=current_date,
         research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
+        summaries=_research_summaries(
+            state, configurable.research_digest, "\n\n---\n\n"
+        ),
     )
-    # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    # Reasoning Model, shared across node executions
+    structured_llm = get_chat_model(
+        reasoning_model, temperature=1.0, max_retries=0, schema=Reflection
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
+    return structured_llm, reasoning_model, formatted_prompt
+
 
+def _reflection_update(
+    state: OverallState, result: Reflection, tokens_used: int
+) -> ReflectionState:
     return {
         "is_sufficient": result.is_sufficient,
         "knowledge_gap": result.knowledge_gap,
         "follow_up_queries": result.follow_up_queries,
         "research_loop_count": state["research_loop_count"],
         "number_of_ran_queries": len(state["search_query"]),
+        "loop_started_at": record_loop(state.get("loop_started_at")),
+        "tokens_used": tokens_used,
     }
 
 
+def _skip_reflection(state: OverallState, config: RunnableConfig) -> bool:
+    """Whether the budget rules out another loop, making reflection pointless."""
+    budget = ResearchBudget.from_state(state, Configuration.from_runnable_config(config))
+    return budget.searches_that_fit(1) == 0
+
+
+# Reflection result used when no further loop fits in the budget
+BUDGET_EXHAUSTED = Reflection(
+    is_sufficient=False,
+    knowledge_gap="Not evaluated: the research budget does not allow another loop.",
+    follow_up_queries=[],
+)
+
+
+def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+    """LangGraph node that identifies knowledge gaps and generates potential follow-up queries.
+
+    Analyzes the current summary to identify areas for further research and generates
+    potential follow-up queries. Uses structured output to extract
+    the follow-up query in JSON format.
+
+    Args:
+        state: Current graph state containing the running summary and research topic
+        config: Configuration for the runnable, including LLM provider settings
+
+    Returns:
+        Dictionary with state update, including search_query key containing the generated follow-up query
+    """
+    structured_llm, model, formatted_prompt = _reflection_prompt(state, config)
+    if _skip_reflection(state, config):
+        return _reflection_update(state, BUDGET_EXHAUSTED, 0)
+    result = get_rate_limiter().call(
+        model,
+        "research",
+        formatted_prompt,
+        lambda: structured_llm.invoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _reflection_update(state, result, _tokens_spent(formatted_prompt, result))
+
+
+async def areflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+    """Async version of `reflection`."""
+    structured_llm, model, formatted_prompt = _reflection_prompt(state, config)
+    if _skip_reflection(state, config):
+        return _reflection_update(state, BUDGET_EXHAUSTED, 0)
+    result = await get_rate_limiter().acall(
+        model,
+        "research",
+        formatted_prompt,
+        lambda: structured_llm.ainvoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _reflection_update(state, result, _tokens_spent(formatted_prompt, result))
+
+
 def evaluate_research(
     state: ReflectionState,
     config: RunnableConfig,
@@ -187,7 +643,9 @@ def evaluate_research(
     """LangGraph routing function that determines the next step in the research flow.
 
     Controls the research loop by deciding whether to continue gathering information
-    or to finalize the summary based on the configured maximum number of research loops.
+    or to finalize the summary based on the configured maximum number of research loops
+    and on whether another loop fits in the run's remaining time and token budget.
+    Follow-up queries are trimmed to what the budget allows.
 
     Args:
         state: Current graph state containing the research loop count
@@ -197,39 +655,40 @@ def evaluate_research(
         String literal indicating the next node to visit ("web_research" or "finalize_summary")
     """
     configurable = Configuration.from_runnable_config(config)
-    max_research_loops = (
-        state.get("max_research_loops")
-        if state.get("max_research_loops") is not None
-        else configurable.max_research_loops
-    )
+    max_research_loops = _max_research_loops(state, configurable)
     if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
         return "finalize_answer"
-    else:
-        return [
-            Send(
-                "web_research",
-                {
-                    "search_query": follow_up_query,
-                    "id": state["number_of_ran_queries"] + int(idx),
+    follow_up_queries = state["follow_up_queries"][
+        : ResearchBudget.from_state(state, configurable).searches_that_fit(
+            len(state["follow_up_queries"])
+        )
+    ]
+    if not follow_up_queries:
+        return "finalize_answer"
+    return [
+        Send(
+            "web_research",
+            {
+                "searches": [
+                    {
+                        "search_query": follow_up_query,
+                        "id": state["number_of_ran_queries"] + int(idx),
+                    }
+                    for idx, follow_up_query in enumerate(follow_up_queries)
+                ],
+                "deadline": state.get("deadline"),
+                "short_urls": {
+                    source["value"]: source["short_url"]
+                    for source in reversed(state.get("sources_gathered", []))
+                    if source.get("short_url")
                 },
-            )
-            for idx, follow_up_query in enumerate(state["follow_up_queries"])
-        ]
-
-
-def finalize_answer(state: OverallState, config: RunnableConfig):
-    """LangGraph node that finalizes the research summary.
-
-    Prepares the final output by deduplicating and formatting sources, then
-    combining them with the running summary to create a well-structured
-    research report with proper citations.
+            },
+        )
+    ]
 
-    Args:
-        state: Current graph state containing the running summary and sources gathered
 
-    Returns:
-        Dictionary with state update, including running_summary key containing the formatted final summary with sources
-    """
+def _answer_prompt(state: OverallState, config: RunnableConfig):
+    """Build the answer LLM and its prompt for `finalize_answer`."""
     configurable = Configuration.from_runnable_config(config)
     reasoning_model = state.get("reasoning_model") or configurable.reasoning_model
 
@@ -238,41 +697,87 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
     formatted_prompt = answer_instructions.format(
         current_date=current_date,
         research_topic=get_research_topic(state["messages"]),
-        summaries="\n---\n\n".join(state["web_research_result"]),
+        summaries=_research_summaries(
+            state,
+            configurable.research_digest and configurable.answer_from_digest,
+            "\n---\n\n",
+        ),
     )
 
-    # init Reasoning Model, default to Gemini 2.5 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
-    result = llm.invoke(formatted_prompt)
+    # Reasoning Model, default to Gemini 2.5 Flash
+    llm = get_chat_model(reasoning_model, temperature=0, max_retries=0)
+    return llm, reasoning_model, formatted_prompt
 
+
+def _answer_update(state: OverallState, prompt: str, result) -> OverallState:
     # Replace the short urls with the original urls and add all used urls to the sources_gathered
-    unique_sources = []
-    for source in state["sources_gathered"]:
-        if source["short_url"] in result.content:
-            result.content = result.content.replace(
-                source["short_url"], source["value"]
-            )
-            unique_sources.append(source)
+    content, unique_sources = replace_short_urls(
+        result.content, state["sources_gathered"]
+    )
 
     return {
-        "messages": [AIMessage(content=result.content)],
+        "messages": [AIMessage(content=content)],
         "sources_gathered": unique_sources,
+        "tokens_used": _tokens_spent(prompt, result),
     }
 
 
+def finalize_answer(state: OverallState, config: RunnableConfig):
+    """LangGraph node that finalizes the research summary.
+
+    Prepares the final output by deduplicating and formatting sources, then
+    combining them with the running summary to create a well-structured
+    research report with proper citations.
+
+    Args:
+        state: Current graph state containing the running summary and sources gathered
+
+    Returns:
+        Dictionary with state update, including running_summary key containing the formatted final summary with sources
+    """
+    llm, model, formatted_prompt = _answer_prompt(state, config)
+    result = get_rate_limiter().call(
+        model,
+        "answer",
+        formatted_prompt,
+        lambda: llm.invoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _answer_update(state, formatted_prompt, result)
+
+
+async def afinalize_answer(state: OverallState, config: RunnableConfig):
+    """Async version of `finalize_answer`."""
+    llm, model, formatted_prompt = _answer_prompt(state, config)
+    result = await get_rate_limiter().acall(
+        model,
+        "answer",
+        formatted_prompt,
+        lambda: llm.ainvoke(formatted_prompt, with_llm_metrics(config)),
+        on_retry=llm_retry_counter(config, model),
+    )
+    return _answer_update(state, formatted_prompt, result)
+
+
 # Create our Agent Graph
 builder = StateGraph(OverallState, config_schema=Configuration)
 
-# Define the nodes we will cycle between
-builder.add_node("generate_query", generate_query)
-builder.add_node("web_research", web_research)
-builder.add_node("reflection", reflection)
-builder.add_node("finalize_answer", finalize_answer)
+# Define the nodes we will cycle between. Each node has a sync and an async
+# implementation so the graph works with both `invoke` and `ainvoke`/`astream`
+# without blocking the caller's event loop. Both are instrumented for /metrics.
+for name, func, afunc in [
+    ("generate_query", generate_query, agenerate_query),
+    ("web_research", web_research, aweb_research),
+    ("reflection", reflection, areflection),
+    ("update_digest", update_digest, aupdate_digest),
+    ("finalize_answer", finalize_answer, afinalize_answer),
+]:
+    builder.add_node(
+        name,
+        RunnableLambda(
+            instrument_node(name, func), afunc=instrument_node(name, afunc), name=name
+        ),
+    )
 
 # Set the entrypoint as `generate_query`
 # This means that this node is the first one called
@@ -283,6 +788,8 @@ builder.add_conditional_edges(
 )
 # Reflect on the web research
 builder.add_edge("web_research", "reflection")
+# Fold the results into the research digest next to reflection
+builder.add_conditional_edges("web_research", continue_to_digest, ["update_digest", END])
 # Evaluate the research
 builder.add_conditional_edges(
     "reflection", evaluate_research, ["web_research", "finalize_answer"]
@@ -291,3 +798,6 @@ builder.add_conditional_edges(
 builder.add_edge("finalize_answer", END)
 
 graph = builder.compile(name="pro-search-agent")
+# Same graph checkpointing every step, for runs that resume after a failure.
+# `graph` stays without a checkpointer: the LangGraph server brings its own.
+durable_graph = builder.compile(name="pro-search-agent", checkpointer=get_checkpointer())
@@ -0,0 +1,258 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+
+from agent.metrics import REGISTRY, SIZE_BUCKETS
+
+# OpenTelemetry is optional: spans are only recorded when it is installed
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+
+    _tracer = trace.get_tracer("agent.research")
+except ImportError:
+    _tracer = None
+
+NODE_SECONDS = REGISTRY.histogram(
+    "research_node_duration_seconds",
+    "Wall time of research graph node executions.",
+    ["node"],
+)
+NODE_ERRORS = REGISTRY.counter(
+    "research_node_errors_total", "Research graph node executions that raised.", ["node"]
+)
+NODE_PAYLOAD_BYTES = REGISTRY.histogram(
+    "research_node_payload_bytes",
+    "Size of the state update returned by a research graph node.",
+    ["node"],
+    SIZE_BUCKETS,
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "research_llm_duration_seconds",
+    "Latency of LLM calls made by research graph nodes.",
+    ["node", "model"],
+)
+LLM_PROMPT_BYTES = REGISTRY.histogram(
+    "research_llm_prompt_bytes",
+    "Size of the prompts sent by research graph nodes.",
+    ["node"],
+    SIZE_BUCKETS,
+)
+LLM_TOKENS = REGISTRY.counter(
+    "research_llm_tokens_total",
+    "Prompt and completion tokens used by research graph nodes.",
+    ["node", "model", "kind"],
+)
+LLM_RETRIES = REGISTRY.counter(
+    "research_llm_retries_total",
+    "LLM calls retried by the Gemini rate limiter.",
+    ["node", "model"],
+)
+LLM_ERRORS = REGISTRY.counter(
+    "research_llm_errors_total", "Failed LLM call attempts.", ["node", "model"]
+)
+LOOP_SECONDS = REGISTRY.histogram(
+    "research_loop_duration_seconds",
+    "Wall time of one research loop, from its web research fan-out through reflection.",
+)
+LOOPS = REGISTRY.counter("research_loops_total", "Completed research loops.")
+SEARCH_OUTCOMES = REGISTRY.counter(
+    "research_search_outcomes_total",
+    "Web searches of the research fan-out by outcome (ok, error, timeout, dropped, abandoned).",
+    ["outcome"],
+)
+A2A_HOP_SECONDS = REGISTRY.histogram(
+    "a2a_hop_duration_seconds",
+    "Latency of agent-to-agent calls, including the remote processing time.",
+    ["hop"],
+)
+
+
+@contextmanager
+def start_span(name: str, carrier: Optional[dict] = None, **attributes):
+    """Open an OpenTelemetry span (no-op without OpenTelemetry).
+
+    Args:
+        name: Span name.
+        carrier: Optional dict with trace context propagated from the calling agent.
+        **attributes: Span attributes.
+    """
+    if _tracer is None:
+        yield None
+        return
+    token = None
+    if carrier:
+        token = otel_context.attach(propagate.extract(carrier))
+    try:
+        with _tracer.start_as_current_span(name, attributes=attributes) as span:
+            yield span
+    finally:
+        if token is not None:
+            otel_context.detach(token)
+
+
+def trace_carrier(message: Any) -> Optional[dict]:
+    """Return the trace context carried in an A2A message's metadata, if any."""
+    metadata = getattr(message, "metadata", None)
+    return getattr(metadata, "custom_fields", None) or None
+
+
+def inject_trace_context() -> dict:
+    """Return the current trace context as a dict to forward with an A2A message."""
+    carrier: dict = {}
+    if _tracer is not None:
+        propagate.inject(carrier)
+    return carrier
+
+
+def _payload_size(update: Any) -> int:
+    """Approximate size in characters of a node's state update."""
+    if not isinstance(update, dict):
+        return 0
+    size = 0
+    for value in update.values():
+        for item in value if isinstance(value, list) else [value]:
+            content = getattr(item, "content", item)
+            size += len(content) if isinstance(content, str) else len(str(content))
+    return size
+
+
+def instrument_node(name: str, func):
+    """Wrap a sync or async graph node to record its wall time, payload size and span."""
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with start_span(f"research.{name}"):
+                try:
+                    update = await func(*args, **kwargs)
+                except Exception:
+                    NODE_ERRORS.inc(node=name)
+                    raise
+            NODE_SECONDS.observe(time.perf_counter() - started, node=name)
+            NODE_PAYLOAD_BYTES.observe(_payload_size(update), node=name)
+            return update
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        with start_span(f"research.{name}"):
+            try:
+                update = func(*args, **kwargs)
+            except Exception:
+                NODE_ERRORS.inc(node=name)
+                raise
+        NODE_SECONDS.observe(time.perf_counter() - started, node=name)
+        NODE_PAYLOAD_BYTES.observe(_payload_size(update), node=name)
+        return update
+
+    return wrapper
+
+
+def record_loop(loop_started_at: Optional[float]) -> float:
+    """Record a completed research loop and return the start time of the next one."""
+    now = time.time()
+    LOOPS.inc()
+    if loop_started_at:
+        LOOP_SECONDS.observe(now - loop_started_at)
+    return now
+
+
+def record_llm_call(
+    node: str, model: str, seconds: float, prompt: str, usage: Any = None
+) -> None:
+    """Record an LLM call made outside LangChain (e.g. the grounded genai search)."""
+    LLM_SECONDS.observe(seconds, node=node, model=model)
+    LLM_PROMPT_BYTES.observe(len(prompt), node=node)
+    if usage is not None:
+        LLM_TOKENS.inc(
+            getattr(usage, "prompt_token_count", None) or 0,
+            node=node,
+            model=model,
+            kind="prompt",
+        )
+        LLM_TOKENS.inc(
+            getattr(usage, "candidates_token_count", None) or 0,
+            node=node,
+            model=model,
+            kind="completion",
+        )
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback recording latency, prompt size, tokens and errors of LLM calls.
+
+    Retries are scheduled by the Gemini rate limiter, not LangChain; they are
+    counted through `llm_retry_counter`.
+    """
+
+    def __init__(self):
+        """Create the callback; one instance serves every LLM call of the process."""
+        self._runs: dict[UUID, tuple[float, str, str]] = {}
+
+    def _start(self, run_id: UUID, metadata, kwargs, prompt_size: int) -> None:
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        model = (kwargs.get("invocation_params") or {}).get("model") or (
+            metadata or {}
+        ).get("ls_model_name", "unknown")
+        self._runs[run_id] = (time.perf_counter(), node, model)
+        LLM_PROMPT_BYTES.observe(prompt_size, node=node)
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, metadata=None, **kwargs
+    ):
+        """Start timing a chat model call and record its prompt size."""
+        size = sum(len(str(m.content)) for batch in messages for m in batch)
+        self._start(run_id, metadata, kwargs, size)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        """Start timing a completion model call and record its prompt size."""
+        self._start(run_id, metadata, kwargs, sum(len(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        """Record the latency and token usage of a finished call."""
+        started, node, model = self._runs.pop(run_id, (None, "unknown", "unknown"))
+        if started is not None:
+            LLM_SECONDS.observe(time.perf_counter() - started, node=node, model=model)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(
+                        usage.get("input_tokens", 0), node=node, model=model, kind="prompt"
+                    )
+                    LLM_TOKENS.inc(
+                        usage.get("output_tokens", 0),
+                        node=node,
+                        model=model,
+                        kind="completion",
+                    )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        """Count a failed call."""
+        _, node, model = self._runs.pop(run_id, (None, "unknown", "unknown"))
+        LLM_ERRORS.inc(node=node, model=model)
+
+
+LLM_METRICS = LLMMetricsCallback()
+
+
+def llm_retry_counter(config: Optional[RunnableConfig], model: str) -> Callable[[], None]:
+    """Return an `on_retry` hook for the rate limiter counting retries of the node's LLM calls."""
+    node = ((config or {}).get("metadata") or {}).get("langgraph_node", "unknown")
+    return lambda: LLM_RETRIES.inc(node=node, model=model)
+
+
+def with_llm_metrics(config: Optional[RunnableConfig]) -> RunnableConfig:
+    """Return the node config with the LLM metrics callback added."""
+    return merge_configs(config, {"callbacks": [LLM_METRICS]})
@@ -0,0 +1,256 @@
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Iterable, Optional
+
+# Minimal Prometheus-style metrics registry shared by the graph and the A2A agents.
+# Each agent runs in its own process, so processes periodically write a JSON
+# snapshot of their metrics to METRICS_DIR and the FastAPI app aggregates them
+# when serving /metrics.
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "a2a_metrics")
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1.0"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (100, 1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+
+logger = logging.getLogger(__name__)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        """Return the metric's description and values as JSON-serializable data."""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "documentation": self.documentation,
+                "labelnames": list(self.labelnames),
+                "values": [[list(key), value] for key, value in self._values.items()],
+            }
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increase the counter for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value per label combination that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        """Set the gauge for the given label values."""
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increase (or with a negative amount, decrease) the gauge."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Histogram(_Metric):
+    """Distribution of observations over cumulative buckets, per label combination.
+
+    Args:
+        name: Metric name.
+        documentation: Help text rendered with the metric.
+        labelnames: Names of the labels the observations are split by.
+        buckets: Upper bounds of the buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        """Create a histogram without observations."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        """Record an observation for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            counts = [c + (value <= b) for c, b in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    def mean(self, default: float, **labels) -> float:
+        """Mean of the observations for the given label values, or `default` if none."""
+        with self._lock:
+            _, total, count = self._values.get(self._key(labels), (None, 0.0, 0))
+        return total / count if count else default
+
+    def snapshot(self) -> dict:
+        """Return the histogram's description, buckets and values as JSON-serializable data."""
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class MetricsRegistry:
+    """Holds the metrics of one process and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        """Create an empty registry; the flusher starts with `start_flusher`."""
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        """Return the counter registered under `name`, creating it if needed."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        """Return the gauge registered under `name`, creating it if needed."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Return the histogram registered under `name`, creating it if needed."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        """Return the current values of all metrics as JSON-serializable data."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def flush(self, service: str, directory: str = METRICS_DIR) -> None:
+        """Write this process' snapshot for aggregation by the /metrics endpoint."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{service}-{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self, service: str, directory: str = METRICS_DIR) -> None:
+        """Flush the snapshot every METRICS_FLUSH_INTERVAL seconds from a daemon thread."""
+        with self._lock:
+            if self._flusher is not None:
+                return
+
+            def run():
+                while True:
+                    try:
+                        self.flush(service, directory)
+                    except OSError as e:
+                        logger.warning("Could not write metrics snapshot: %s", e)
+                    time.sleep(METRICS_FLUSH_INTERVAL)
+
+            self._flusher = threading.Thread(
+                target=run, name="metrics-flusher", daemon=True
+            )
+            self._flusher.start()
+
+
+def load_snapshots(
+    directory: str = METRICS_DIR,
+    exclude_pid: Optional[int] = None,
+    max_age: float = 300.0,
+):
+    """Load the snapshots written by other processes, skipping stale ones."""
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        if exclude_pid is not None and path.endswith(f"-{exclude_pid}.json"):
+            continue
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                continue
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _merge(snapshots: list[dict]) -> dict:
+    merged: dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "values": {}})
+            for labels, value in metric["values"]:
+                key = tuple(labels)
+                if metric["kind"] != "histogram":
+                    target["values"][key] = target["values"].get(key, 0.0) + value
+                    continue
+                counts, total, count = target["values"].get(
+                    key, ([0] * len(metric["buckets"]), 0.0, 0)
+                )
+                target["values"][key] = (
+                    [a + b for a, b in zip(counts, value[0])],
+                    total + value[1],
+                    count + value[2],
+                )
+    return merged
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_prometheus(snapshots: list[dict]) -> str:
+    """Render (and sum across processes) snapshots in the Prometheus text format."""
+    lines = []
+    for name, metric in sorted(_merge(snapshots).items()):
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        names = metric["labelnames"]
+        for key, value in metric["values"].items():
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, key)} {value}")
+                continue
+            counts, total, count = value
+            for bound, bucket_count in zip(metric["buckets"], counts):
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(names, key, le)} {bucket_count}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_labels(names, key, le)} {count}")
+            lines.append(f"{name}_sum{_labels(names, key)} {total}")
+            lines.append(f"{name}_count{_labels(names, key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
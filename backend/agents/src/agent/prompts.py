@@ -79,6 +79,21 @@ Summaries:
 {summaries}
 """
 
+digest_instructions = """Merge new research findings about "{research_topic}" into a running digest.
+
+Instructions:
+- The digest is the only record of earlier findings that later research steps see, keep every distinct fact, figure and date.
+- State each fact once: drop repetitions and merge facts that say the same thing.
+- Keep the citation markers exactly as written (e.g. [source](https://...)) next to the facts they support; a merged fact keeps the markers of all its sources.
+- Use short bullet points grouped by subtopic, without commentary or conclusions.
+- Stay under {max_words} words; when space runs out, shorten the least relevant facts first.
+
+Current Digest:
+{digest}
+
+New Findings:
+{new_results}"""
+
 answer_instructions = """Generate a high-quality answer to the user's question based on the provided summaries.
 
 Instructions:
@@ -0,0 +1,433 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from agent.metrics import REGISTRY
+
+# Process-wide rate limiting and retry scheduling for every Gemini call. Each
+# model gets a token bucket for requests (RPM) and one for tokens (TPM); callers
+# wait in priority order (routing > answer > research > search) until both
+# buckets allow the call. Retryable errors (429/5xx) are retried with jittered
+# exponential backoff while the process-wide retry budget allows it, and every
+# 429 halves the model's refill rate, which then recovers gradually on success.
+# Limits are per process: with several agent processes (or replicas) sharing one
+# quota, set GEMINI_RPM / GEMINI_TPM to their share of it.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+# Per-model overrides, e.g. "gemini-2.0-flash=2000:4000000,gemini-2.5-pro=150:2000000"
+GEMINI_RATE_LIMITS = os.getenv("GEMINI_RATE_LIMITS", "")
+# Burst allowance in seconds of the limit. Quotas are enforced over sliding
+# windows, so a bucket holding a full minute would allow twice the quota
+GEMINI_BURST_SECONDS = float(os.getenv("GEMINI_BURST_SECONDS", "5"))
+# Expected completion tokens charged up front; corrected once usage is known
+GEMINI_OUTPUT_TOKENS = int(os.getenv("GEMINI_OUTPUT_TOKENS", "512"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "20"))
+# Retries may add at most this fraction of extra calls, plus a floor of
+# GEMINI_RETRY_BUDGET_MIN retries, so an outage does not multiply the load
+GEMINI_RETRY_BUDGET_RATIO = float(os.getenv("GEMINI_RETRY_BUDGET_RATIO", "0.2"))
+GEMINI_RETRY_BUDGET_MIN = float(os.getenv("GEMINI_RETRY_BUDGET_MIN", "10"))
+GEMINI_MAX_THROTTLE_WAIT = float(os.getenv("GEMINI_MAX_THROTTLE_WAIT", "60"))
+
+# Lower value = served first
+PRIORITIES = {"routing": 0, "answer": 1, "research": 2, "search": 3}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_ERRORS = {
+    "ResourceExhausted": 429,
+    "TooManyRequests": 429,
+    "InternalServerError": 500,
+    "ServiceUnavailable": 503,
+    "DeadlineExceeded": 504,
+}
+THROTTLE_SECONDS = REGISTRY.histogram(
+    "gemini_throttle_delay_seconds",
+    "Delay added to Gemini calls by rate limiting and retry backoff.",
+    ["model", "priority"],
+)
+RETRIES = REGISTRY.counter(
+    "gemini_retries_total",
+    "Gemini calls retried after a retryable error.",
+    ["model", "status"],
+)
+BUDGET_EXHAUSTED = REGISTRY.counter(
+    "gemini_retry_budget_exhausted_total",
+    "Retryable Gemini errors not retried because the retry budget was spent.",
+    ["model"],
+)
+RATE_SCALE = REGISTRY.gauge(
+    "gemini_rate_scale",
+    "Fraction of the configured request rate currently allowed after 429s.",
+    ["model"],
+)
+
+T = TypeVar("T")
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a call waited longer than GEMINI_MAX_THROTTLE_WAIT for capacity."""
+
+
+def _parse_overrides(spec: str) -> dict[str, tuple[float, float]]:
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, limits = item.split("=")
+        rpm, tpm = limits.split(":")
+        overrides[model.strip()] = (float(rpm), float(tpm))
+    return overrides
+
+
+class TokenBucket:
+    """Bucket refilled continuously at `per_minute / 60` per second.
+
+    Holds at most `burst_seconds` worth of refill (and at least one unit).
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = GEMINI_BURST_SECONDS):
+        """Create a full bucket for `per_minute` units a minute."""
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.scale = 1.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate * self.scale
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 when it can be taken now)."""
+        self._refill(now)
+        # Calls larger than the bucket only need a full bucket
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / (self.rate * self.scale))
+
+    def take(self, amount: float) -> None:
+        """Take `amount` units; the balance may go negative after a large call."""
+        self.tokens -= amount
+
+
+class ModelLimiter:
+    """RPM and TPM buckets of one model plus its priority queue of waiting calls."""
+
+    def __init__(self, model: str, rpm: float, tpm: float):
+        """Create the limiter of `model` with `rpm` requests and `tpm` tokens a minute."""
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # Heap of (priority, sequence, tokens) and the tickets granted from it
+        self._waiters: list[tuple[int, int, float]] = []
+        self._granted: set[tuple[int, int, float]] = set()
+        # Wakes the waiter of a ticket when it is granted or becomes the head
+        self._wakers: dict[tuple[int, int, float], Callable[[], None]] = {}
+        self._lock = threading.Lock()
+
+    def _enqueue(self, ticket: tuple[int, int, float], wake: Callable[[], None]) -> None:
+        with self._lock:
+            heapq.heappush(self._waiters, ticket)
+            self._wakers[ticket] = wake
+
+    def _dequeue(self, ticket: tuple[int, int, float]) -> None:
+        with self._lock:
+            self._granted.discard(ticket)
+            self._wakers.pop(ticket, None)
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._wake_head()
+
+    def _wake_head(self) -> None:
+        if self._waiters:
+            self._wakers[self._waiters[0]]()
+
+    def _grant(self) -> float:
+        """Grant capacity to waiters in priority order; return the head's wait, if any."""
+        now = time.monotonic()
+        granted = False
+        while self._waiters:
+            tokens = self._waiters[0][2]
+            wait = max(
+                self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now)
+            )
+            if wait > 0:
+                # The new head has to watch the buckets refill
+                if granted:
+                    self._wake_head()
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            ticket = heapq.heappop(self._waiters)
+            self._granted.add(ticket)
+            self._wakers.pop(ticket)()
+            granted = True
+        return 0.0
+
+    def _try_acquire(self, ticket: tuple[int, int, float]) -> float:
+        """Return 0 once `ticket` was granted, else how long to wait before asking again.
+
+        Only the head of the queue waits for the buckets to refill; the others wait
+        until they are granted or become the head.
+        """
+        with self._lock:
+            wait = self._grant()
+            if ticket in self._granted:
+                self._granted.discard(ticket)
+                return 0.0
+            if self._waiters[0] == ticket:
+                return min(wait, GEMINI_MAX_THROTTLE_WAIT)
+            return GEMINI_MAX_THROTTLE_WAIT
+
+    def _check_timeout(self, ticket: tuple[int, int, float], started: float) -> None:
+        if time.monotonic() - started > GEMINI_MAX_THROTTLE_WAIT:
+            self._dequeue(ticket)
+            raise RateLimitTimeout(
+                f"Waited over {GEMINI_MAX_THROTTLE_WAIT:.0f}s for {self.model} capacity"
+            )
+
+    def acquire(self, ticket: tuple[int, int, float]) -> None:
+        """Block until the call may be sent."""
+        started = time.monotonic()
+        woken = threading.Event()
+        self._enqueue(ticket, woken.set)
+        while True:
+            woken.clear()
+            if (wait := self._try_acquire(ticket)) == 0:
+                return
+            self._check_timeout(ticket, started)
+            woken.wait(wait)
+
+    async def aacquire(self, ticket: tuple[int, int, float]) -> None:
+        """Wait without blocking the event loop until the call may be sent."""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        # Tickets may be granted by waiters on other threads and event loops
+        self._enqueue(ticket, lambda: loop.call_soon_threadsafe(woken.set))
+        try:
+            while True:
+                woken.clear()
+                if (wait := self._try_acquire(ticket)) == 0:
+                    return
+                self._check_timeout(ticket, started)
+                try:
+                    async with asyncio.timeout(wait):
+                        await woken.wait()
+                except TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            self._dequeue(ticket)
+            raise
+
+    def settle(self, charged: float, used: Optional[int]) -> None:
+        """Correct the token bucket once the real token usage of a call is known."""
+        if used is not None:
+            with self._lock:
+                self.tokens.take(used - charged)
+
+    def throttled(self) -> None:
+        """Halve the request rate after a 429 (never below 5% of the limit)."""
+        with self._lock:
+            self.requests.scale = max(0.05, self.requests.scale / 2)
+            self.requests.tokens = min(self.requests.tokens, 0.0)
+        RATE_SCALE.set(self.requests.scale, model=self.model)
+
+    def succeeded(self) -> None:
+        """Recover the request rate additively after a successful call."""
+        if self.requests.scale < 1.0:
+            with self._lock:
+                self.requests.scale = min(1.0, self.requests.scale + 0.05)
+            RATE_SCALE.set(self.requests.scale, model=self.model)
+
+
+class RetryBudget:
+    """Allows retries in proportion to first attempts, plus a small floor."""
+
+    def __init__(self, ratio: float, minimum: float):
+        """Create a budget earning `ratio` retries per first attempt, starting at `minimum`."""
+        self.ratio = ratio
+        self.minimum = minimum
+        self.balance = minimum
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """Earn retry credit for a first attempt, capped at ten times the floor."""
+        with self._lock:
+            self.balance = min(self.balance + self.ratio, self.minimum * 10)
+
+    def withdraw(self) -> bool:
+        """Spend the credit of one retry; return False when the budget is exhausted."""
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+class GeminiRateLimiter:
+    """Registry of per-model limiters and the retry policy shared by a process."""
+
+    def __init__(
+        self,
+        rpm: float = GEMINI_RPM,
+        tpm: float = GEMINI_TPM,
+        overrides: str = GEMINI_RATE_LIMITS,
+        max_retries: int = GEMINI_MAX_RETRIES,
+    ):
+        """Create the limiter with default limits, per-model `overrides` ("model=rpm:tpm,...") and retry policy."""
+        self.rpm = rpm
+        self.tpm = tpm
+        self.overrides = _parse_overrides(overrides)
+        self.max_retries = max_retries
+        self.budget = RetryBudget(GEMINI_RETRY_BUDGET_RATIO, GEMINI_RETRY_BUDGET_MIN)
+        self._models: dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def model(self, model: str) -> ModelLimiter:
+        """Return the limiter of a model, creating it on first use."""
+        with self._lock:
+            if model not in self._models:
+                rpm, tpm = self.overrides.get(model, (self.rpm, self.tpm))
+                self._models[model] = ModelLimiter(model, rpm, tpm)
+            return self._models[model]
+
+    def _ticket(self, priority: str, tokens: float) -> tuple[int, int, float]:
+        return PRIORITIES[priority], next(self._sequence), tokens
+
+    def _retry_delay(self, model: str, error: Exception, attempt: int) -> Optional[float]:
+        """Backoff before the next attempt, or None when the error must be raised."""
+        status = retry_status(error)
+        if status is None or attempt >= self.max_retries:
+            return None
+        if not self.budget.withdraw():
+            BUDGET_EXHAUSTED.inc(model=model)
+            return None
+        RETRIES.inc(model=model, status=status)
+        if status == 429:
+            self.model(model).throttled()
+        # Full jitter keeps synchronized fan-out retries from colliding again
+        return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2**attempt))
+
+    def call(
+        self,
+        model: str,
+        priority: str,
+        prompt: str,
+        call: Callable[[], T],
+        on_retry: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """Run a blocking Gemini call under the model's limits, retrying retryable errors.
+
+        Args:
+            model: Gemini model name.
+            priority: One of PRIORITIES.
+            prompt: The prompt text, used to estimate the tokens of the call.
+            call: Zero-argument function performing the call.
+            on_retry: Optional hook called whenever a failed attempt is retried.
+        """
+        limiter = self.model(model)
+        tokens = estimate_tokens(prompt)
+        self.budget.deposit()
+        delay = 0.0
+        for attempt in itertools.count():
+            started = time.monotonic()
+            limiter.acquire(self._ticket(priority, tokens))
+            delay += time.monotonic() - started
+            try:
+                result = call()
+            except Exception as e:
+                backoff = self._retry_delay(model, e, attempt)
+                if backoff is None:
+                    THROTTLE_SECONDS.observe(delay, model=model, priority=priority)
+                    raise
+                if on_retry is not None:
+                    on_retry()
+                time.sleep(backoff)
+                delay += backoff
+                continue
+            limiter.settle(tokens, usage_tokens(result))
+            limiter.succeeded()
+            THROTTLE_SECONDS.observe(delay, model=model, priority=priority)
+            return result
+
+    async def acall(
+        self,
+        model: str,
+        priority: str,
+        prompt: str,
+        call: Callable[[], Awaitable[T]],
+        on_retry: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """Async version of `call`; `call` returns a new awaitable on every attempt."""
+        limiter = self.model(model)
+        tokens = estimate_tokens(prompt)
+        self.budget.deposit()
+        delay = 0.0
+        for attempt in itertools.count():
+            started = time.monotonic()
+            await limiter.aacquire(self._ticket(priority, tokens))
+            delay += time.monotonic() - started
+            try:
+                result = await call()
+            except Exception as e:
+                backoff = self._retry_delay(model, e, attempt)
+                if backoff is None:
+                    THROTTLE_SECONDS.observe(delay, model=model, priority=priority)
+                    raise
+                if on_retry is not None:
+                    on_retry()
+                await asyncio.sleep(backoff)
+                delay += backoff
+                continue
+            limiter.settle(tokens, usage_tokens(result))
+            limiter.succeeded()
+            THROTTLE_SECONDS.observe(delay, model=model, priority=priority)
+            return result
+
+
+def estimate_tokens(prompt: str) -> float:
+    """Rough token count of a call: ~4 characters per prompt token plus the expected output."""
+    return len(prompt) / 4 + GEMINI_OUTPUT_TOKENS
+
+
+def usage_tokens(result: Any) -> Optional[int]:
+    """Total tokens reported by a genai response or LangChain message, if any."""
+    usage = getattr(result, "usage_metadata", None)
+    if isinstance(usage, dict):
+        return usage.get("total_tokens")
+    return getattr(usage, "total_token_count", None)
+
+
+def retry_status(error: BaseException) -> Optional[int]:
+    """HTTP status of a retryable Gemini error, or None if it should not be retried."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        for attribute in ("code", "status_code"):
+            status = getattr(error, attribute, None)
+            if isinstance(status, int) and status in RETRYABLE_STATUS:
+                return status
+        if type(error).__name__ in _RETRYABLE_ERRORS:
+            return _RETRYABLE_ERRORS[type(error).__name__]
+        error = error.__cause__ or error.__context__
+    return None
+
+
+_limiter: Optional[GeminiRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> GeminiRateLimiter:
+    """Return the process-wide Gemini rate limiter."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = GeminiRateLimiter()
+        return _limiter
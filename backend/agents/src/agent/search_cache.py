@@ -0,0 +1,123 @@
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from agent.cache import SQLiteCache, TTLCache, make_cache, normalize_text
+from agent.utils import reissue_short_urls
+
+# Process-wide cache of grounded web_research results. A bounded in-memory tier
+# sits in front of an optional SQLite tier that persists results across runs and
+# processes. Results are bucketed by day since the search prompt includes the date.
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "86400"))
+SEARCH_CACHE_DISK_SIZE = int(os.getenv("SEARCH_CACHE_DISK_SIZE", "50000"))
+# Empty path disables the on-disk tier. The default lives in the backend directory,
+# so every replica shares one file whatever its working directory.
+SEARCH_CACHE_PATH = os.getenv(
+    "SEARCH_CACHE_PATH",
+    str(Path(__file__).resolve().parents[3] / ".cache" / "web_research.sqlite"),
+)
+
+
+class SearchResultCache:
+    """Two-tier cache of `web_research` results keyed on (normalized query, model, date bucket).
+
+    Entries keep the `id` they were created with; `get` re-issues the short urls of
+    the cited sources under the id of the requesting branch so they stay unique
+    within a run.
+
+    Args:
+        memory: In-memory tier.
+        disk: Optional persistent tier shared across processes.
+    """
+
+    def __init__(self, memory: TTLCache, disk: Optional[SQLiteCache] = None):
+        """Create the cache over its tiers."""
+        self.memory = memory
+        self.disk = disk
+
+    @staticmethod
+    def key(query: str, model: str) -> str:
+        """Return the cache key of a search query for a model on the current day."""
+        return f"{model}|{datetime.now():%Y-%m-%d}|{normalize_text(query)}"
+
+    def get(self, query: str, model: str, id: int) -> Optional[dict[str, Any]]:
+        """Return the cached `web_research` state update for `query`, re-issued under `id`."""
+        key = self.key(query, model)
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        if entry is None:
+            return None
+
+        old_id = entry["id"]
+        return {
+            "sources_gathered": [
+                {
+                    **source,
+                    "short_url": source["short_url"]
+                    and reissue_short_urls(source["short_url"], old_id, id),
+                }
+                for source in entry["sources"]
+            ],
+            "search_query": [query],
+            "web_research_result": [reissue_short_urls(entry["text"], old_id, id)],
+        }
+
+    def set(
+        self,
+        query: str,
+        model: str,
+        id: int,
+        update: dict[str, Any],
+        grounding_chunks: Optional[list] = None,
+    ) -> None:
+        """Store a `web_research` state update produced for the branch `id`."""
+        entry = {
+            "id": id,
+            "text": update["web_research_result"][0],
+            "sources": update["sources_gathered"],
+            "chunks": [
+                {"uri": chunk.web.uri, "title": chunk.web.title}
+                for chunk in grounding_chunks or []
+            ],
+        }
+        key = self.key(query, model)
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Return the counters of both tiers."""
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+_lock = threading.Lock()
+_search_cache: Optional[SearchResultCache] = None
+
+
+def get_search_cache() -> SearchResultCache:
+    """Return the process-wide search result cache, creating it on first use."""
+    global _search_cache
+    with _lock:
+        if _search_cache is None:
+            memory = TTLCache(max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+            disk = (
+                make_cache(
+                    "sqlite",
+                    path=SEARCH_CACHE_PATH,
+                    max_entries=SEARCH_CACHE_DISK_SIZE,
+                    ttl=SEARCH_CACHE_TTL,
+                )
+                if SEARCH_CACHE_PATH
+                else None
+            )
+            _search_cache = SearchResultCache(memory, disk)
+        return _search_cache
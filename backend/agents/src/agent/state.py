@@ -1,26 +1,30 @@
 from __future__ import annotations
 
+import operator
 from dataclasses import dataclass, field
 from typing import TypedDict
 
 from langgraph.graph import add_messages
 from typing_extensions import Annotated
 
-
-import operator
-from dataclasses import dataclass, field
-from typing_extensions import Annotated
+from agent.dedup import merge_results, merge_sources
 
 
 class OverallState(TypedDict):
     messages: Annotated[list, add_messages]
     search_query: Annotated[list, operator.add]
-    web_research_result: Annotated[list, operator.add]
-    sources_gathered: Annotated[list, operator.add]
+    web_research_result: Annotated[list, merge_results]
+    sources_gathered: Annotated[list, merge_sources]
     initial_search_query_count: int
     max_research_loops: int
     research_loop_count: int
     reasoning_model: str
+    loop_started_at: float
+    deadline: float
+    token_budget: int
+    tokens_used: Annotated[int, operator.add]
+    research_digest: str
+    digested_results: int
 
 
 class ReflectionState(TypedDict):
@@ -28,7 +32,12 @@ class ReflectionState(TypedDict):
     knowledge_gap: str
     follow_up_queries: Annotated[list, operator.add]
     research_loop_count: int
+    max_research_loops: int
     number_of_ran_queries: int
+    sources_gathered: Annotated[list, merge_sources]
+    deadline: float
+    token_budget: int
+    tokens_used: Annotated[int, operator.add]
 
 
 class Query(TypedDict):
@@ -38,6 +47,7 @@ class Query(TypedDict):
 
 class QueryGenerationState(TypedDict):
     query_list: list[Query]
+    deadline: float
 
 
 class WebSearchState(TypedDict):
@@ -45,6 +55,12 @@ class WebSearchState(TypedDict):
     id: str
 
 
+class WebResearchState(TypedDict):
+    searches: list[WebSearchState]
+    deadline: float
+    short_urls: dict[str, str]
+
+
 @dataclass(kw_only=True)
 class SearchStateOutput:
     running_summary: str = field(default=None)  # Final report
@@ -1,6 +1,12 @@
-from typing import Any, Dict, List
+import re
+from typing import Any, Dict, List, Tuple
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
 
+# Prefix of the short urls that stand in for the long grounding redirect urls
+SHORT_URL_PREFIX = "https://vertexaisearch.cloud.google.com/id/"
+# Matches every short url created by `resolve_urls` ("<prefix><id>-<index>")
+SHORT_URL_PATTERN = re.compile(re.escape(SHORT_URL_PREFIX) + r"\d+-\d+")
+
 
 def get_research_topic(messages: List[AnyMessage]) -> str:
     """
@@ -24,7 +30,7 @@ def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
     Ensures each original URL gets a consistent shortened form while maintaining uniqueness.
     """
-    prefix = f"https://vertexaisearch.cloud.google.com/id/"
+    prefix = SHORT_URL_PREFIX
     urls = [site.web.uri for site in urls_to_resolve]
 
     # Create a dictionary that maps each unique URL to its first occurrence index
@@ -36,10 +42,65 @@ def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     return resolved_map
 
 
+def reissue_short_urls(text: str, old_id: int, new_id: int) -> str:
+    """
+    Rewrite the short urls created by `resolve_urls` for `old_id` to use `new_id`.
+    """
+    if old_id == new_id:
+        return text
+    return text.replace(f"{SHORT_URL_PREFIX}{old_id}-", f"{SHORT_URL_PREFIX}{new_id}-")
+
+
+def replace_short_urls(
+    text: str, sources: List[Dict[str, Any]]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Replace the short urls in a text with the original urls in a single scan.
+
+    Sources are collapsed by short url first (keeping the first occurrence), then
+    every short url in the text is looked up while the text is scanned once.
+
+    Args:
+        text (str): Text containing short urls created by `resolve_urls`.
+        sources (list): Source dictionaries with 'short_url' and 'value' keys.
+
+    Returns:
+        tuple: The text with original urls, and the sources that were used in it,
+               in the order they were first gathered.
+    """
+    sources_by_short_url = {}
+    for source in sources:
+        if source.get("short_url"):
+            sources_by_short_url.setdefault(source["short_url"], source)
+
+    used_short_urls = set()
+
+    def substitute(match):
+        source = sources_by_short_url.get(match.group(0))
+        if source is None:
+            return match.group(0)
+        used_short_urls.add(match.group(0))
+        return source["value"]
+
+    text = SHORT_URL_PATTERN.sub(substitute, text)
+    used_sources = [
+        source
+        for short_url, source in sources_by_short_url.items()
+        if short_url in used_short_urls
+    ]
+    return text, used_sources
+
+
 def insert_citation_markers(text, citations_list):
     """
     Inserts citation markers into a text string based on start and end indices.
 
+    Builds the result in a single pass: citations are sorted once, then the text
+    slices between insertion points and the markers are collected in a list and
+    joined once. Citations sharing an end index are merged into one insertion
+    point, where identical markers are only emitted once. End indices past the
+    end of the text are clamped to it.
+
     Args:
         text (str): The original text string.
         citations_list (list): A list of dictionaries, where each dictionary
@@ -50,29 +111,33 @@ def insert_citation_markers(text, citations_list):
     Returns:
         str: The text with citation markers inserted.
     """
-    # Sort citations by end_index in descending order.
-    # If end_index is the same, secondary sort by start_index descending.
-    # This ensures that insertions at the end of the string don't affect
-    # the indices of earlier parts of the string that still need to be processed.
-    sorted_citations = sorted(
+    # Sort citations by end_index, then start_index. At a shared end index the
+    # markers keep the order of the previous back-to-front insertion: ascending
+    # start_index, and reversed input order for fully identical indices.
+    ordered_citations = sorted(
         citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
     )
-
-    modified_text = text
-    for citation_info in sorted_citations:
-        # These indices refer to positions in the *original* text,
-        # but since we iterate from the end, they remain valid for insertion
-        # relative to the parts of the string already processed.
-        end_idx = citation_info["end_index"]
-        marker_to_insert = ""
-        for segment in citation_info["segments"]:
-            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
-        # Insert the citation marker at the original end_idx position
-        modified_text = (
-            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+    ordered_citations.reverse()
+
+    parts = []
+    position = 0
+    seen_markers = set()
+    for citation_info in ordered_citations:
+        end_idx = min(citation_info["end_index"], len(text))
+        if end_idx != position:
+            parts.append(text[position:end_idx])
+            position = end_idx
+            seen_markers.clear()
+        marker_to_insert = "".join(
+            f" [{segment['label']}]({segment['short_url']})"
+            for segment in citation_info["segments"]
         )
+        if marker_to_insert not in seen_markers:
+            seen_markers.add(marker_to_insert)
+            parts.append(marker_to_insert)
+    parts.append(text[position:])
 
-    return modified_text
+    return "".join(parts)
 
 
 def get_citations(response, resolved_urls_map):
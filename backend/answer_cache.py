@@ -0,0 +1,183 @@
+# answer_cache.py
+"""
+Result cache in front of the research path of the Greeting Agent.
+
+Completed research runs are stored under their normalized research topic together
+with the gathered sources. Freshness depends on the query class (news-like queries
+expire within minutes), and an optional local embedding index lets near-duplicate
+questions reuse an answer as long as they name the same numbers and entities.
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from agent.cache import TTLCache, normalize_text
+
+# Query classes checked in order; the first matching pattern sets the freshness (seconds)
+FRESHNESS_POLICY = [
+    (
+        "news",
+        re.compile(
+            r"\b(latest|news|today|tonight|yesterday|now|current|currently|recent|live|this (week|month)|score|price|stock|weather)\b"
+        ),
+        float(os.getenv("ANSWER_CACHE_NEWS_TTL", "300")),
+    ),
+    ("default", re.compile(r""), float(os.getenv("ANSWER_CACHE_TTL", "21600"))),
+]
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+# Minimum cosine similarity for a near-duplicate hit, 0 (the default) only serves
+# answers to the same normalized question
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+_EMBEDDING_DIMENSIONS = 1 << 16
+# Numbers and capitalized words, the tokens a near-duplicate must share exactly
+_ANCHOR = re.compile(r"\d+(?:[.,]\d+)*|\b[A-Z][\w'-]*")
+_SENTENCE_START = re.compile(r"(^|[.!?:]\s)\W*$")
+
+
+def embed(text: str) -> dict[int, float]:
+    """Embed normalized text as an L2-normalized sparse vector of hashed word uni- and bigrams."""
+    words = text.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector: dict[int, float] = {}
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest, "little") % _EMBEDDING_DIMENSIONS
+        vector[index] = vector.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {i: v / norm for i, v in vector.items()}
+
+
+def anchors(text: str) -> frozenset[str]:
+    """Return the numbers and capitalized (entity) words of un-normalized text.
+
+    Capitalized words that merely start a sentence are not counted.
+    """
+    return frozenset(
+        match.group().casefold()
+        for match in _ANCHOR.finditer(text)
+        if match.group()[0].isdigit() or not _SENTENCE_START.search(text[: match.start()])
+    )
+
+
+def cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(i, 0.0) for i, v in a.items())
+
+
+class AnswerCache:
+    """Caches final research answers by normalized topic with per-class freshness.
+
+    Args:
+        max_entries: Maximum number of cached answers.
+        similarity: Minimum cosine similarity for a near-duplicate hit, 0 disables it.
+            Near-duplicates must also contain exactly the same numbers and entities.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        ttl = max(policy_ttl for _, _, policy_ttl in FRESHNESS_POLICY)
+        self.entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.similarity = similarity
+        self._index: dict[str, tuple[dict[int, float], frozenset[str]]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    @staticmethod
+    def freshness(topic: str) -> float:
+        """Return how long (seconds) an answer for this topic stays fresh."""
+        for _, pattern, ttl in FRESHNESS_POLICY:
+            if pattern.search(topic):
+                return ttl
+        return FRESHNESS_POLICY[-1][2]
+
+    def get(self, topic: str) -> Optional[dict]:
+        """Return the cached answer (``text``, ``sources``) for a topic, if fresh."""
+        key = normalize_text(topic)
+        max_age = self.freshness(key)
+        entry = self._fresh(key, max_age)
+        similar = False
+        if entry is None and self.similarity > 0:
+            match = self._nearest(key, anchors(topic))
+            if match is not None:
+                entry, similar = self._fresh(match, max_age), True
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if similar:
+                self.similar_hits += 1
+            else:
+                self.exact_hits += 1
+            self.latency_saved += entry["duration"]
+        return entry
+
+    def set(self, topic: str, text: str, sources: list, duration: float) -> None:
+        """Store the answer of a completed research run that took `duration` seconds."""
+        key = normalize_text(topic)
+        entry = {
+            "text": text,
+            "sources": sources,
+            "duration": duration,
+            "created_at": time.time(),
+        }
+        self.entries.set(key, entry, ttl=self.freshness(key))
+        if self.similarity > 0:
+            with self._lock:
+                self._index[key] = (embed(key), anchors(topic))
+                # Drop index entries whose answers were evicted from the cache
+                if len(self._index) > self.entries.max_entries:
+                    self._index = {
+                        k: v for k, v in self._index.items() if k in self.entries
+                    }
+
+    def stats(self) -> dict[str, float]:
+        """Return hit/miss counters, the hit rate and the research time saved by hits."""
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            total = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "latency_saved_seconds": self.latency_saved,
+            }
+
+    def _fresh(self, key: str, max_age: float) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            with self._lock:
+                self._index.pop(key, None)
+            return None
+        # A news-like query must not be served an answer cached under a longer TTL
+        if time.time() - entry["created_at"] > max_age:
+            return None
+        return entry
+
+    def _nearest(self, key: str, key_anchors: frozenset[str]) -> Optional[str]:
+        query = embed(key)
+        with self._lock:
+            best, best_score = None, self.similarity
+            for candidate, (vector, candidate_anchors) in self._index.items():
+                # "... in 2019" must not answer "... in 2023", nor "Texas" "Ohio"
+                if candidate_anchors != key_anchors:
+                    continue
+                score = cosine(query, vector)
+                if score >= best_score:
+                    best, best_score = candidate, score
+            return best
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the A2A hop: python_a2a's A2AClient vs. the pooled AgentClient.
+
+Starts an echo agent (served like the real agents, through
+`agent_server.run_agent_server`) that answers after a fixed delay, then sends N
+concurrent messages to it with each client, the way `main.py` forwards N
+concurrent `/query` requests to the manager. `A2AClient.send_message_async`
+runs the blocking client in the default thread pool and opens a connection per
+message; `AgentClient` shares one keep-alive pool on the event loop.
+
+Usage:
+    python benchmarks/a2a_transport.py --concurrency 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import httpx  # noqa: E402
+from python_a2a import (  # noqa: E402
+    A2AClient,
+    A2AServer,
+    Message,
+    MessageRole,
+    TextContent,
+)
+
+from agent_server import run_agent_server  # noqa: E402
+from transport import AgentClient, close_http_client  # noqa: E402
+
+
+class EchoAgent(A2AServer):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    async def handle_message(self, message: Message) -> Message:
+        await asyncio.sleep(self.latency)
+        return Message(
+            content=TextContent(text=message.content.text), role=MessageRole.AGENT
+        )
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+async def run_batch(send, n: int) -> tuple[float, list[float], int]:
+    async def timed(i: int):
+        message = Message(content=TextContent(text=f"query {i}"), role=MessageRole.USER)
+        started = time.perf_counter()
+        try:
+            response = await send(message)
+            ok = response.content.text == f"query {i}"
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(timed(i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    return elapsed, [r[0] for r in results], sum(not r[1] for r in results)
+
+
+async def wait_healthy(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+async def main(args):
+    endpoint = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            __file__,
+            "--serve",
+            "--port",
+            str(args.port),
+            "--latency",
+            str(args.latency),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        await wait_healthy(f"{endpoint}/a2a/health")
+        a2a_client = A2AClient(endpoint_url=endpoint)
+        agent_client = AgentClient(endpoint, hop="benchmark")
+        clients = [
+            ("A2AClient", a2a_client.send_message_async),
+            ("AgentClient", agent_client.send_message),
+        ]
+        print(
+            f"{args.concurrency} concurrent messages, {args.latency * 1000:.0f} ms "
+            f"agent latency, best of {args.rounds} rounds"
+        )
+        for name, send in clients:
+            await run_batch(send, 10)  # warm up
+            best = None
+            for _ in range(args.rounds):
+                result = await run_batch(send, args.concurrency)
+                if best is None or result[0] < best[0]:
+                    best = result
+            elapsed, latencies, errors = best
+            print(
+                f"  {name:<12} wall {elapsed:6.2f}s  p50 {percentile(latencies, 50):6.3f}s  "
+                f"p95 {percentile(latencies, 95):6.3f}s  p99 {percentile(latencies, 99):6.3f}s  "
+                f"errors {errors}"
+            )
+        await close_http_client()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8190)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.serve:
+        run_agent_server(EchoAgent(args.latency), host="127.0.0.1", port=args.port)
+    else:
+        asyncio.run(main(args))
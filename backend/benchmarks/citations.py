@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for citation marker insertion and short-url substitution.
+
+Compares `utils.insert_citation_markers` with the previous implementation, which
+rebuilt the whole string for every citation, and `utils.replace_short_urls` with
+the previous per-source `str.replace` loop of `finalize_answer`, over synthetic
+grounded texts, and checks that both produce the same output.
+
+Usage:
+    python benchmarks/citations.py --size 100000 --citations 1000 --sources 5000
+"""
+
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+from agent.utils import (  # noqa: E402
+    SHORT_URL_PREFIX,
+    insert_citation_markers,
+    replace_short_urls,
+)
+
+
+def insert_citation_markers_quadratic(text, citations_list):
+    """The previous O(n*k) implementation, kept as the reference."""
+    sorted_citations = sorted(
+        citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
+    )
+    modified_text = text
+    for citation_info in sorted_citations:
+        end_idx = citation_info["end_index"]
+        marker_to_insert = ""
+        for segment in citation_info["segments"]:
+            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
+        modified_text = (
+            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+        )
+    return modified_text
+
+
+def replace_short_urls_per_source(text, sources):
+    """The previous finalize_answer loop: one scan and copy per source."""
+    unique_sources = []
+    for source in sources:
+        if source["short_url"] in text:
+            text = text.replace(source["short_url"], source["value"])
+            unique_sources.append(source)
+    return text, unique_sources
+
+
+def synthetic_citations(size: int, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = ["grounded", "research", "answer", "source", "gemini", "search", "result"]
+    text = ""
+    while len(text) < size:
+        text += rng.choice(words) + " "
+    text = text[:size]
+    citations = []
+    for i in range(count):
+        end = rng.randrange(1, size)
+        citations.append(
+            {
+                "start_index": rng.randrange(0, end),
+                "end_index": end,
+                "segments": [
+                    {
+                        "label": f"site{j}",
+                        "short_url": f"{SHORT_URL_PREFIX}{i}-{j}",
+                        "value": f"https://example.com/{i % 7}/{j}",
+                    }
+                    for j in range(rng.randint(1, 3))
+                ],
+            }
+        )
+    return text, citations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--citations", type=int, default=1_000)
+    parser.add_argument("--sources", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text, citations = synthetic_citations(args.size, args.citations)
+    assert insert_citation_markers(text, citations) == insert_citation_markers_quadratic(
+        text, citations
+    ), "outputs differ"
+
+    for name, fn in [
+        ("previous", insert_citation_markers_quadratic),
+        ("single-pass", insert_citation_markers),
+    ]:
+        seconds = min(
+            timeit.repeat(lambda: fn(text, citations), number=1, repeat=args.repeat)
+        )
+        print(f"insert_citation_markers {name:>11}: {seconds * 1e3:8.2f} ms")
+
+    # sources_gathered grows with every loop and repeats sources across branches;
+    # the answer cites a subset of them
+    answer = insert_citation_markers(text, citations)
+    sources = [
+        segment for citation in citations for segment in citation["segments"]
+    ]
+    sources = (sources * (args.sources // len(sources) + 1))[: args.sources]
+    assert replace_short_urls(answer, sources) == replace_short_urls_per_source(
+        answer, sources
+    ), "outputs differ"
+
+    for name, fn in [
+        ("previous", replace_short_urls_per_source),
+        ("single-pass", replace_short_urls),
+    ]:
+        seconds = min(
+            timeit.repeat(lambda: fn(answer, sources), number=1, repeat=args.repeat)
+        )
+        print(f"replace_short_urls      {name:>11}: {seconds * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the shared Gemini client registry.
+
+Runs research queries through the graph against stubbed clients and reports how
+many clients were constructed and how many connections they opened per 100
+queries. Before the registry, every generate_query, reflection and
+finalize_answer execution built its own `ChatGoogleGenerativeAI`.
+
+Usage:
+    python benchmarks/client_reuse.py --queries 100
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+# Keep the run's search cache and checkpoints out of the developer's backend/.cache
+CACHE_DIR = tempfile.mkdtemp(prefix="client_reuse_benchmark_")
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(CACHE_DIR, "web_research.sqlite")
+os.environ["RESEARCH_CHECKPOINT_PATH"] = os.path.join(CACHE_DIR, "research_checkpoints.sqlite")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+# Measure the LLM/search path itself, not the search result cache
+os.environ.setdefault("USE_SEARCH_CACHE", "false")
+
+from agent.clients import client_stats  # noqa: E402
+from benchmarks.stubs import (  # noqa: E402
+    StubChatModel,
+    StubGenaiClient,
+    install_graph_stubs,
+)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    graph_module = install_graph_stubs(latency=0.0)
+    await asyncio.gather(
+        *(
+            graph_module.graph.ainvoke(
+                {"messages": [{"role": "user", "content": f"Who won race {i}?"}]}
+            )
+            for i in range(args.queries)
+        )
+    )
+
+    scale = 100 / args.queries
+    stats = client_stats()
+    llm_calls = stats["chat_model_constructions"] + stats["chat_model_reuses"]
+    print(f"Per 100 queries ({args.queries} run):")
+    print(f"  chat model lookups:          {llm_calls * scale:.0f}")
+    print(f"  chat models constructed:     {StubChatModel.constructions * scale:.0f}")
+    print(f"  genai clients constructed:   {StubGenaiClient.constructions * scale:.0f}")
+    print(
+        "  connections opened:          "
+        f"{(StubChatModel.connections + StubGenaiClient.connections) * scale:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
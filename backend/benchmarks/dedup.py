@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the cross-result deduplication of research results.
+
+Builds synthetic grounded search results the way overlapping parallel searches
+return them: an `--overlap` share of every result's sentences repeats a fact an
+earlier result already stated, verbatim or lightly reworded (different case and
+punctuation, a leading word added), the rest are new facts. Every result cites
+pages from a shared pool under its own short urls. The results then go through
+`canonicalize_sources` and the `web_research_result` / `sources_gathered`
+reducers, one loop at a time, as in the graph. The benchmark reports the
+reflection prompt size (the joined results) and the number of sources before
+and after, the reducer time, and checks that every cited page is still cited.
+
+Usage:
+    python benchmarks/dedup.py --loops 3 --results 4 --sentences 20 --overlap 0.4
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+from agent.dedup import canonicalize_sources, merge_results, merge_sources  # noqa: E402
+from agent.rate_limit import estimate_tokens  # noqa: E402
+from agent.utils import SHORT_URL_PREFIX, replace_short_urls  # noqa: E402
+
+
+def reword(sentence: str, rng: random.Random) -> str:
+    variant = rng.randrange(3)
+    if variant == 0:
+        return sentence
+    if variant == 1:
+        return sentence.upper().replace(" ", ", ", 1)
+    return f"Reportedly {sentence}"
+
+
+def synthetic_loop(args, rng, facts, used, pages, loop: int):
+    """Return the results and sources of one loop's searches."""
+    results, sources = [], []
+    for r in range(args.results):
+        search_id = loop * args.results + r
+        short_urls = {}
+        sentences = []
+        for _ in range(args.sentences):
+            if used and rng.random() < args.overlap:
+                sentence = reword(rng.choice(used), rng)
+            else:
+                sentence = next(facts)
+                used.append(sentence)
+            page = rng.choice(pages)
+            short_url = short_urls.setdefault(
+                page, f"{SHORT_URL_PREFIX}{search_id}-{len(short_urls)}"
+            )
+            sentences.append(f"{sentence}. [{page.split('/')[2]}]({short_url})")
+            sources.append({"label": page, "short_url": short_url, "value": page})
+        results.append(" ".join(sentences))
+    return results, sources
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--loops", type=int, default=3)
+    parser.add_argument("--results", type=int, default=4, help="Searches per loop")
+    parser.add_argument("--sentences", type=int, default=20, help="Sentences per result")
+    parser.add_argument("--overlap", type=float, default=0.4)
+    parser.add_argument("--pages", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"word{i}" for i in range(3000)]
+    facts = iter(
+        [
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randrange(10, 25)))
+            for _ in range(args.results * args.sentences * args.loops)
+        ]
+    )
+    used = []
+    pages = [f"https://site{i}.example.com/article" for i in range(args.pages)]
+
+    raw_results, raw_sources = [], []
+    results, sources, short_urls = [], [], {}
+    seconds = 0.0
+    for loop in range(args.loops):
+        new_results, new_sources = synthetic_loop(args, rng, facts, used, pages, loop)
+        raw_results += new_results
+        raw_sources += new_sources
+        started = time.perf_counter()
+        new_results, new_sources = canonicalize_sources(new_results, new_sources, short_urls)
+        results = merge_results(results, new_results)
+        sources = merge_sources(sources, new_sources)
+        seconds += time.perf_counter() - started
+
+    before = "\n\n---\n\n".join(raw_results)
+    after = "\n\n---\n\n".join(results)
+    print(
+        f"{args.loops} loops x {args.results} results x {args.sentences} sentences, "
+        f"{args.overlap:.0%} repeated facts, {args.pages} pages"
+    )
+    print(f"{'':<16}{'before':>10}{'after':>10}")
+    print(f"{'prompt tokens':<16}{estimate_tokens(before):>10.0f}{estimate_tokens(after):>10.0f}")
+    print(f"{'sources':<16}{len(raw_sources):>10}{len(sources):>10}")
+    print(f"reducers: {seconds * 1000:.1f} ms for {args.loops} loops")
+
+    # Every page cited before must still be cited, and resolvable at answer time
+    _, cited_before = replace_short_urls(before, raw_sources)
+    _, cited_after = replace_short_urls(after, sources)
+    missing = {s["value"] for s in cited_before} - {s["value"] for s in cited_after}
+    assert not missing, f"Citations lost: {missing}"
+    print(f"citations: all {len({s['value'] for s in cited_after})} cited pages kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the incremental research digest against full-result prompts.
+
+Runs multi-loop research queries through the compiled graph with stubbed Gemini
+clients. Every search returns `--result-words` words, the stubbed reflection
+always asks for `--follow-ups` more searches, and the latency of each LLM call
+grows with its prompt (`--llm-latency` plus `--seconds-per-1k` per 1,000 prompt
+tokens). Digests come back at their `--digest-words` cap, the worst case.
+
+For each mode (every result in every prompt, digest for reflection, digest for
+reflection and answer) the benchmark reports the reflection prompt size and
+modelled latency per loop, the answer prompt size, the tokens spent and the run
+latency.
+
+Usage:
+    python benchmarks/digest.py --loops 3 --queries 3 --result-words 300
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+# Keep the run's search cache and checkpoints out of the developer's backend/.cache
+CACHE_DIR = tempfile.mkdtemp(prefix="digest_benchmark_")
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(CACHE_DIR, "web_research.sqlite")
+os.environ["RESEARCH_CHECKPOINT_PATH"] = os.path.join(CACHE_DIR, "research_checkpoints.sqlite")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+# Measure the prompts themselves, not the search result cache or the rate limiter
+os.environ.setdefault("USE_SEARCH_CACHE", "false")
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+
+from agent.rate_limit import estimate_tokens  # noqa: E402
+from benchmarks.stubs import StubChatModel, install_graph_stubs  # noqa: E402
+
+MODES = [
+    ("full", {}),
+    ("digest", {"research_digest": True}),
+    ("digest + answer", {"research_digest": True, "answer_from_digest": True}),
+]
+
+
+def llm_latency(args):
+    def latency(prompt: str) -> float:
+        return args.llm_latency + args.seconds_per_1k * estimate_tokens(prompt) / 1000
+
+    return latency
+
+
+async def run(graph, args, configurable: dict):
+    StubChatModel.prompts.clear()
+    started = time.perf_counter()
+    state = await graph.ainvoke(
+        {
+            "messages": [{"role": "user", "content": "Who won the race?"}],
+            "max_research_loops": args.loops,
+            "initial_search_query_count": args.queries,
+        },
+        {
+            "configurable": {
+                **configurable,
+                "digest_max_words": args.digest_words,
+                "max_parallel_searches": 0,
+            }
+        },
+    )
+    elapsed = time.perf_counter() - started
+    reflections = [p for kind, p in StubChatModel.prompts if kind == "Reflection"]
+    # The answer is the last plain text call; the others are digest updates
+    answer = [p for kind, p in StubChatModel.prompts if kind == "text"][-1]
+    return reflections, answer, state["tokens_used"], elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--loops", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--follow-ups", type=int, default=3)
+    parser.add_argument("--result-words", type=int, default=300)
+    parser.add_argument("--digest-words", type=int, default=600)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--seconds-per-1k", type=float, default=0.1)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    latency = llm_latency(args)
+    graph_module = install_graph_stubs(
+        latency=latency,
+        search_latency=args.search_latency,
+        queries=args.queries,
+        follow_ups=args.follow_ups,
+        answer_words=args.digest_words,
+        result_words=args.result_words,
+    )
+    print(
+        f"{args.loops} loops, {args.queries} searches then {args.follow_ups} per loop, "
+        f"{args.result_words} words per result, digest cap {args.digest_words} words"
+    )
+    header = "".join(f"{f'loop {i + 1}':>16}" for i in range(args.loops))
+    print(f"\n{'mode':<17}{header}{'answer':>10}{'tokens':>9}{'run':>8}")
+    for name, configurable in MODES:
+        reflections, answer, tokens, elapsed = await run(
+            graph_module.graph, args, configurable
+        )
+        loops = "".join(
+            f"{estimate_tokens(p):>8.0f}t {latency(p):>5.2f}s" for p in reflections
+        )
+        print(
+            f"{name:<17}{loops}{estimate_tokens(answer):>9.0f}t{tokens:>9}"
+            f"{elapsed:>7.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
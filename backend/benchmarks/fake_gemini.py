@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Deterministic local stand-in for the Gemini REST API.
+
+Serves `models/{model}:generateContent` and `:streamGenerateContent` well enough
+for every Gemini call in the stack: the routing prompt of the Manager Agent,
+plain text answers, structured output (JSON schema or function calling),
+grounded Google Search results with N chunks/supports, and PNG image blobs.
+Latency is drawn from a configurable distribution per request kind and a
+configurable fraction of requests fails with an API error. With --rpm-quota,
+requests over a per-model requests-per-minute quota are rejected with 429 like
+the real API does.
+
+Responses are a pure function of (seed, request body, attempt number), so two
+runs with the same seed and request mix see the same latencies, errors and
+answers regardless of scheduling. Point the clients at it with
+GEMINI_BASE_URL=http://127.0.0.1:<port>.
+
+Usage:
+    python benchmarks/fake_gemini.py --port 8100 --latency lognormal:0.8,0.5 \\
+        --search-latency lognormal:2.5,0.4 --error-rate 0.02 --chunks 8
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict, deque
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ERROR_STATUSES = {
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+WORDS = (
+    "research shows the latest results indicate that analysts reported a clear "
+    "trend across several independent sources while officials confirmed the "
+    "final figures and experts expect further updates in the coming weeks"
+).split()
+
+
+class LatencyDistribution:
+    """Latency in seconds, parsed from `kind:params`.
+
+    Supported kinds: `fixed:s`, `uniform:low,high`, `normal:mean,stddev`,
+    `lognormal:median,sigma` and `exp:mean`.
+    """
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = p[0] * rng.lognormvariate(0.0, p[1])
+        else:
+            value = rng.expovariate(1.0 / p[0])
+        return max(0.0, value)
+
+
+def make_png(size: int, rng: random.Random) -> bytes:
+    """Encode a `size` x `size` RGB PNG of noise (incompressible, like a real image)."""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    rows = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows, 1))
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeGemini:
+    """Builds deterministic Gemini responses for request bodies."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.seed = args.seed
+        self.latency = LatencyDistribution(args.latency)
+        self.search_latency = LatencyDistribution(args.search_latency or args.latency)
+        self.image_latency = LatencyDistribution(args.image_latency or args.latency)
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.chunks = args.chunks
+        self.supports = args.supports
+        self.sufficient_rate = args.sufficient_rate
+        self.answer_words = args.answer_words
+        self.image_size = args.image_size
+        self.stream_chunks = args.stream_chunks
+        self.rpm_quota = args.rpm_quota
+        self._windows: dict[str, deque] = defaultdict(deque)
+        self._attempts: Counter = Counter()
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()
+
+    def rng_for(self, model: str, body: dict) -> random.Random:
+        """RNG seeded by the request and how often the same request was seen."""
+        digest = hashlib.sha256(
+            json.dumps([model, body], sort_keys=True).encode()
+        ).hexdigest()
+        with self._lock:
+            self._attempts[digest] += 1
+            attempt = self._attempts[digest]
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    @staticmethod
+    def prompt_text(body: dict) -> str:
+        parts = [
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        ]
+        return "\n".join(parts)
+
+    @staticmethod
+    def kind(model: str, body: dict) -> str:
+        config = body.get("generationConfig") or {}
+        tools = body.get("tools") or []
+        if "IMAGE" in (config.get("responseModalities") or []) or (
+            config.get("responseMimeType", "").startswith("image/")
+        ):
+            return "image"
+        if "image" in model:
+            return "image"
+        if any("googleSearch" in tool or "google_search" in tool for tool in tools):
+            return "search"
+        if any(
+            tool.get("functionDeclarations") or tool.get("function_declarations")
+            for tool in tools
+        ):
+            return "function"
+        if config.get("responseSchema") or config.get("responseJsonSchema"):
+            return "json"
+        return "text"
+
+    def sentence(self, rng: random.Random, words: int) -> str:
+        text = " ".join(rng.choice(WORDS) for _ in range(words))
+        return text[0].upper() + text[1:] + "."
+
+    def text(self, rng: random.Random, words: int) -> str:
+        sentences = []
+        while words > 0:
+            n = min(words, rng.randint(8, 16))
+            sentences.append(self.sentence(rng, n))
+            words -= n
+        return " ".join(sentences)
+
+    def from_schema(self, schema: dict, rng: random.Random, defs: dict, name: str = ""):
+        """Generate a value conforming to a (JSON or OpenAPI style) schema."""
+        if "$ref" in schema:
+            return self.from_schema(
+                defs[schema["$ref"].split("/")[-1]], rng, defs, name
+            )
+        for key in ("anyOf", "oneOf"):
+            if key in schema:
+                options = [s for s in schema[key] if s.get("type") != "null"]
+                return self.from_schema(options[0], rng, defs, name)
+        kind = str(schema.get("type", "object")).lower()
+        if kind == "object":
+            return {
+                prop: self.from_schema(sub, rng, defs, prop)
+                for prop, sub in (schema.get("properties") or {}).items()
+            }
+        if kind == "array":
+            count = max(int(schema.get("minItems", 0)), 3)
+            return [
+                self.from_schema(schema.get("items") or {}, rng, defs, name)
+                for _ in range(count)
+            ]
+        if kind == "boolean":
+            return rng.random() < self.sufficient_rate
+        if kind in ("integer", "number"):
+            return rng.randint(1, 10)
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        if "quer" in name:
+            return " ".join(rng.choice(WORDS) for _ in range(5))
+        return self.sentence(rng, 12)
+
+    def schema_of(self, body: dict) -> dict:
+        config = body.get("generationConfig") or {}
+        return config.get("responseJsonSchema") or config.get("responseSchema") or {}
+
+    def route(self, prompt: str) -> str:
+        """Answer the Manager Agent's routing prompt like a well-behaved model."""
+        match = re.search(r'User Request: "(.*)"', prompt, re.S)
+        query = (match.group(1) if match else prompt).lower()
+        visual = ("draw", "image", "picture", "logo", "illustration", "sketch")
+        return "image_agent" if any(w in query for w in visual) else "greeting_agent"
+
+    def candidate(self, kind: str, model: str, body: dict, rng: random.Random) -> dict:
+        prompt = self.prompt_text(body)
+        candidate = {"index": 0, "finishReason": "STOP"}
+        if kind == "image":
+            data = base64.b64encode(make_png(self.image_size, rng)).decode()
+            parts = [{"inlineData": {"mimeType": "image/png", "data": data}}]
+        elif kind == "function":
+            declaration = next(
+                d
+                for tool in body["tools"]
+                for d in tool.get("functionDeclarations")
+                or tool.get("function_declarations")
+                or []
+            )
+            schema = (
+                declaration.get("parametersJsonSchema")
+                or declaration.get("parameters")
+                or {}
+            )
+            args = self.from_schema(schema, rng, schema.get("$defs", {}))
+            parts = [{"functionCall": {"name": declaration["name"], "args": args}}]
+        elif kind == "json":
+            schema = self.schema_of(body)
+            value = self.from_schema(schema, rng, schema.get("$defs", {}))
+            parts = [{"text": json.dumps(value)}]
+        elif "Chosen Agent:" in prompt:
+            parts = [{"text": self.route(prompt)}]
+        else:
+            text = self.text(rng, self.answer_words)
+            # Cite a few of the markdown links in the prompt, like a final answer
+            links = re.findall(r"\[([^\]]+)\]\((https?://[^)\s]+)\)", prompt)
+            for label, url in links[:3]:
+                text += f" [{label}]({url})"
+            parts = [{"text": text}]
+
+        if kind == "search":
+            candidate["groundingMetadata"] = self.grounding(parts[0]["text"], rng)
+        candidate["content"] = {"role": "model", "parts": parts}
+        return candidate
+
+    def grounding(self, text: str, rng: random.Random) -> dict:
+        """Grounding chunks and supports spread over the sentences of `text`."""
+        chunks = [
+            {
+                "web": {
+                    "uri": f"https://vertexaisearch.cloud.google.com/grounding-api-redirect/{rng.randbytes(12).hex()}",
+                    "title": f"source{rng.randint(1, self.chunks * 4)}.example.com",
+                }
+            }
+            for _ in range(self.chunks)
+        ]
+        ends = [m.end() for m in re.finditer(r"\.", text)] or [len(text)]
+        supports = []
+        for i in range(self.supports):
+            end = ends[i % len(ends)]
+            start = ends[i % len(ends) - 1] + 1 if i % len(ends) else 0
+            indices = sorted(rng.sample(range(self.chunks), min(2, self.chunks)))
+            supports.append(
+                {
+                    "segment": {
+                        "startIndex": start,
+                        "endIndex": end,
+                        "text": text[start:end],
+                    },
+                    "groundingChunkIndices": indices,
+                    "confidenceScores": [0.9] * len(indices),
+                }
+            )
+        return {
+            "groundingChunks": chunks,
+            "groundingSupports": supports,
+            "webSearchQueries": [text[:40]],
+        }
+
+    def usage(self, body: dict, candidate: dict) -> dict:
+        prompt_tokens = len(self.prompt_text(body)) // 4 + 1
+        completion_tokens = len(json.dumps(candidate["content"])) // 4 + 1
+        return {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens,
+        }
+
+    def over_quota(self, model: str) -> bool:
+        """Whether a request exceeds the per-model requests-per-minute quota."""
+        if not self.rpm_quota:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows[model]
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if len(window) >= self.rpm_quota:
+                return True
+            window.append(now)
+            return False
+
+    def error(self, status: int, message: str) -> JSONResponse:
+        return JSONResponse(
+            status_code=status,
+            content={
+                "error": {
+                    "code": status,
+                    "message": message,
+                    "status": ERROR_STATUSES.get(status, "UNKNOWN"),
+                }
+            },
+        )
+
+    async def respond(self, model: str, body: dict, stream: bool):
+        if self.over_quota(model):
+            self.requests["throttled"] += 1
+            return self.error(429, "Quota exceeded for requests per minute.")
+        rng = self.rng_for(model, body)
+        kind = self.kind(model, body)
+        self.requests[kind] += 1
+        latency = {"search": self.search_latency, "image": self.image_latency}.get(
+            kind, self.latency
+        )
+        delay = latency.sample(rng)
+
+        if rng.random() < self.error_rate:
+            await asyncio.sleep(delay * rng.random())
+            self.requests["errors"] += 1
+            return self.error(
+                self.error_status, "Injected error from the fake Gemini server."
+            )
+
+        candidate = self.candidate(kind, model, body, rng)
+        response = {
+            "candidates": [candidate],
+            "usageMetadata": self.usage(body, candidate),
+            "modelVersion": model,
+        }
+        if not stream:
+            await asyncio.sleep(delay)
+            return JSONResponse(response)
+        return StreamingResponse(
+            self.stream(response, delay), media_type="text/event-stream"
+        )
+
+    async def stream(self, response: dict, delay: float):
+        """Split a text answer into SSE chunks spread over the latency."""
+        candidate = response["candidates"][0]
+        parts = candidate["content"]["parts"]
+        if len(parts) != 1 or "text" not in parts[0] or self.stream_chunks <= 1:
+            await asyncio.sleep(delay)
+            yield f"data: {json.dumps(response)}\r\n\r\n"
+            return
+
+        words = parts[0]["text"].split(" ")
+        n = min(self.stream_chunks, len(words))
+        step = -(-len(words) // n)
+        pieces = [" ".join(words[i : i + step]) for i in range(0, len(words), step)]
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(delay / len(pieces))
+            last = i == len(pieces) - 1
+            chunk = {
+                "candidates": [
+                    {
+                        "index": 0,
+                        "content": {
+                            "role": "model",
+                            "parts": [{"text": piece + ("" if last else " ")}],
+                        },
+                        **({"finishReason": "STOP"} if last else {}),
+                    }
+                ],
+                "modelVersion": response["modelVersion"],
+            }
+            if last:
+                chunk["usageMetadata"] = response["usageMetadata"]
+                if "groundingMetadata" in candidate:
+                    chunk["candidates"][0]["groundingMetadata"] = candidate[
+                        "groundingMetadata"
+                    ]
+            yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+
+def create_app(fake: FakeGemini) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/{version}/models/{model}:generateContent")
+    async def generate_content(version: str, model: str, request: Request):
+        return await fake.respond(model, await request.json(), stream=False)
+
+    @app.post("/{version}/models/{model}:streamGenerateContent")
+    async def stream_generate_content(version: str, model: str, request: Request):
+        return await fake.respond(model, await request.json(), stream=True)
+
+    @app.get("/stats")
+    def stats():
+        return dict(fake.requests)
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--latency",
+        default="lognormal:0.8,0.4",
+        help="Latency of text/structured calls, e.g. fixed:0.5, uniform:0.2,1, "
+        "normal:0.8,0.2, lognormal:0.8,0.4, exp:0.8",
+    )
+    parser.add_argument(
+        "--search-latency",
+        default="lognormal:2.5,0.4",
+        help="Latency of grounded search calls (defaults to --latency when empty)",
+    )
+    parser.add_argument(
+        "--image-latency",
+        default="lognormal:6,0.3",
+        help="Latency of image generation calls (defaults to --latency when empty)",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument(
+        "--rpm-quota",
+        type=int,
+        default=0,
+        help="Requests per minute per model before answering 429 (0 disables)",
+    )
+    parser.add_argument("--chunks", type=int, default=6, help="Grounding chunks per search")
+    parser.add_argument(
+        "--supports", type=int, default=4, help="Grounding supports per search"
+    )
+    parser.add_argument(
+        "--sufficient-rate",
+        type=float,
+        default=0.5,
+        help="Probability that boolean fields (e.g. is_sufficient) are true",
+    )
+    parser.add_argument("--answer-words", type=int, default=120)
+    parser.add_argument("--image-size", type=int, default=512, help="Image side in px")
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    uvicorn.run(
+        create_app(FakeGemini(args)), host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
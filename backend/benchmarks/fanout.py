@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the web_research fan-out scheduler against latency-injected searches.
+
+Runs research queries through the compiled graph with stubbed Gemini clients.
+Every grounded search takes `--latency` seconds, except that a `--straggler-rate`
+fraction of them (picked deterministically from the query) takes
+`--straggler-latency`. The same workload runs under several fan-out settings:
+waiting for every search, capping searches in flight, a quorum of N-1 and a time
+budget. For each one the benchmark reports the research run latency and how
+many search results reached reflection.
+
+Usage:
+    python benchmarks/fanout.py --runs 20 --queries 6 --straggler-rate 0.15
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+# Keep the run's search cache and checkpoints out of the developer's backend/.cache
+CACHE_DIR = tempfile.mkdtemp(prefix="fanout_benchmark_")
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(CACHE_DIR, "web_research.sqlite")
+os.environ["RESEARCH_CHECKPOINT_PATH"] = os.path.join(CACHE_DIR, "research_checkpoints.sqlite")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+# Measure the fan-out itself, not the search result cache or the rate limiter
+os.environ.setdefault("USE_SEARCH_CACHE", "false")
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+
+from benchmarks.stubs import install_graph_stubs  # noqa: E402
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def search_latency(args):
+    def latency(prompt: str) -> float:
+        draw = int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return args.straggler_latency if draw < args.straggler_rate else args.latency
+
+    return latency
+
+
+async def run(graph, args, configurable: dict) -> tuple[list[float], list[int]]:
+    async def one(i: int):
+        started = time.perf_counter()
+        state = await graph.ainvoke(
+            {
+                "messages": [{"role": "user", "content": f"Who won race {i}?"}],
+                "max_research_loops": 1,
+                "initial_search_query_count": args.queries,
+            },
+            {"configurable": configurable},
+        )
+        return time.perf_counter() - started, len(state["web_research_result"])
+
+    results = await asyncio.gather(*(one(i) for i in range(args.runs)))
+    return [r[0] for r in results], [r[1] for r in results]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--straggler-rate", type=float, default=0.15)
+    parser.add_argument("--straggler-latency", type=float, default=3.0)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # Stragglers are drawn from the search prompt, which embeds the query text;
+    # the same queries run under every setting
+    graph_module = install_graph_stubs(
+        latency=args.llm_latency, search_latency=search_latency(args), queries=args.queries
+    )
+    settings = [
+        ("wait for all", {"max_parallel_searches": 0}),
+        ("max 2 in flight", {"max_parallel_searches": 2}),
+        (f"quorum {args.queries - 1}/{args.queries}", {"search_quorum": args.queries - 1}),
+        ("time budget 1s", {"search_time_budget": 1.0}),
+        ("search timeout 1s", {"search_timeout": 1.0}),
+    ]
+    print(
+        f"{args.runs} research runs x {args.queries} searches, {args.latency:.1f}s per "
+        f"search, {args.straggler_rate:.0%} stragglers at {args.straggler_latency:.1f}s"
+    )
+    print(f"\n{'setting':<20}{'p50':>8}{'p95':>8}{'max':>8}{'results':>9}")
+    for name, configurable in settings:
+        latencies, results = await run(graph_module.graph, args, configurable)
+        print(
+            f"{name:<20}{percentile(latencies, 50):>7.2f}s{percentile(latencies, 95):>7.2f}s"
+            f"{max(latencies):>7.2f}s{sum(results) / len(results):>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark of batch image generation against one query per image.
+
+Asks the Image Agent for `--images` variations of a prompt, against a stubbed
+Gemini client whose generation latencies follow a lognormal distribution
+(median `--latency`, shape `--sigma`) and which returns `--size` px PNGs:
+
+- sequential: one request per variation, each waiting for the previous one,
+  as users had to do without batches;
+- batch: one streamed batch request, with up to IMAGE_BATCH_CONCURRENCY
+  generations at once and a preview per image.
+
+The benchmark reports the time until the first and the last image arrived and
+checks that every image got a preview.
+
+Usage:
+    python benchmarks/image_batch.py --images 4 --latency 3 --sigma 0.4
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+STORE_DIR = tempfile.mkdtemp(prefix="image_batch_benchmark_")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ["IMAGE_STORE_DIR"] = STORE_DIR
+
+from python_a2a import Message, MessageRole, TextContent  # noqa: E402
+
+from benchmarks.stubs import StubGenaiClient  # noqa: E402
+from image_agent import ImageAgent, image_batch  # noqa: E402
+from image_store import get_thumbnail_pool  # noqa: E402
+
+
+def message(text: str) -> Message:
+    return Message(content=TextContent(text=text), role=MessageRole.USER)
+
+
+async def sequential(agent: ImageAgent, prompts: list[str]) -> list[float]:
+    started = time.perf_counter()
+    arrivals = []
+    for prompt in prompts:
+        await agent.handle_message(message(prompt))
+        arrivals.append(time.perf_counter() - started)
+    return arrivals
+
+
+async def batch(agent: ImageAgent, request: str) -> tuple[list[float], list[dict]]:
+    started = time.perf_counter()
+    arrivals, images = [], []
+    async for chunk in agent.stream_response(message(request)):
+        event = json.loads(chunk)
+        if event["event"] == "image":
+            arrivals.append(time.perf_counter() - started)
+            images.append(event["data"])
+    return arrivals, images
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=3.0, help="Median seconds per image")
+    parser.add_argument("--sigma", type=float, default=0.4)
+    parser.add_argument("--size", type=int, default=1024, help="Image side in px")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    def latency(prompt: str) -> float:
+        return rng.lognormvariate(math.log(args.latency), args.sigma)
+
+    request = f"Generate {args.images} variations of a stadium at night"
+    prompts = image_batch(request)
+    # Start the preview workers outside the measurement
+    get_thumbnail_pool().submit(int).result()
+    try:
+        # Without the cache the two runs generate every image
+        agent = ImageAgent(cache_size=0)
+        agent.client = StubGenaiClient(latency=latency, image_size=args.size)
+        print(f"{len(prompts)} images of {args.size}px, median {args.latency:.1f}s each")
+        print(f"\n{'mode':<12}{'first':>8}{'last':>8}")
+        arrivals = await sequential(agent, prompts)
+        print(f"{'sequential':<12}{arrivals[0]:>7.2f}s{arrivals[-1]:>7.2f}s")
+        arrivals, images = await batch(agent, request)
+        print(f"{'batch':<12}{arrivals[0]:>7.2f}s{arrivals[-1]:>7.2f}s")
+        previews = sum(bool(image.get("thumbnail_url")) for image in images)
+        assert previews == len(prompts), f"{previews} previews for {len(prompts)} images"
+        print(f"\npreviews: {previews} of {len(prompts)} images")
+    finally:
+        shutil.rmtree(STORE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
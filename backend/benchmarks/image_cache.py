@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Replay of realistic image prompt traffic against the Image Agent's prompt cache.
+
+Sends `--requests` prompts through `ImageAgent.handle_message` with Poisson
+arrivals at `--rate` per second, against a stubbed Gemini client whose image
+generations take `--latency` seconds. The traffic mixes a few demo prompts
+with Zipf-distributed popularity (`--demo-share` of the requests), retries of a
+recent prompt sent while or shortly after it was generated, with different case
+and punctuation (`--retry-share`), and one-off prompts.
+
+For each mode (no cache or coalescing, coalescing only, cache and coalescing)
+the benchmark reports the upstream generation calls, the cache hits and
+coalesced requests, and the p50/p95 response latency.
+
+Usage:
+    python benchmarks/image_cache.py --requests 300 --rate 30 --latency 3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+STORE_DIR = tempfile.mkdtemp(prefix="image_cache_benchmark_")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ["IMAGE_STORE_DIR"] = STORE_DIR
+os.environ["IMAGE_CACHE_BACKEND"] = "memory"
+
+from python_a2a import Message, MessageRole, TextContent  # noqa: E402
+
+from benchmarks.stubs import StubGenaiClient  # noqa: E402
+from image_agent import IMAGE_REQUESTS, ImageAgent  # noqa: E402
+
+MODES = [
+    ("no cache", {"cache_size": 0, "coalesce": False}),
+    ("coalescing", {"cache_size": 0, "coalesce": True}),
+    ("cache + coalescing", {"cache_size": 1024, "coalesce": True}),
+]
+
+SUBJECTS = ["stadium", "cat", "robot", "mountain lake", "city skyline", "dragon", "sunset"]
+STYLES = ["watercolor", "photorealistic", "pixel art", "oil painting", "line drawing"]
+
+
+def retry_variant(prompt: str, rng: random.Random) -> str:
+    variants = [prompt, prompt.lower(), prompt.rstrip(".") + "!", f"  {prompt.upper()} "]
+    return rng.choice(variants)
+
+
+def traffic(args) -> list[tuple[float, str]]:
+    """Return (arrival second, prompt) pairs of the replayed traffic."""
+    rng = random.Random(args.seed)
+    demos = [
+        f"Generate a {rng.choice(STYLES)} image of a {subject}."
+        for subject in rng.sample(SUBJECTS, min(args.demo_prompts, len(SUBJECTS)))
+    ]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(demos))]
+    requests, at = [], 0.0
+    for i in range(args.requests):
+        at += rng.expovariate(args.rate)
+        kind = rng.random()
+        if kind < args.demo_share:
+            prompt = rng.choices(demos, weights)[0]
+        elif kind < args.demo_share + args.retry_share and requests:
+            # A retry of one of the last few requests
+            prompt = retry_variant(rng.choice(requests[-5:])[1], rng)
+        else:
+            prompt = f"Generate an image of {rng.choice(SUBJECTS)} number {i}."
+        requests.append((at, prompt))
+    return requests
+
+
+async def replay(agent: ImageAgent, requests) -> list[float]:
+    started = time.perf_counter()
+
+    async def send(at: float, prompt: str) -> float:
+        await asyncio.sleep(max(0.0, at - (time.perf_counter() - started)))
+        sent = time.perf_counter()
+        response = await agent.handle_message(
+            Message(content=TextContent(text=prompt), role=MessageRole.USER)
+        )
+        assert "successfully" in response.content.text, response.content.text
+        return time.perf_counter() - sent
+
+    return await asyncio.gather(*(send(at, prompt) for at, prompt in requests))
+
+
+def outcomes() -> dict[str, float]:
+    return {key[0]: value for key, value in IMAGE_REQUESTS.snapshot()["values"]}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=30.0, help="Requests per second")
+    parser.add_argument("--latency", type=float, default=3.0, help="Seconds per generation")
+    parser.add_argument("--demo-prompts", type=int, default=5)
+    parser.add_argument("--demo-share", type=float, default=0.4)
+    parser.add_argument("--retry-share", type=float, default=0.15)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    requests = traffic(args)
+    print(
+        f"{args.requests} requests at {args.rate:.0f}/s, {len({p for _, p in requests})} "
+        f"distinct prompts, {args.latency:.1f}s per generation"
+    )
+    print(f"\n{'mode':<20}{'upstream':>10}{'hits':>8}{'coalesced':>11}{'p50':>8}{'p95':>8}")
+    try:
+        for name, options in MODES:
+            shutil.rmtree(STORE_DIR, ignore_errors=True)
+            agent = ImageAgent(**options)
+            agent.client = StubGenaiClient(latency=args.latency)
+            calls, before = StubGenaiClient.calls, outcomes()
+            latencies = sorted(await replay(agent, requests))
+            after = outcomes()
+            counts = {k: after.get(k, 0) - before.get(k, 0) for k in ("hit", "coalesced")}
+            print(
+                f"{name:<20}{StubGenaiClient.calls - calls:>10}{counts['hit']:>8.0f}"
+                f"{counts['coalesced']:>11.0f}{statistics.median(latencies):>7.2f}s"
+                f"{latencies[int(0.95 * (len(latencies) - 1))]:>7.2f}s"
+            )
+    finally:
+        shutil.rmtree(STORE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
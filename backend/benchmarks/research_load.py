@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Load test for the research path of the Greeting Agent.
+
+Runs N research queries concurrently through `GreetingAgent.handle_message`
+against stubbed Gemini clients and compares the wall time with a single query.
+With the async research path, N concurrent queries should finish in about the
+time of one (as long as N <= RESEARCH_MAX_CONCURRENCY).
+
+`--identical N` also sends N concurrent copies of one question (with different
+case and punctuation, as when news breaks) and reports how many research runs
+they started; identical questions in flight share one run.
+
+Usage:
+    python benchmarks/research_load.py --concurrency 16 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+# Keep the run's search cache and checkpoints out of the developer's backend/.cache
+CACHE_DIR = tempfile.mkdtemp(prefix="research_load_benchmark_")
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(CACHE_DIR, "web_research.sqlite")
+os.environ["RESEARCH_CHECKPOINT_PATH"] = os.path.join(CACHE_DIR, "research_checkpoints.sqlite")
+# The stubs never talk to Google, but the modules refuse to import without keys
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+# Measure the LLM/search path itself, not the search result cache
+os.environ.setdefault("USE_SEARCH_CACHE", "false")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from python_a2a import Message, TextContent, MessageRole  # noqa: E402
+
+from benchmarks.stubs import StubChatModel, install_graph_stubs  # noqa: E402
+from greeting_agent import GreetingAgent  # noqa: E402
+
+
+async def run_batch(agent: GreetingAgent, n: int) -> float:
+    messages = [
+        Message(
+            content=TextContent(text=f"Who won the race number {i}?"),
+            role=MessageRole.USER,
+        )
+        for i in range(n)
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*(agent.handle_message(m) for m in messages))
+    return time.perf_counter() - start
+
+
+async def run_identical(agent: GreetingAgent, n: int) -> tuple[float, int]:
+    variants = ["Who won the final today?", "who won the final today", "WHO WON THE FINAL TODAY?!"]
+    messages = [
+        Message(content=TextContent(text=variants[i % len(variants)]), role=MessageRole.USER)
+        for i in range(n)
+    ]
+    StubChatModel.prompts.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*(agent.handle_message(m) for m in messages))
+    # Every research run starts with one query generation call
+    runs = sum(kind == "SearchQueryList" for kind, _ in StubChatModel.prompts)
+    return time.perf_counter() - start, runs
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--identical", type=int, default=0)
+    args = parser.parse_args()
+
+    install_graph_stubs(latency=args.latency)
+    agent = GreetingAgent(research_max_concurrency=args.concurrency)
+
+    single = await run_batch(agent, 1)
+    batch = await run_batch(agent, args.concurrency)
+    print(f"1 query:  {single:.2f}s")
+    print(f"{args.concurrency} queries: {batch:.2f}s ({batch / single:.2f}x single)")
+    if args.identical:
+        elapsed, runs = await run_identical(agent, args.identical)
+        print(f"{args.identical} identical queries: {elapsed:.2f}s, {runs} research run(s)")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
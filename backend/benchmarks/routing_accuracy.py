@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the tiered router of the Manager Agent.
+
+Routes a labeled query corpus through the local pre-classifier and reports, per
+tier, how many queries it decided, its accuracy and its p50/p99 latency. Queries
+the local tier leaves undecided go to the LLM tier, which is only called with
+--live (requires GOOGLE_API_KEY); otherwise its latency is reported as skipped.
+
+Usage:
+    python benchmarks/routing_accuracy.py [--live]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.routing_corpus import LABELED_QUERIES  # noqa: E402
+from routing import LocalRouter  # noqa: E402
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1] if len(samples) > 1 else samples[0]
+
+
+def report(tier: str, results: list[tuple[bool, float]]):
+    if not results:
+        print(f"{tier:>6}: no queries")
+        return
+    latencies = [latency for _, latency in results]
+    accuracy = sum(correct for correct, _ in results) / len(results)
+    print(
+        f"{tier:>6}: {len(results):3d} queries, accuracy {accuracy:.0%}, "
+        f"p50 {percentile(latencies, 50) * 1e6:.1f}us, p99 {percentile(latencies, 99) * 1e6:.1f}us"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--live", action="store_true", help="call Gemini for the LLM tier")
+    parser.add_argument("--repeat", type=int, default=200, help="local tier timing repetitions")
+    args = parser.parse_args()
+
+    router = LocalRouter()
+    local, fallback = [], []
+    for query, label in LABELED_QUERIES:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            chosen = router.classify(query)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        if chosen is None:
+            fallback.append((query, label))
+        else:
+            local.append((chosen == label, elapsed))
+
+    report("local", local)
+    print(f"short-circuited: {len(local) / len(LABELED_QUERIES):.0%} of {len(LABELED_QUERIES)} queries")
+
+    if not args.live:
+        print(f"   llm: {len(fallback)} queries (skipped, pass --live to measure)")
+        return
+
+    from manager_agent import ManagerAgent
+
+    manager = ManagerAgent()
+    llm = []
+    for query, label in fallback:
+        start = time.perf_counter()
+        chosen = await manager._llm_route(query)
+        llm.append((chosen == label, time.perf_counter() - start))
+    report("llm", llm)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
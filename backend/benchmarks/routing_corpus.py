@@ -0,0 +1,40 @@
+"""Labeled routing queries shared by the routing benchmarks."""
+
+LABELED_QUERIES = [
+    ("Draw a picture of a friendly robot programming on a laptop", "image_agent"),
+    ("draw a cat wearing a hat", "image_agent"),
+    ("Paint a sunset over the mountains in watercolor style", "image_agent"),
+    ("Generate an image of a futuristic city at night", "image_agent"),
+    ("Create a logo for my coffee shop called Bean There", "image_agent"),
+    ("Make a picture of a dragon flying over a castle", "image_agent"),
+    ("Design a poster for our hackathon", "image_agent"),
+    ("Sketch a minimalist mountain landscape", "image_agent"),
+    ("Can you draw a map of a fantasy island?", "image_agent"),
+    ("I need an illustration of a happy dog for a birthday card", "image_agent"),
+    ("Render a 3D style avatar of an astronaut", "image_agent"),
+    ("Give me a wallpaper with abstract blue waves", "image_agent"),
+    ("A photo of a red sports car on a beach", "image_agent"),
+    ("Who won the euro 2024?", "greeting_agent"),
+    ("who won the champions league final", "greeting_agent"),
+    ("What is the latest news about the Mars mission?", "greeting_agent"),
+    ("Why is the sky blue?", "greeting_agent"),
+    ("How does a transformer neural network work?", "greeting_agent"),
+    ("Explain quantum entanglement in simple terms", "greeting_agent"),
+    ("Compare Python and Rust for backend development", "greeting_agent"),
+    ("Write a short, encouraging welcome message for a new developer joining our hackathon team.", "greeting_agent"),
+    ("Draft an email to my landlord about the broken heater", "greeting_agent"),
+    ("Tell me about the history of the Roman empire", "greeting_agent"),
+    ("When is the next solar eclipse?", "greeting_agent"),
+    ("What are the current Bitcoin price trends?", "greeting_agent"),
+    ("hello there!", "greeting_agent"),
+    ("Thanks for the help", "greeting_agent"),
+    ("List the top 5 football clubs by titles", "greeting_agent"),
+    ("Summarize the plot of Hamlet", "greeting_agent"),
+    ("Compose a poem about autumn leaves", "greeting_agent"),
+    ("What does a picture of a black hole actually show?", "greeting_agent"),
+    ("How do I draw a realistic face?", "greeting_agent"),
+    ("Best practices for logo design", "greeting_agent"),
+    ("A sunny day in the park", "image_agent"),
+    ("Translate this text into French: good morning", "greeting_agent"),
+    ("Recent statistics on global renewable energy adoption", "greeting_agent"),
+]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark of speculative dispatch in the Manager Agent.
+
+Sends the queries of the labeled routing corpus that the local router cannot
+decide (so they wait for the LLM router) through `ManagerAgent.handle_message`,
+or `stream_response` with --stream, all at once. The LLM router is stubbed to
+answer the corpus label after `--routing-latency` seconds and the specialists
+are stubs answering after `--greeting-latency` / `--image-latency` seconds.
+
+For each speculation policy (off, prior, always) the benchmark reports the
+mean/p50/max response latency, the speculation hits and misses, and the specialist
+seconds wasted on cancelled speculative calls.
+
+Usage:
+    python benchmarks/speculation.py --routing-latency 0.8 [--stream]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "agents" / "src"))
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from python_a2a import Message, MessageRole, TextContent  # noqa: E402
+
+from benchmarks.routing_corpus import LABELED_QUERIES  # noqa: E402
+from manager_agent import SPECULATION_WASTED_SECONDS, SPECULATIONS, ManagerAgent  # noqa: E402
+from routing import LocalRouter  # noqa: E402
+from streaming import stream_event  # noqa: E402
+
+POLICIES = ["off", "prior", "always"]
+
+
+class StubSpecialist:
+    """Stands in for a `SpecialistPool`, answering after `latency` seconds."""
+
+    def __init__(self, name: str, latency: float, steps: int = 4):
+        self.name = name
+        self.latency = latency
+        self.steps = steps
+
+    async def send_message(self, message, deadline=None, token_budget=None, thread_id=None):
+        await asyncio.sleep(self.latency)
+        return Message(
+            content=TextContent(text=f"{self.name}: {message.content.text}"),
+            role=MessageRole.AGENT,
+        )
+
+    async def stream_response(self, message, deadline=None, token_budget=None, thread_id=None):
+        for step in range(self.steps):
+            await asyncio.sleep(self.latency / self.steps)
+            yield stream_event("progress", step=step)
+        yield stream_event("final", text=f"{self.name}: {message.content.text}")
+
+
+def speculation_counts() -> dict[str, float]:
+    counts = {"hit": 0.0, "miss": 0.0, "wasted": 0.0}
+    for (_, outcome), value in SPECULATIONS.snapshot()["values"]:
+        counts[outcome] += value
+    for _, (_, total, _) in SPECULATION_WASTED_SECONDS.snapshot()["values"]:
+        counts["wasted"] += total
+    return counts
+
+
+async def run(manager: ManagerAgent, query: str, label: str, stream: bool) -> float:
+    message = Message(content=TextContent(text=query), role=MessageRole.USER)
+    started = time.perf_counter()
+    if stream:
+        events = [json.loads(chunk) async for chunk in manager.stream_response(message)]
+        answer = events[-1]["data"]["text"]
+    else:
+        answer = (await manager.handle_message(message)).content.text
+    assert answer.startswith(label), answer
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--routing-latency", type=float, default=0.8)
+    parser.add_argument("--greeting-latency", type=float, default=1.5)
+    parser.add_argument("--image-latency", type=float, default=3.0)
+    parser.add_argument("--stream", action="store_true", help="use stream_response")
+    args = parser.parse_args()
+
+    router = LocalRouter()
+    queries = [(q, label) for q, label in LABELED_QUERIES if router.classify(q) is None]
+    labels = dict(queries)
+
+    async def llm_route(query: str) -> str:
+        await asyncio.sleep(args.routing_latency)
+        return labels[query]
+
+    print(
+        f"{len(queries)} LLM-routed queries, routing {args.routing_latency:.1f}s, "
+        f"greeting {args.greeting_latency:.1f}s, image {args.image_latency:.1f}s"
+    )
+    print(f"\n{'policy':<8}{'mean':>8}{'p50':>8}{'max':>8}{'hits':>6}{'misses':>8}{'wasted':>9}")
+    for policy in POLICIES:
+        manager = ManagerAgent(speculation=policy)
+        manager._llm_route = llm_route
+        manager.specialists = {
+            "greeting_agent": StubSpecialist("greeting_agent", args.greeting_latency),
+            "image_agent": StubSpecialist("image_agent", args.image_latency),
+        }
+        before = speculation_counts()
+        latencies = await asyncio.gather(
+            *(run(manager, query, label, args.stream) for query, label in queries)
+        )
+        after = speculation_counts()
+        delta = {key: after[key] - before[key] for key in after}
+        print(
+            f"{policy:<8}{statistics.mean(latencies):>7.2f}s"
+            f"{statistics.median(latencies):>7.2f}s{max(latencies):>7.2f}s"
+            f"{delta['hit']:>6.0f}{delta['miss']:>8.0f}{delta['wasted']:>8.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,267 @@
+"""In-process stand-ins for the Gemini clients used by the research graph.
+
+The stubs mimic just enough of `ChatGoogleGenerativeAI` and `google.genai.Client`
+for the graph nodes to run end-to-end without network access. Every call sleeps
+for a configurable latency so concurrency effects show up in wall-clock time.
+Latencies are seconds or callables mapping the prompt to seconds.
+"""
+
+import asyncio
+import hashlib
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from agent.tools_and_schemas import Reflection, SearchQueryList
+
+WORDS = ["one", "two", "three"] + [str(i) for i in range(4, 100)]
+
+
+def delay(latency, prompt) -> float:
+    """Latency of a call: fixed, or computed from the prompt by a callable."""
+    return latency(str(prompt)) if callable(latency) else latency
+
+
+def filler(words: int, seed: str = "") -> str:
+    """Deterministic text of `words` words in 12-word sentences, different per seed."""
+    rng = random.Random(seed)
+    sentences = [
+        " ".join(f"fact{rng.randrange(5000)}" for _ in range(min(12, words - i))) + "."
+        for i in range(0, words, 12)
+    ]
+    return " ".join(sentences)
+
+
+class StubStructuredLLM:
+    def __init__(self, schema, latency: float, model: "StubChatModel"):
+        self.schema = schema
+        self.latency = latency
+        self.model = model
+
+    def _result(self, prompt: str):
+        if self.schema is SearchQueryList:
+            # Queries differ per question so latency injected per query varies too
+            topic = hashlib.sha256(str(prompt).encode()).hexdigest()[:8]
+            return SearchQueryList(
+                query=[
+                    f"stub query {word} ({topic})"
+                    for word in WORDS[: self.model.queries]
+                ],
+                rationale="stub",
+            )
+        if self.schema is Reflection:
+            # Follow-ups differ per loop because the prompt grows with the results
+            topic = hashlib.sha256(str(prompt).encode()).hexdigest()[:8]
+            return Reflection(
+                is_sufficient=not self.model.follow_ups,
+                knowledge_gap="stub gap" if self.model.follow_ups else "",
+                follow_up_queries=[
+                    f"stub follow-up {word} ({topic})"
+                    for word in WORDS[: self.model.follow_ups]
+                ],
+            )
+        raise ValueError(f"Unsupported schema: {self.schema}")
+
+    def invoke(self, prompt, config=None):
+        self.model.connect()
+        self.model.record(self.schema.__name__, prompt)
+        time.sleep(delay(self.latency, prompt))
+        return self._result(prompt)
+
+    async def ainvoke(self, prompt, config=None):
+        self.model.connect()
+        self.model.record(self.schema.__name__, prompt)
+        await asyncio.sleep(delay(self.latency, prompt))
+        return self._result(prompt)
+
+
+class _ConnectionCounter:
+    """Counts instances and the connections they open (one per instance, on first use)."""
+
+    constructions = 0
+    connections = 0
+
+    def __init__(self):
+        type(self).constructions += 1
+        self._connected = False
+
+    def connect(self):
+        if not self._connected:
+            self._connected = True
+            type(self).connections += 1
+
+
+class StubChatModel(_ConnectionCounter):
+    """Drop-in for `ChatGoogleGenerativeAI` returning canned answers.
+
+    Prompts are appended to the class-level `prompts` list as (kind, prompt),
+    where kind is the structured output schema name or ``text``.
+    """
+
+    prompts: list[tuple[str, str]] = []
+
+    def __init__(
+        self,
+        latency=0.5,
+        queries: int = 3,
+        follow_ups: int = 0,
+        answer_words: int = 0,
+        **kwargs,
+    ):
+        super().__init__()
+        self.latency = latency
+        self.queries = queries
+        self.follow_ups = follow_ups
+        self.answer_words = answer_words
+        self.kwargs = kwargs
+
+    def record(self, kind: str, prompt) -> None:
+        type(self).prompts.append((kind, str(prompt)))
+
+    def with_structured_output(self, schema):
+        return StubStructuredLLM(schema, self.latency, self)
+
+    def _answer(self):
+        return SimpleNamespace(
+            content="Stub answer citing https://vertexaisearch.cloud.google.com/id/0-0 "
+            + filler(self.answer_words)
+        )
+
+    def invoke(self, prompt, config=None):
+        self.connect()
+        self.record("text", prompt)
+        time.sleep(delay(self.latency, prompt))
+        return self._answer()
+
+    async def ainvoke(self, prompt, config=None):
+        self.connect()
+        self.record("text", prompt)
+        await asyncio.sleep(delay(self.latency, prompt))
+        return self._answer()
+
+
+def make_grounded_response(text: str, n_chunks: int = 3):
+    """Build a response object shaped like a grounded `generate_content` result."""
+    chunks = [
+        SimpleNamespace(
+            web=SimpleNamespace(
+                uri=f"https://example.com/source-{i}", title=f"source-{i}.com"
+            )
+        )
+        for i in range(n_chunks)
+    ]
+    supports = [
+        SimpleNamespace(
+            segment=SimpleNamespace(start_index=0, end_index=len(text)),
+            grounding_chunk_indices=[i],
+        )
+        for i in range(n_chunks)
+    ]
+    metadata = SimpleNamespace(grounding_chunks=chunks, grounding_supports=supports)
+    return SimpleNamespace(
+        text=text, candidates=[SimpleNamespace(grounding_metadata=metadata)]
+    )
+
+
+def make_image_response(prompt: str, size: int):
+    """Build a response object carrying a `size` px PNG, different per prompt."""
+    from benchmarks.fake_gemini import make_png
+
+    inline_data = SimpleNamespace(
+        data=make_png(size, random.Random(prompt)), mime_type="image/png"
+    )
+    return SimpleNamespace(parts=[SimpleNamespace(inline_data=inline_data)])
+
+
+class _StubModels:
+    def __init__(self, latency, client: "StubGenaiClient"):
+        self.latency = latency
+        self.client = client
+
+    def response(self, contents: str, config=None):
+        type(self.client).calls += 1
+        if str(getattr(config, "response_mime_type", "")).startswith("image/"):
+            return make_image_response(str(contents), self.client.image_size)
+        # The search prompt ends with the query
+        query = contents.strip().splitlines()[-1]
+        return make_grounded_response(
+            f"Stub findings for: {query}. {filler(self.client.result_words, query)}".rstrip()
+        )
+
+    def generate_content(self, model, contents, config=None):
+        self.client.connect()
+        time.sleep(delay(self.latency, contents))
+        return self.response(contents, config)
+
+
+class _StubAsyncModels(_StubModels):
+    async def generate_content(self, model, contents, config=None):
+        self.client.connect()
+        await asyncio.sleep(delay(self.latency, contents))
+        return self.response(contents, config)
+
+
+class StubGenaiClient(_ConnectionCounter):
+    """Drop-in for `google.genai.Client` exposing `models` and `aio.models`.
+
+    `latency` is either seconds or a callable mapping the prompt to seconds.
+    Search results are padded with `result_words` words of filler text; image
+    requests (an ``image/*`` response mime type) return `image_size` px PNGs.
+    `calls` counts the `generate_content` calls of all instances.
+    """
+
+    calls = 0
+
+    def __init__(
+        self, latency=0.5, result_words: int = 0, image_size: int = 128, **kwargs
+    ):
+        super().__init__()
+        self.result_words = result_words
+        self.image_size = image_size
+        self.models = _StubModels(latency, self)
+        self.aio = SimpleNamespace(models=_StubAsyncModels(latency, self))
+
+
+def install_graph_stubs(
+    latency=0.5,
+    search_latency=None,
+    queries: int = 3,
+    follow_ups: int = 0,
+    answer_words: int = 0,
+    result_words: int = 0,
+):
+    """Point the client registry (and thus the research graph) at the stubs.
+
+    Args:
+        latency: Seconds, or callable mapping the prompt to seconds, every
+            stubbed LLM call takes.
+        search_latency: Optional seconds, or callable mapping the search prompt to
+            seconds, for the grounded searches (defaults to `latency`).
+        queries: Number of search queries the stubbed query writer returns.
+        follow_ups: Number of follow-up queries the stubbed reflection asks for
+            (0 judges the first results sufficient).
+        answer_words: Filler words appended to plain text answers.
+        result_words: Filler words appended to every search result.
+    """
+    from agent import clients
+
+    clients.ChatGoogleGenerativeAI = lambda **kwargs: StubChatModel(
+        latency=latency,
+        queries=queries,
+        follow_ups=follow_ups,
+        answer_words=answer_words,
+        **kwargs,
+    )
+    clients.Client = lambda **kwargs: StubGenaiClient(
+        latency=latency if search_latency is None else search_latency,
+        result_words=result_words,
+        **kwargs,
+    )
+    clients.reset_clients()
+    # Build the graph through the package so `agent.graph` stays the compiled
+    # graph for `from agent import graph`, then hand back the graph module.
+    import agent
+
+    agent.graph
+    return sys.modules["agent.graph"]
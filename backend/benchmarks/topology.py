@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the full agent topology against the fake Gemini server.
+
+Starts benchmarks/fake_gemini.py, the three agent servers (greeting 8001,
+manager 8002, image 8003) and the FastAPI app, all pointed at the fake server
+through GEMINI_BASE_URL. It then sends a fixed number of `/query` (or
+`/query/stream`) requests at a fixed concurrency with a mix of research, simple
+and image queries. The report covers throughput, p50/p95/p99 latency per query
+kind and a per-hop breakdown taken from the app's `/metrics` endpoint.
+
+Use it as the baseline before and after a performance change: same seed, same
+mix, same fake-server latency model. `--json` saves the report for comparison.
+With `--no-spawn` it drives an already running stack instead.
+
+Usage:
+    python benchmarks/topology.py --requests 200 --concurrency 20 \\
+        --mix research=0.6,simple=0.3,image=0.1 \\
+        --fake-args "--latency lognormal:0.8,0.4 --error-rate 0.01"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+AGENTS = [
+    ("greeting_agent", "run_greeting_agent.py", 8001),
+    ("image_agent", "run_image_agent.py", 8003),
+    ("manager_agent", "run_manager_agent.py", 8002),
+]
+
+QUERY_TEMPLATES = {
+    "research": [
+        "Who won the {topic} championship in {year}?",
+        "What are the latest developments in {topic} as of {year}?",
+        "How did {topic} change between {year} and today?",
+    ],
+    "simple": [
+        "Write a short thank-you note to the {topic} team.",
+        "Hello! Say hi to the {topic} fans.",
+    ],
+    "image": [
+        "Draw a picture of a {topic} trophy from {year}.",
+        "Generate an image of a {topic} stadium at night.",
+    ],
+}
+TOPICS = ["chess", "cricket", "formula one", "tennis", "rugby", "cycling", "sailing"]
+
+# Histograms reported per hop: (metric, label used as the row name)
+HOP_METRICS = [
+    ("a2a_hop_duration_seconds", "hop"),
+    ("research_node_duration_seconds", "node"),
+    ("research_llm_duration_seconds", "node"),
+    ("research_loop_duration_seconds", None),
+]
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for item in spec.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in QUERY_TEMPLATES:
+            raise ValueError(f"Unknown query kind '{kind}'")
+        mix[kind] = float(weight)
+    return mix
+
+
+def build_workload(args) -> list[tuple[str, str]]:
+    """Deterministic list of (kind, query) pairs."""
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    kinds = list(mix)
+    distinct = args.distinct or args.requests
+    pool = []
+    for i in range(distinct):
+        kind = rng.choices(kinds, weights=[mix[k] for k in kinds])[0]
+        template = rng.choice(QUERY_TEMPLATES[kind])
+        query = template.format(topic=rng.choice(TOPICS), year=1990 + i % 35)
+        pool.append((kind, f"{query} (#{i})"))
+    return [pool[i % distinct] for i in range(args.requests)]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def parse_metrics(text: str) -> dict[tuple, float]:
+    """Parse Prometheus text into {(name, ((label, value), ...)): value}."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = re.match(r"^(\w+)(?:\{(.*)\})? (\S+)$", line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        pairs = tuple(re.findall(r'(\w+)="([^"]*)"', labels or ""))
+        samples[(name, pairs)] = float(value)
+    return samples
+
+
+def hop_breakdown(before: dict, after: dict) -> list[dict]:
+    """Count, mean and bucket-interpolated p95 per hop for the run's window."""
+    delta = {key: value - before.get(key, 0.0) for key, value in after.items()}
+    rows = []
+    for metric, label in HOP_METRICS:
+        series = defaultdict(dict)
+        for (name, pairs), value in delta.items():
+            if not name.startswith(metric):
+                continue
+            labels = dict(pairs)
+            row = labels.get(label, metric) if label else metric
+            if metric == "research_llm_duration_seconds":
+                row = f"llm:{labels.get('node')}/{labels.get('model')}"
+            suffix = name[len(metric) :]
+            if suffix == "_bucket":
+                series[row].setdefault("buckets", []).append(
+                    (float(labels["le"]), value)
+                )
+            elif suffix in ("_sum", "_count"):
+                series[row][suffix[1:]] = value
+        for row, data in sorted(series.items()):
+            count = data.get("count", 0.0)
+            if count <= 0:
+                continue
+            rows.append(
+                {
+                    "hop": row,
+                    "count": int(count),
+                    "mean": data.get("sum", 0.0) / count,
+                    "p95": bucket_quantile(data.get("buckets", []), 0.95),
+                }
+            )
+    return rows
+
+
+def bucket_quantile(buckets: list[tuple[float, float]], q: float) -> float:
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] <= 0:
+        return 0.0
+    rank = q * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (
+                count - lower_count
+            )
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+async def wait_healthy(client: httpx.AsyncClient, url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get(url, timeout=1.0)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{url} did not become healthy within {timeout}s")
+        await asyncio.sleep(0.2)
+
+
+def spawn_stack(args, log_dir: Path) -> list[subprocess.Popen]:
+    env = dict(
+        os.environ,
+        GEMINI_BASE_URL=f"http://127.0.0.1:{args.fake_port}",
+        GEMINI_API_KEY="benchmark",
+        GOOGLE_API_KEY="benchmark",
+        METRICS_DIR=str(log_dir / "metrics"),
+        METRICS_FLUSH_INTERVAL="0.2",
+        # Runs must not see each other's persisted search results, nor write
+        # checkpoints and images into the developer's backend/.cache
+        SEARCH_CACHE_PATH="",
+        RESEARCH_CHECKPOINT_PATH=str(log_dir / "research_checkpoints.sqlite"),
+        IMAGE_STORE_DIR=str(log_dir / "images"),
+        ROUTING_CACHE_BACKEND="memory",
+        # One replica per agent, whatever start_agents.sh registered
+        AGENT_REGISTRY_PATH=str(log_dir / "agent_registry.json"),
+        PYTHONUNBUFFERED="1",
+    )
+    commands = [
+        (
+            "fake_gemini",
+            [
+                sys.executable,
+                "benchmarks/fake_gemini.py",
+                "--port",
+                str(args.fake_port),
+                "--seed",
+                str(args.seed),
+                *shlex.split(args.fake_args),
+            ],
+        ),
+        *((name, [sys.executable, script]) for name, script, _ in AGENTS),
+        (
+            "main",
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(args.api_port),
+                "--log-level",
+                "warning",
+            ],
+        ),
+    ]
+    processes = []
+    for name, command in commands:
+        log = open(log_dir / f"{name}.log", "w")
+        processes.append(
+            subprocess.Popen(
+                command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+        )
+    return processes
+
+
+def request_body(args, query: str) -> dict:
+    body = {"text": query}
+    if args.query_timeout:
+        body["timeout"] = args.query_timeout
+    if args.token_budget:
+        body["token_budget"] = args.token_budget
+    return body
+
+
+async def send(client, args, kind: str, query: str) -> dict:
+    started = time.perf_counter()
+    first_event = None
+    event = None
+    ok = False
+    status = None
+    try:
+        if args.stream:
+            async with client.stream(
+                "POST", f"{args.api_url}/query/stream", json=request_body(args, query)
+            ) as response:
+                status = response.status_code
+                if response.is_success:
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        if first_event is None:
+                            first_event = time.perf_counter() - started
+                        event = json.loads(line)
+                text = event["data"].get("text", "") if event else ""
+                ok = (
+                    event is not None
+                    and event["event"] == "final"
+                    and "error" not in text.lower()[:80]
+                )
+        else:
+            response = await client.post(
+                f"{args.api_url}/query", json=request_body(args, query)
+            )
+            status = response.status_code
+            text = response.json().get("response", "") if response.is_success else ""
+            ok = response.is_success and "error" not in text.lower()[:80]
+    except httpx.HTTPError:
+        ok = False
+    return {
+        "kind": kind,
+        "ok": ok,
+        # Shed by admission control rather than failed
+        "rejected": status in (429, 503),
+        "latency": time.perf_counter() - started,
+        "first_event": first_event,
+    }
+
+
+async def drive(args, workload: list[tuple[str, str]]) -> tuple[list[dict], float]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+    results = []
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+
+        async def worker():
+            while not queue.empty():
+                kind, query = queue.get_nowait()
+                results.append(await send(client, args, kind, query))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return results, time.perf_counter() - started
+
+
+def summarize(results: list[dict], elapsed: float, hops: list[dict], args) -> dict:
+    groups = defaultdict(list)
+    for result in results:
+        groups[result["kind"]].append(result)
+        groups["all"].append(result)
+    kinds = {}
+    for kind, items in sorted(groups.items()):
+        latencies = [r["latency"] for r in items if r["ok"]]
+        first = [r["first_event"] for r in items if r["first_event"] is not None]
+        kinds[kind] = {
+            "requests": len(items),
+            "errors": sum(not r["ok"] and not r["rejected"] for r in items),
+            "rejected": sum(r["rejected"] for r in items),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            **({"first_event_p50": percentile(first, 50)} if args.stream else {}),
+        }
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "stream": args.stream,
+            "seed": args.seed,
+            "fake_args": args.fake_args,
+        },
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "kinds": kinds,
+        "hops": hops,
+    }
+
+
+def print_report(report: dict) -> None:
+    config = report["config"]
+    print(
+        f"{config['requests']} requests at concurrency {config['concurrency']} "
+        f"({'stream' if config['stream'] else 'query'}, mix {config['mix']})"
+    )
+    print(
+        f"elapsed {report['elapsed']:.2f}s, throughput {report['throughput']:.2f} req/s"
+    )
+    print(
+        f"\n{'kind':<10}{'requests':>9}{'errors':>8}{'rejected':>9}"
+        f"{'p50':>9}{'p95':>9}{'p99':>9}"
+    )
+    for kind, stats in report["kinds"].items():
+        print(
+            f"{kind:<10}{stats['requests']:>9}{stats['errors']:>8}{stats['rejected']:>9}"
+            f"{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s{stats['p99']:>8.2f}s"
+        )
+    print(f"\n{'hop':<48}{'count':>7}{'mean':>9}{'~p95':>9}")
+    for hop in report["hops"]:
+        print(
+            f"{hop['hop']:<48}{hop['count']:>7}{hop['mean']:>8.3f}s{hop['p95']:>8.3f}s"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--mix", default="research=0.6,simple=0.3,image=0.1")
+    parser.add_argument(
+        "--distinct",
+        type=int,
+        default=0,
+        help="Number of distinct queries (default: every request is unique)",
+    )
+    parser.add_argument("--stream", action="store_true", help="Use /query/stream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument(
+        "--query-timeout", type=float, help="Per-query deadline sent with each request"
+    )
+    parser.add_argument(
+        "--token-budget", type=int, help="Research token budget sent with each request"
+    )
+    parser.add_argument("--api-port", type=int, default=8000)
+    parser.add_argument("--fake-port", type=int, default=8100)
+    parser.add_argument(
+        "--fake-args", default="", help="Extra arguments for fake_gemini.py"
+    )
+    parser.add_argument(
+        "--no-spawn", action="store_true", help="Drive an already running stack"
+    )
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+    args.api_url = f"http://127.0.0.1:{args.api_port}"
+
+    log_dir = Path(tempfile.mkdtemp(prefix="a2a_topology_"))
+    processes = [] if args.no_spawn else spawn_stack(args, log_dir)
+    try:
+        async with httpx.AsyncClient() as client:
+            if processes:
+                await wait_healthy(client, f"http://127.0.0.1:{args.fake_port}/health", 60)
+                for _, _, port in AGENTS:
+                    await wait_healthy(client, f"http://127.0.0.1:{port}/a2a/health", 60)
+            await wait_healthy(client, f"{args.api_url}/health", 60)
+            before = parse_metrics((await client.get(f"{args.api_url}/metrics")).text)
+
+        results, elapsed = await drive(args, build_workload(args))
+
+        async with httpx.AsyncClient() as client:
+            # Let the agents flush their last metrics snapshots
+            await asyncio.sleep(1.0)
+            after = parse_metrics((await client.get(f"{args.api_url}/metrics")).text)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    report = summarize(results, elapsed, hop_breakdown(before, after), args)
+    print_report(report)
+    if processes:
+        print(f"\nLogs: {log_dir}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,8 +1,11 @@
 # greeting_agent.py
 import os
 import asyncio
+import math
 import sys
+import time
 from pathlib import Path
+from uuid import uuid4
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
@@ -13,9 +16,20 @@ agents_src_path = Path(__file__).parent / "agents" / "src"
 if str(agents_src_path) not in sys.path:
     sys.path.insert(0, str(agents_src_path))
 
+from agent.cache import SingleFlight, StreamFlight, normalize_text
+from agent.clients import get_genai_client
+from agent.instrumentation import start_span, trace_carrier
+from agent.metrics import REGISTRY
+from agent.rate_limit import get_rate_limiter
+from answer_cache import AnswerCache
+from routing import is_research_query
+from streaming import stream_event
+from transport import message_deadline, message_thread_id, message_token_budget
+
 # Import the research agent graph
 try:
-    from agent import graph
+    from agent import durable_graph
+    from langgraph.types import Command
 
     RESEARCH_AGENT_AVAILABLE = True
     print("[GreetingAgent] Research agent graph imported successfully.")
@@ -25,50 +39,43 @@ except ImportError as e:
 
 load_dotenv()
 
+# Maximum number of research graph runs executing at the same time. Further
+# research queries wait for a slot while simple queries are served immediately.
+RESEARCH_MAX_CONCURRENCY = int(os.getenv("RESEARCH_MAX_CONCURRENCY", "8"))
+# Times a failed research run is resumed from its last checkpoint before the
+# agent falls back to a plain Gemini answer
+RESEARCH_RESUME_ATTEMPTS = int(os.getenv("RESEARCH_RESUME_ATTEMPTS", "1"))
+
+# Identical research queries are coalesced only when their limits fall in the
+# same bucket: deadlines RESEARCH_COALESCE_DEADLINE_STEP seconds wide, token
+# budgets RESEARCH_COALESCE_BUDGET_STEP tokens wide. Every run uses the lower
+# bound of its buckets, so the shared run never outlasts or outspends the limits
+# of any caller that joined it. 0 requires the exact same limits.
+RESEARCH_COALESCE_DEADLINE_STEP = float(os.getenv("RESEARCH_COALESCE_DEADLINE_STEP", "5"))
+RESEARCH_COALESCE_BUDGET_STEP = int(os.getenv("RESEARCH_COALESCE_BUDGET_STEP", "1000"))
+
+RESEARCH_COALESCED = REGISTRY.counter(
+    "research_coalesced_total",
+    "Research queries served by an identical run already in flight.",
+    ["mode"],
+)
+
 
 class GreetingAgent(A2AServer):
-    def __init__(self):
+    def __init__(self, research_max_concurrency: int = RESEARCH_MAX_CONCURRENCY):
         super().__init__()
         # Using a powerful text model as fallback
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.client = get_genai_client(os.getenv("GOOGLE_API_KEY"))
+        self.research_slots = asyncio.Semaphore(research_max_concurrency)
+        self.answer_cache = AnswerCache()
+        self.research_runs = SingleFlight()
+        self.research_streams = StreamFlight()
+        REGISTRY.start_flusher("greeting_agent")
         print("[GreetingAgent] Gemini model initialized with research capabilities.")
 
     def is_research_query(self, query: str) -> bool:
         """Determine if the query requires research capabilities."""
-        research_keywords = [
-            "who",
-            "what",
-            "when",
-            "where",
-            "why",
-            "how",
-            "latest",
-            "recent",
-            "current",
-            "news",
-            "update",
-            "winner",
-            "champion",
-            "result",
-            "score",
-            "data",
-            "statistics",
-            "facts",
-            "information",
-            "research",
-            "find",
-            "search",
-            "look up",
-            "tell me about",
-            "explain",
-            "compare",
-            "list",
-            "top",
-            "best",
-        ]
-
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in research_keywords)
+        return is_research_query(query)
 
     async def handle_message(self, message: Message) -> Message:
         user_query = message.content.text
@@ -76,16 +83,26 @@ class GreetingAgent(A2AServer):
 
         # Check if this requires research and if research agent is available
         if RESEARCH_AGENT_AVAILABLE and self.is_research_query(user_query):
+            cached = self.answer_cache.get(user_query)
+            if cached is not None:
+                print(
+                    f"[GreetingAgent] Serving cached research answer "
+                    f"(cache stats {self.answer_cache.stats()})"
+                )
+                return Message(
+                    content=TextContent(text=cached["text"]), role=MessageRole.AGENT
+                )
+
             print("[GreetingAgent] Using research agent for comprehensive answer...")
             try:
-                # Use the research agent graph
-                state = graph.invoke(
-                    {
-                        "messages": [{"role": "user", "content": user_query}],
-                        "max_research_loops": 2,
-                        "initial_search_query_count": 3,
-                    }
+                # Identical questions asked while a run is in flight wait for it
+                state, shared = await self.research_runs.do(
+                    self._research_key(user_query, message),
+                    lambda: self._run_research(user_query, message),
                 )
+                if shared:
+                    RESEARCH_COALESCED.inc(mode="invoke")
+                    print("[GreetingAgent] Joined an identical research run in flight")
 
                 # Extract the final response
                 if "messages" in state and len(state["messages"]) > 1:
@@ -107,11 +124,277 @@ class GreetingAgent(A2AServer):
             print("[GreetingAgent] Using regular Gemini response...")
             return await self._generate_regular_response(user_query)
 
+    async def stream_response(self, message: Message):
+        """Stream research progress as JSON-encoded events while the graph runs.
+
+        Events: ``queries`` (generated search queries), ``web_research`` (one per
+        finished search), ``reflection`` (loop decision), ``token`` (answer tokens
+        from finalize_answer, still using short citation URLs) and ``final``. A
+        ``resumed`` event means a step failed and the run resumed from its last
+        checkpoint; answer tokens streamed before it are streamed again.
+        """
+        user_query = message.content.text
+        print(f"[GreetingAgent] Received streaming query: '{user_query}'")
+
+        if not (RESEARCH_AGENT_AVAILABLE and self.is_research_query(user_query)):
+            response = await self._generate_regular_response(user_query)
+            yield stream_event("final", text=response.content.text)
+            return
+
+        cached = self.answer_cache.get(user_query)
+        if cached is not None:
+            yield stream_event(
+                "final",
+                text=cached["text"],
+                sources=[source["value"] for source in cached["sources"]],
+                cached=True,
+            )
+            return
+
+        try:
+            # Identical questions asked while a run is in flight follow its stream
+            events, shared = self.research_streams.subscribe(
+                self._research_key(user_query, message),
+                lambda: self._stream_research(user_query, message),
+            )
+            if shared:
+                RESEARCH_COALESCED.inc(mode="stream")
+                print("[GreetingAgent] Following an identical research stream in flight")
+            async for event in events:
+                yield event
+            print("[GreetingAgent] Streaming research completed successfully")
+        except Exception as e:
+            print(f"[GreetingAgent] Research agent error: {e}")
+            yield stream_event("error", detail=str(e))
+            response = await self._generate_regular_response(user_query)
+            yield stream_event("final", text=response.content.text)
+
+    async def _run_research(self, user_query: str, message: Message) -> dict:
+        """Run (or resume) the research graph for a query and return its final state."""
+        # Use the research agent graph. `ainvoke` runs the async node
+        # implementations so the event loop keeps serving other requests.
+        config = self._research_config(message)
+        state = None
+        try:
+            async with self.research_slots:
+                started = time.perf_counter()
+                with start_span("greeting.research", carrier=trace_carrier(message)):
+                    research_input, state = await self._resume_point(
+                        user_query, message, config
+                    )
+                    for attempt in range(RESEARCH_RESUME_ATTEMPTS + 1):
+                        if state is not None:
+                            break
+                        try:
+                            state = await durable_graph.ainvoke(research_input, config)
+                        except Exception as e:
+                            if attempt == RESEARCH_RESUME_ATTEMPTS:
+                                raise
+                            print(f"[GreetingAgent] Research step failed ({e}), resuming...")
+                            research_input, state = await self._resume_point(
+                                user_query, message, config
+                            )
+        finally:
+            # A run without a thread id from the caller can never be resumed,
+            # so its checkpoints go even when it failed
+            if state is not None or message_thread_id(message) is None:
+                await self._forget(config)
+
+        if "messages" in state and len(state["messages"]) > 1:
+            final_response = state["messages"][-1].content
+            # sources_gathered accumulates every source; keep the cited ones
+            cited_sources = {
+                source["value"]: source
+                for source in state.get("sources_gathered", [])
+                if source["value"] in final_response
+            }
+            self.answer_cache.set(
+                user_query,
+                final_response,
+                list(cited_sources.values()),
+                time.perf_counter() - started,
+            )
+        return state
+
+    async def _stream_research(self, user_query: str, message: Message):
+        """Run (or resume) the research graph for a query, yielding its progress events."""
+        config = self._research_config(message)
+        state = None
+        try:
+            async with self.research_slots:
+                started = time.perf_counter()
+                with start_span("greeting.research_stream", carrier=trace_carrier(message)):
+                    research_input, state = await self._resume_point(user_query, message, config)
+                    if state is not None:
+                        yield stream_event(
+                            "final",
+                            text=state["messages"][-1].content,
+                            sources=[
+                                source["value"]
+                                for source in state.get("sources_gathered", [])
+                                if source["value"] in state["messages"][-1].content
+                            ],
+                        )
+                    for attempt in range(RESEARCH_RESUME_ATTEMPTS + 1):
+                        if state is not None:
+                            break
+                        try:
+                            async for mode, chunk in durable_graph.astream(
+                                research_input,
+                                config,
+                                stream_mode=["updates", "messages", "custom"],
+                            ):
+                                if mode == "custom":
+                                    # Single searches, streamed as they finish
+                                    node, update = chunk
+                                    yield self._progress_event(node, update)
+                                    continue
+                                if mode == "messages":
+                                    token, metadata = chunk
+                                    if metadata.get("langgraph_node") == "finalize_answer":
+                                        if isinstance(token.content, str) and token.content:
+                                            yield stream_event("token", text=token.content)
+                                    continue
+                                for node, update in chunk.items():
+                                    if node == "web_research":
+                                        continue
+                                    event = self._progress_event(node, update or {})
+                                    if event:
+                                        yield event
+                                    if node == "finalize_answer":
+                                        state = update
+                                        self.answer_cache.set(
+                                            user_query,
+                                            update["messages"][-1].content,
+                                            update["sources_gathered"],
+                                            time.perf_counter() - started,
+                                        )
+                        except Exception as e:
+                            if attempt == RESEARCH_RESUME_ATTEMPTS:
+                                raise
+                            print(f"[GreetingAgent] Research step failed ({e}), resuming...")
+                            # Tokens streamed by a failed finalize_answer are sent again
+                            yield stream_event("resumed", detail=str(e))
+                            research_input, state = await self._resume_point(
+                                user_query, message, config
+                            )
+        finally:
+            # A run without a thread id from the caller can never be resumed,
+            # so its checkpoints go even when it failed
+            if state is not None or message_thread_id(message) is None:
+                await self._forget(config)
+
+    def _research_key(self, user_query: str, message: Message) -> str:
+        """Key under which identical concurrent research runs are coalesced."""
+        research_input = self._research_input(user_query, message)
+        return (
+            f"{research_input['max_research_loops']}|"
+            f"{research_input['initial_search_query_count']}|"
+            f"{research_input.get('deadline')}|{research_input.get('token_budget')}|"
+            f"{normalize_text(user_query)}"
+        )
+
+    def _research_config(self, message: Message) -> dict:
+        """Run config of a research run, keyed by the message's thread id or a new one."""
+        return {"configurable": {"thread_id": message_thread_id(message) or uuid4().hex}}
+
+    async def _resume_point(self, user_query: str, message: Message, config: dict):
+        """Return the graph input that starts or resumes a research run, and its final state.
+
+        A run with a checkpoint for the same question resumes from its last
+        completed step with the message's deadline and token budget; a finished
+        run returns its final state and no input. Otherwise the run starts anew.
+        """
+        research_input = self._research_input(user_query, message)
+        if durable_graph.checkpointer is None:
+            return research_input, None
+        snapshot = await durable_graph.aget_state(config)
+        if not snapshot.values:
+            return research_input, None
+        if snapshot.values["messages"][0].content != user_query:
+            # The thread id was reused for another question
+            await self._forget(config)
+            return research_input, None
+        if not snapshot.next:
+            return None, snapshot.values
+        print(f"[GreetingAgent] Resuming research before {', '.join(snapshot.next)}")
+        limits = {
+            key: research_input[key]
+            for key in ("deadline", "token_budget")
+            if key in research_input
+        }
+        return (Command(update=limits) if limits else None), None
+
+    async def _forget(self, config: dict) -> None:
+        """Delete the checkpoints of a research run."""
+        if durable_graph.checkpointer is not None:
+            await durable_graph.checkpointer.adelete_thread(
+                config["configurable"]["thread_id"]
+            )
+
+    def _research_input(self, user_query: str, message: Message) -> dict:
+        """Build the research graph input for a user query.
+
+        The deadline and token budget carried by the message bound the research
+        run, so it answers in time instead of timing out mid-loop. Both are
+        rounded down to their coalescing bucket.
+        """
+        research_input = {
+            "messages": [{"role": "user", "content": user_query}],
+            "max_research_loops": 2,
+            "initial_search_query_count": 3,
+        }
+        deadline = message_deadline(message)
+        if deadline is not None:
+            if RESEARCH_COALESCE_DEADLINE_STEP > 0:
+                step = RESEARCH_COALESCE_DEADLINE_STEP
+                deadline = math.floor(deadline / step) * step
+            research_input["deadline"] = deadline
+        token_budget = message_token_budget(message)
+        if token_budget is not None:
+            if token_budget > RESEARCH_COALESCE_BUDGET_STEP > 0:
+                step = RESEARCH_COALESCE_BUDGET_STEP
+                token_budget = token_budget // step * step
+            research_input["token_budget"] = token_budget
+        return research_input
+
+    def _progress_event(self, node: str, update: dict):
+        """Translate a graph node update into a stream event (or None to skip it)."""
+        if node == "generate_query":
+            return stream_event("queries", queries=update.get("query_list", []))
+        if node == "web_research":
+            return stream_event(
+                "web_research",
+                search_query=update["search_query"][0],
+                result=update["web_research_result"][0],
+                sources=len(update.get("sources_gathered", [])),
+            )
+        if node == "reflection":
+            return stream_event(
+                "reflection",
+                is_sufficient=update["is_sufficient"],
+                knowledge_gap=update["knowledge_gap"],
+                follow_up_queries=update["follow_up_queries"],
+                research_loop_count=update["research_loop_count"],
+            )
+        if node == "finalize_answer":
+            return stream_event(
+                "final",
+                text=update["messages"][-1].content,
+                sources=[source["value"] for source in update["sources_gathered"]],
+            )
+        return None
+
     async def _generate_regular_response(self, prompt_text: str) -> Message:
         """Generate a regular response using Gemini."""
         try:
-            response = await self.client.agenerate_content(
-                model="gemini-1.5-pro-latest", contents=prompt_text
+            response = await get_rate_limiter().acall(
+                "gemini-1.5-pro-latest",
+                "answer",
+                prompt_text,
+                lambda: self.client.aio.models.generate_content(
+                    model="gemini-1.5-pro-latest", contents=prompt_text
+                ),
             )
             response_text = response.text
         except Exception as e:
@@ -1,45 +1,294 @@
 # image_agent.py
 import os
 import asyncio
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Optional
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
-from python_a2a import A2AServer, Message, TextContent, MessageRole
-from PIL import Image
-import io
+from python_a2a import A2AServer, Message, Metadata, TextContent, MessageRole
+
+# Add the agents src directory to Python path
+agents_src_path = Path(__file__).parent / "agents" / "src"
+if str(agents_src_path) not in sys.path:
+    sys.path.insert(0, str(agents_src_path))
+
+from agent.cache import SingleFlight, make_cache, normalize_text
+from agent.clients import get_genai_client
+from agent.metrics import REGISTRY
+from agent.rate_limit import get_rate_limiter
+from image_store import IMAGE_THUMBNAIL_SIZE, ImageStore
+from streaming import stream_event
 
 load_dotenv()
 
+IMAGE_MODEL = "gemini-1.5-pro-latest"
+IMAGE_CONFIG = types.GenerateContentConfig(response_mime_type="image/png")
+
+# Generated images by (normalized prompt, model, generation config). Entries point
+# into the image store, so they share its eviction; `sqlite` shares the cache
+# between image agent replicas using the same store. Its default path is resolved
+# against the backend directory, like the store's.
+IMAGE_CACHE_BACKEND = os.getenv("IMAGE_CACHE_BACKEND", "memory")
+IMAGE_CACHE_PATH = os.getenv(
+    "IMAGE_CACHE_PATH",
+    str(Path(__file__).resolve().parent / ".cache" / "image_prompts.sqlite"),
+)
+# 0 disables the cache
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "1024"))
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "86400"))
+# Whether concurrent identical prompts share one generation
+IMAGE_COALESCE = os.getenv("IMAGE_COALESCE", "true").lower() == "true"
+
+# Batch requests ("4 variations of ...", or a list of prompts asked for as
+# separate images) generate at most
+# IMAGE_BATCH_MAX images, IMAGE_BATCH_CONCURRENCY at a time
+IMAGE_BATCH_MAX = int(os.getenv("IMAGE_BATCH_MAX", "8"))
+IMAGE_BATCH_CONCURRENCY = int(os.getenv("IMAGE_BATCH_CONCURRENCY", "4"))
+
+NUMBER_WORDS = {
+    word: number
+    for number, word in enumerate(
+        ["two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"], start=2
+    )
+}
+VARIANTS_PATTERN = re.compile(
+    r"\b(\d+|" + "|".join(NUMBER_WORDS) + r")\s+(?:different\s+)?"
+    r"(?:variations|variants|versions|options|images|pictures|illustrations|drawings)\b",
+    re.IGNORECASE,
+)
+# A bullet or numbered list item on its own line
+LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[-*\u2022]|\d+[.)])\s+(.+?)\s*$")
+# Asks for one image per list item; a list without it (or a count matching the
+# number of items) describes the content of a single image
+SEPARATE_PATTERN = re.compile(
+    r"\b(?:separate|individual)\s+(?:images|pictures|illustrations|drawings)\b"
+    r"|\b(?:one|an?)\s+(?:image|picture|illustration|drawing)\s+(?:for\s+)?(?:each|per)\b",
+    re.IGNORECASE,
+)
+
+IMAGE_REQUESTS = REGISTRY.counter(
+    "image_requests_total",
+    "Image prompts by outcome: cache hit, coalesced with a running generation, or generated.",
+    ["outcome"],
+)
+
+
+def image_cache_key(prompt: str, model: str = IMAGE_MODEL, config=IMAGE_CONFIG) -> str:
+    """Return the cache key of an image prompt for a model and generation config."""
+    settings = json.dumps(config.model_dump(mode="json", exclude_none=True), sort_keys=True)
+    return f"{model}|{settings}|{normalize_text(prompt)}"
+
+
+def _requested_count(text: str) -> tuple[Optional[re.Match], int]:
+    """Return the "N variations" match in a request and N, or None and 1."""
+    match = VARIANTS_PATTERN.search(text)
+    if match is None:
+        return None, 1
+    count = match.group(1).lower()
+    return match, int(count) if count.isdigit() else NUMBER_WORDS[count]
+
+
+def image_batch(prompt: str, max_images: int = IMAGE_BATCH_MAX) -> list[str]:
+    """Split an image request into the prompts of its images.
+
+    A list of two or more items yields one prompt per item only when the lines
+    outside it ask for separate images or for as many images as there are
+    items; they are then kept as shared context. A request for N variations
+    yields N prompts asking for one image each. Any other request, including
+    a list describing one picture, is a single prompt.
+    """
+    lines = prompt.splitlines()
+    items = [m.group(1) for m in map(LIST_ITEM_PATTERN.match, lines) if m]
+    context = " ".join(
+        line.strip() for line in lines if line.strip() and not LIST_ITEM_PATTERN.match(line)
+    )
+    match, count = _requested_count(context)
+    if len(items) >= 2 and (count == len(items) or SEPARATE_PATTERN.search(context)):
+        if match:
+            context = f"{context[: match.start()]}one image{context[match.end() :]}"
+        context = SEPARATE_PATTERN.sub("one image", context)
+        return [f"{context} {item}".strip() for item in items[:max_images]]
+
+    match, count = _requested_count(prompt)
+    if count > 1:
+        count = min(count, max_images)
+        single = f"{prompt[: match.start()]}one image{prompt[match.end() :]}"
+        return [f"{single} (variation {i} of {count})" for i in range(1, count + 1)]
+    return [prompt]
+
+
 class ImageAgent(A2AServer):
-    def __init__(self):
+    def __init__(
+        self, cache_size: int = IMAGE_CACHE_SIZE, coalesce: bool = IMAGE_COALESCE
+    ):
         super().__init__()
         # The latest Pro model can generate images
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.client = get_genai_client(os.getenv("GOOGLE_API_KEY"))
+        self.image_store = ImageStore()
+        self.image_cache = (
+            make_cache(
+                IMAGE_CACHE_BACKEND,
+                path=IMAGE_CACHE_PATH,
+                max_entries=cache_size,
+                ttl=IMAGE_CACHE_TTL,
+            )
+            if cache_size > 0
+            else None
+        )
+        self.generations = SingleFlight() if coalesce else None
+        REGISTRY.start_flusher("image_agent")
         print("[ImageAgent] Gemini image model initialized.")
 
     async def handle_message(self, message: Message) -> Message:
         prompt = message.content.text
         print(f"[ImageAgent] Received image prompt: '{prompt}'")
-        
+        metadata = None
+
         try:
-            # Generate the image content
-            response = await self.client.agenerate_content(
-                model='gemini-1.5-pro-latest',
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="image/png"
+            prompts = image_batch(prompt)
+            if len(prompts) > 1:
+                results = sorted(
+                    [result async for result in self._generate_batch(prompts, previews=False)],
+                    key=lambda result: result["index"],
                 )
-            )
-            
-            # The response part is an image; save it to a file
-            image_data = response.parts[0].blob.data
-            image = Image.open(io.BytesIO(image_data))
-            output_path = "generated_image.png"
-            image.save(output_path)
-            response_text = f"Image generated successfully and saved to '{output_path}'"
-            
+                response_text = self._batch_summary(results)
+                image_urls = [r["image_url"] for r in results if "image_url" in r]
+                if image_urls:
+                    metadata = Metadata(
+                        custom_fields={"image_url": image_urls[0], "image_urls": image_urls}
+                    )
+            else:
+                image_url = await self._image_url(prompt)
+                response_text = f"Image generated successfully: {image_url}"
+                metadata = Metadata(custom_fields={"image_url": image_url})
+
         except Exception as e:
             response_text = f"Error generating image: {e}"
         
         print(f"[ImageAgent] Responding with status: '{response_text}'")
-        return Message(content=TextContent(text=response_text), role=MessageRole.AGENT)
\ No newline at end of file
+        return Message(
+            content=TextContent(text=response_text),
+            role=MessageRole.AGENT,
+            metadata=metadata,
+        )
+
+    async def _image_url(self, prompt: str) -> str:
+        """Return the URL of an image for the prompt, generating it only when needed."""
+        key = image_cache_key(prompt)
+        if self.image_cache is not None:
+            cached = self.image_cache.get(key)
+            # The store may have evicted the image since
+            if cached is not None and self.image_store.touch(cached["name"]):
+                IMAGE_REQUESTS.inc(outcome="hit")
+                return cached["url"]
+        if self.generations is None:
+            IMAGE_REQUESTS.inc(outcome="generated")
+            return await self._generate(prompt, key)
+        image_url, shared = await self.generations.do(
+            key, lambda: self._generate(prompt, key)
+        )
+        IMAGE_REQUESTS.inc(outcome="coalesced" if shared else "generated")
+        return image_url
+
+    async def _generate(self, prompt: str, key: str) -> str:
+        """Generate an image, store its bytes as they are and cache its URL."""
+        response = await get_rate_limiter().acall(
+            IMAGE_MODEL,
+            "answer",
+            prompt,
+            lambda: self.client.aio.models.generate_content(
+                model=IMAGE_MODEL, contents=prompt, config=IMAGE_CONFIG
+            ),
+        )
+        # The response part is an image
+        inline_data = response.parts[0].inline_data
+        image = await self.image_store.put(
+            inline_data.data, inline_data.mime_type or "image/png"
+        )
+        if self.image_cache is not None:
+            self.image_cache.set(key, {"name": image.name, "url": image.url})
+        return image.url
+
+    async def _generate_batch(self, prompts: list[str], previews: bool = True):
+        """Generate the images of a batch concurrently, yielding each result as it is ready.
+
+        Results carry the ``index`` and ``prompt`` of the image and either its
+        ``image_url`` (plus with `previews` a ``thumbnail_url``, None if previews
+        are disabled or failed) or an ``error``.
+        """
+        slots = asyncio.Semaphore(IMAGE_BATCH_CONCURRENCY)
+
+        async def generate(index: int, prompt: str) -> dict:
+            result = {"index": index, "prompt": prompt}
+            async with slots:
+                try:
+                    result["image_url"] = await self._image_url(prompt)
+                except Exception as e:
+                    result["error"] = str(e)
+                    return result
+            if previews:
+                result["thumbnail_url"] = await self._thumbnail_url(result["image_url"])
+            return result
+
+        tasks = [
+            asyncio.ensure_future(generate(index, prompt))
+            for index, prompt in enumerate(prompts)
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # The consumer went away (e.g. a closed stream): stop the rest
+            for task in tasks:
+                task.cancel()
+
+    async def _thumbnail_url(self, image_url: str):
+        """Return the URL of a preview of a stored image, or None."""
+        if not IMAGE_THUMBNAIL_SIZE:
+            return None
+        try:
+            thumbnail = await self.image_store.thumbnail(image_url.rsplit("/", 1)[1])
+            return thumbnail.url
+        except Exception as e:
+            print(f"[ImageAgent] Could not encode a preview of {image_url}: {e}")
+            return None
+
+    def _batch_summary(self, results: list[dict]) -> str:
+        generated = sum("image_url" in result for result in results)
+        lines = [
+            f"{result['index'] + 1}. {result.get('image_url') or 'Error: ' + result['error']}"
+            for result in results
+        ]
+        return f"Generated {generated} of {len(results)} images:\n" + "\n".join(lines)
+
+    async def stream_response(self, message: Message):
+        """Stream the generation result as a ``final`` event.
+
+        Batch requests first stream an ``image`` event per image as soon as it
+        is ready, in completion order.
+        """
+        prompt = message.content.text
+        prompts = image_batch(prompt)
+        if len(prompts) > 1:
+            print(f"[ImageAgent] Streaming {len(prompts)} images for: '{prompt}'")
+            results = []
+            async for result in self._generate_batch(prompts):
+                results.append(result)
+                yield stream_event("image", **result)
+            results.sort(key=lambda result: result["index"])
+            yield stream_event(
+                "final",
+                text=self._batch_summary(results),
+                image_urls=[r["image_url"] for r in results if "image_url" in r],
+            )
+            return
+
+        response = await self.handle_message(message)
+        custom_fields = response.metadata.custom_fields if response.metadata else {}
+        yield stream_event(
+            "final", text=response.content.text, image_url=custom_fields.get("image_url")
+        )
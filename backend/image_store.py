@@ -0,0 +1,213 @@
+# image_store.py
+"""
+Content-addressed store of generated images shared by the Image Agent and the API.
+
+Images are written as the raw bytes Gemini returned, named after their SHA-256
+digest and spread over two levels of shard directories
+(``<root>/ab/cd/abcd....png``), so concurrent generations never write to the
+same file and an image generated twice is stored once. Files are written to a
+temporary name and renamed into place off the event loop, so readers never see
+a partial image. The store is bounded by total size and by age; the least
+recently stored or re-used images are evicted first. The FastAPI app serves the
+files under ``IMAGE_BASE_URL``.
+
+Previews of stored images are encoded in a process pool, so resizing never
+holds up the event loop or the GIL of the agent process.
+"""
+
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from agent.metrics import REGISTRY
+
+# Resolved against the backend directory, so the Image Agent replicas and the
+# FastAPI app share the store whatever directory they were started from
+IMAGE_STORE_DIR = os.getenv(
+    "IMAGE_STORE_DIR", str(Path(__file__).resolve().parent / ".cache" / "images")
+)
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(1 << 30)))
+IMAGE_STORE_MAX_AGE = float(os.getenv("IMAGE_STORE_MAX_AGE", str(7 * 86400)))
+# Prefix of the URLs returned for stored images, as served by the FastAPI app
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "/images").rstrip("/")
+
+# Longer side of image previews in px, 0 disables them
+IMAGE_THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256"))
+IMAGE_THUMBNAIL_WORKERS = int(
+    os.getenv("IMAGE_THUMBNAIL_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+# Eviction frees space down to this share of the size limit, so it runs rarely
+_LOW_WATER = 0.9
+# How often stores check for images older than IMAGE_STORE_MAX_AGE (seconds)
+_AGE_CHECK_INTERVAL = 600.0
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/gif": "gif"}
+MEDIA_TYPES = {extension: mime_type for mime_type, extension in EXTENSIONS.items()}
+NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp|gif)$")
+
+STORED = REGISTRY.counter(
+    "image_store_writes_total", "Images stored, by whether the content was new.", ["outcome"]
+)
+EVICTED = REGISTRY.counter("image_store_evictions_total", "Images evicted from the store.")
+STORE_BYTES = REGISTRY.gauge("image_store_bytes", "Total size of the stored images.")
+
+
+def encode_thumbnail(path: str, size: int) -> bytes:
+    """Encode a JPEG preview of the image file at `path`, `size` px on its longer side."""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        # Lets JPEG sources decode at a reduced scale
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+_thumbnail_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_thumbnail_pool() -> ProcessPoolExecutor:
+    """Return the process pool encoding previews, started on first use."""
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        # Spawned workers do not inherit the agent's threads and event loop
+        _thumbnail_pool = ProcessPoolExecutor(
+            IMAGE_THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _thumbnail_pool
+
+
+@dataclass
+class StoredImage:
+    name: str
+    path: Path
+    url: str
+    size: int
+
+
+class ImageStore:
+    """Sharded, content-addressed image directory with size and age limits.
+
+    Args:
+        root: Directory holding the images.
+        max_bytes: Total size above which the oldest images are evicted (0 for no limit).
+        max_age: Seconds after which an unused image is evicted (0 for no limit).
+        base_url: Prefix of the returned image URLs.
+    """
+
+    def __init__(
+        self,
+        root: str = IMAGE_STORE_DIR,
+        max_bytes: int = IMAGE_STORE_MAX_BYTES,
+        max_age: float = IMAGE_STORE_MAX_AGE,
+        base_url: str = IMAGE_BASE_URL,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.base_url = base_url
+        self._lock = threading.Lock()
+        # Total size of the store, counted on first use
+        self._bytes: Optional[int] = None
+        self._age_checked = 0.0
+
+    def path_for(self, name: str) -> Optional[Path]:
+        """Return the file of a stored image name, or None if the name is not one."""
+        if not NAME_PATTERN.match(name):
+            return None
+        return self.root / name[:2] / name[2:4] / name
+
+    def touch(self, name: str) -> bool:
+        """Mark a stored image as recently used; return False if it is not stored."""
+        path = self.path_for(name)
+        try:
+            os.utime(path)
+            return True
+        except (FileNotFoundError, TypeError):
+            return False
+
+    async def put(self, data: bytes, mime_type: str = "image/png") -> StoredImage:
+        """Store image bytes as they are and return where they are served."""
+        return await asyncio.to_thread(self.put_sync, data, mime_type)
+
+    def put_sync(self, data: bytes, mime_type: str = "image/png") -> StoredImage:
+        name = f"{hashlib.sha256(data).hexdigest()}.{EXTENSIONS.get(mime_type, 'png')}"
+        path = self.path_for(name)
+        try:
+            # Already stored: mark it as recently used instead of writing it again
+            os.utime(path)
+            STORED.inc(outcome="duplicate")
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_name(f".{name}.{os.getpid()}.{threading.get_ident()}")
+            temporary.write_bytes(data)
+            os.replace(temporary, path)
+            STORED.inc(outcome="new")
+            self._added(len(data))
+        return StoredImage(name, path, f"{self.base_url}/{name}", len(data))
+
+    async def thumbnail(self, name: str, size: int = IMAGE_THUMBNAIL_SIZE) -> StoredImage:
+        """Store a preview of a stored image and return where it is served."""
+        path = self.path_for(name)
+        if path is None:
+            raise ValueError(f"Not a stored image: {name}")
+        data = await asyncio.get_running_loop().run_in_executor(
+            get_thumbnail_pool(), encode_thumbnail, str(path), size
+        )
+        return await self.put(data, "image/jpeg")
+
+    def _files(self) -> list[tuple[str, os.stat_result]]:
+        """Stat every stored image, as (path, stat) pairs."""
+        files = []
+        for shard in self.root.glob("*/*"):
+            with os.scandir(shard) as entries:
+                for entry in entries:
+                    if NAME_PATTERN.match(entry.name):
+                        try:
+                            files.append((entry.path, entry.stat()))
+                        except FileNotFoundError:
+                            pass
+        return files
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(stat.st_size for _, stat in self._files())
+            else:
+                self._bytes += size
+            now = time.time()
+            over_size = self.max_bytes and self._bytes > self.max_bytes
+            check_age = self.max_age and now - self._age_checked > _AGE_CHECK_INTERVAL
+            if over_size or check_age:
+                self._evict(now)
+            STORE_BYTES.set(self._bytes)
+
+    def _evict(self, now: float) -> None:
+        """Delete expired images, then the least recently used ones over the size limit."""
+        self._age_checked = now
+        files = sorted(self._files(), key=lambda file: file[1].st_mtime)
+        total = sum(stat.st_size for _, stat in files)
+        target = self.max_bytes * _LOW_WATER if self.max_bytes else float("inf")
+        for path, stat in files:
+            expired = self.max_age and now - stat.st_mtime > self.max_age
+            if not expired and total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= stat.st_size
+            EVICTED.inc()
+        self._bytes = total
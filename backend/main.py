@@ -1,24 +1,79 @@
 import asyncio
+import json
 import os
+import sys
+import time
 from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
 
-from python_a2a import A2AClient, Message, TextContent, MessageRole
+import httpx
+from python_a2a import Message, TextContent, MessageRole
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from loguru import logger
 from pydantic import BaseModel
 
+# Add the agents src directory to Python path
+agents_src_path = Path(__file__).parent / "agents" / "src"
+if str(agents_src_path) not in sys.path:
+    sys.path.insert(0, str(agents_src_path))
+
+from admission import AdmissionController, AdmissionRejected
+from image_store import IMAGE_BASE_URL, MEDIA_TYPES, ImageStore
+from agent.instrumentation import start_span
+from agent.metrics import REGISTRY, load_snapshots, render_prometheus
+from streaming import parse_stream_event
+from specialist_pool import SpecialistPool
+from transport import close_http_client
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Seconds a query may take end to end; the deadline is propagated to every hop
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "300"))
+
 
 class Query(BaseModel):
     text: str
+    # Optional seconds the caller is willing to wait, capped at QUERY_TIMEOUT
+    timeout: Optional[float] = None
+    # Optional cap on the Gemini tokens a research run may spend
+    token_budget: Optional[int] = None
+    # Optional id of a research run to resume; returned by earlier calls
+    thread_id: Optional[str] = None
+
+    def deadline(self) -> float:
+        """Absolute UNIX time by which the query must be answered."""
+        timeout = min(self.timeout, QUERY_TIMEOUT) if self.timeout else QUERY_TIMEOUT
+        return time.time() + timeout
+
+    def research_thread_id(self) -> str:
+        """Id keying the research run's checkpoints, new unless the caller resumes one."""
+        return self.thread_id or uuid4().hex
 
 
 # Client to communicate with the manager agent
 manager_client = None
 
+# Per-route concurrency limits and wait queues in front of the manager
+admission = AdmissionController()
+
+# Images written by the Image Agent, served by content hash
+image_store = ImageStore()
+
+
+def rejection(e: AdmissionRejected) -> HTTPException:
+    logger.warning(f"Rejected {e.route} query ({e.status_code}): {e.detail}")
+    return HTTPException(
+        status_code=e.status_code,
+        detail=e.detail,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,14 +92,17 @@ async def lifespan(app: FastAPI):
 
     # Create a client to communicate with the manager agent
     global manager_client
-    manager_client = A2AClient(endpoint_url="http://127.0.0.1:8002")
-    logger.info("Manager client created.")
+    manager_client = SpecialistPool(
+        "manager_agent", hop="main->manager", default=["http://127.0.0.1:8002"]
+    )
+    logger.info(f"Manager client created for {list(manager_client.endpoints)}.")
     logger.info("Note: Make sure agent servers are running (use ./start_agents.sh)")
 
     yield
 
     # Shutdown
     logger.info("Application shutdown...")
+    await close_http_client()
     logger.info(
         "Note: Agent servers are running independently. Use ./stop_agents.sh to stop them."
     )
@@ -63,24 +121,146 @@ async def query(query: Query):
 
     Returns:
         The final response from the agent network.
+
+    Raises:
+        HTTPException: 429 or 503 with ``Retry-After`` when the query's route
+            class is saturated.
     """
     if not manager_client:
         logger.error("Manager client is not available.")
         raise HTTPException(status_code=503, detail="Manager agent is not available.")
 
+    # Time spent waiting for admission counts against the query's deadline
+    deadline = query.deadline()
+    try:
+        async with admission.admit(query.text):
+            return await forward_query(query, deadline)
+    except AdmissionRejected as e:
+        raise rejection(e)
+
+
+async def forward_query(query: Query, deadline: float) -> dict:
+    """Sends an admitted query to the manager agent and returns its response.
+
+    Errors carry the research thread id in an ``X-Thread-Id`` header; sending
+    it back as ``thread_id`` resumes the run from its last checkpoint.
+    """
     logger.info(f"Sending query to manager agent: '{query.text}'")
-    initial_message = Message(
-        content=TextContent(text=query.text), role=MessageRole.USER
-    )
+    thread_id = query.research_thread_id()
+    headers = {"X-Thread-Id": thread_id}
+
+    with start_span("main.query"):
+        initial_message = Message(
+            content=TextContent(text=query.text), role=MessageRole.USER
+        )
+        try:
+            response = await manager_client.send_message(
+                initial_message,
+                deadline=deadline,
+                token_budget=query.token_budget,
+                thread_id=thread_id,
+            )
+            final_response = response.content.text
+            logger.info(f"Final response received: '{final_response}'")
+            result = {"response": final_response, "thread_id": thread_id}
+            custom_fields = response.metadata.custom_fields if response.metadata else {}
+            for field in ("image_url", "image_urls"):
+                if custom_fields.get(field):
+                    result[field] = custom_fields[field]
+            return result
+        except (TimeoutError, httpx.TimeoutException) as e:
+            logger.error(f"The query timed out: {e}")
+            raise HTTPException(
+                status_code=504, detail="The query timed out.", headers=headers
+            )
+        except Exception as e:
+            logger.error(f"An error occurred while processing the query: {e}")
+            raise HTTPException(status_code=500, detail=str(e), headers=headers)
+
+
+@app.post("/query/stream")
+async def query_stream(query: Query):
+    """
+    Forwards a query to the manager agent and streams progress events back as NDJSON.
+
+    Each line is a JSON object with an ``event`` name and a ``data`` payload, e.g.
+    ``routing``, ``queries``, ``web_research``, ``reflection``, ``token`` and ``final``.
+
+    Args:
+        query: The user's query.
+
+    Returns:
+        A streaming response with one JSON event per line.
 
+    Raises:
+        HTTPException: 429 or 503 with ``Retry-After`` when the query's route
+            class is saturated.
+    """
+    if not manager_client:
+        logger.error("Manager client is not available.")
+        raise HTTPException(status_code=503, detail="Manager agent is not available.")
+
+    # Admission is decided before the response starts so rejections get a status code
+    deadline = query.deadline()
     try:
-        response = await manager_client.send_message(initial_message)
-        final_response = response.content.text
-        logger.info(f"Final response received: '{final_response}'")
-        return {"response": final_response}
-    except Exception as e:
-        logger.error(f"An error occurred while processing the query: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        limiter = await admission.acquire(query.text)
+    except AdmissionRejected as e:
+        raise rejection(e)
+    admitted_at = time.monotonic()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            limiter.release(time.monotonic() - admitted_at)
+
+    logger.info(f"Streaming query to manager agent: '{query.text}'")
+    thread_id = query.research_thread_id()
+
+    async def events():
+        with start_span("main.query_stream"):
+            initial_message = Message(
+                content=TextContent(text=query.text), role=MessageRole.USER
+            )
+            try:
+                async for chunk in manager_client.stream_response(
+                    initial_message,
+                    deadline=deadline,
+                    token_budget=query.token_budget,
+                    thread_id=thread_id,
+                ):
+                    yield json.dumps(parse_stream_event(chunk)) + "\n"
+            except Exception as e:
+                logger.error(f"An error occurred while streaming the query: {e}")
+                yield json.dumps({"event": "error", "data": {"detail": str(e)}}) + "\n"
+            finally:
+                release()
+
+    # The background task frees the slot if the stream never started
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"X-Thread-Id": thread_id},
+        background=BackgroundTask(release),
+    )
+
+
+@app.get(IMAGE_BASE_URL + "/{name}")
+async def image(name: str):
+    """
+    Serves a generated image by the name in the URL the Image Agent returned.
+
+    Names are content hashes, so responses may be cached indefinitely.
+    """
+    path = image_store.path_for(name)
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Image not found.")
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[name.rsplit(".", 1)[1]],
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
 
 
 @app.get("/")
@@ -88,6 +268,20 @@ def read_root():
     return {"message": "Gemini Hackathon Agent Server is running."}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Exposes node, LLM and A2A hop metrics in the Prometheus text format.
+
+    Metrics of this process are merged with the snapshots the agent servers
+    periodically write to METRICS_DIR.
+    """
+    snapshots = [REGISTRY.snapshot()] + load_snapshots(exclude_pid=os.getpid())
+    return PlainTextResponse(
+        render_prometheus(snapshots), media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint to verify the FastAPI server is running."""
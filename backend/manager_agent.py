@@ -1,13 +1,71 @@
 # manager_agent.py
 import os
 import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
-from python_a2a import A2AServer, A2AClient, Message, TextContent, MessageRole
+from python_a2a import A2AServer, Message, Metadata, TextContent, MessageRole
+
+# Add the agents src directory to Python path
+agents_src_path = Path(__file__).parent / "agents" / "src"
+if str(agents_src_path) not in sys.path:
+    sys.path.insert(0, str(agents_src_path))
+
+from agent.cache import make_cache, normalize_text
+from agent.clients import get_genai_client
+from agent.instrumentation import start_span, trace_carrier
+from agent.metrics import REGISTRY
+from agent.rate_limit import get_rate_limiter
+from routing import LocalRouter
+from streaming import parse_stream_event, stream_event
+from specialist_pool import SpecialistPool
+from transport import message_deadline, message_thread_id, message_token_budget
 
 load_dotenv()
 
+# Routing decisions of the LLM router are cached by normalized query text. The
+# sqlite backend lets several manager replicas share one cache file, resolved
+# against the backend directory whatever directory they were started from.
+ROUTING_CACHE_BACKEND = os.getenv("ROUTING_CACHE_BACKEND", "memory")
+ROUTING_CACHE_PATH = os.getenv(
+    "ROUTING_CACHE_PATH", str(Path(__file__).resolve().parent / ".cache" / "routing.sqlite")
+)
+ROUTING_CACHE_SIZE = int(os.getenv("ROUTING_CACHE_SIZE", "4096"))
+ROUTING_CACHE_TTL = float(os.getenv("ROUTING_CACHE_TTL", "3600"))
+
+# Speculative dispatch while the LLM router decides: "off", "prior" (only when the
+# local keyword scores favour an agent by SPECULATION_MIN_MARGIN) or "always".
+# Ties go to the agent the LLM router picked most often so far. Speculative calls
+# always use the specialist's streaming endpoint: cancelling one closes its
+# connection, which stops the specialist's work instead of only the wait for it.
+MANAGER_SPECULATION = os.getenv("MANAGER_SPECULATION", "off").lower()
+SPECULATION_MIN_MARGIN = float(os.getenv("SPECULATION_MIN_MARGIN", "1.0"))
+# Specialists cheap or likely enough to be started before routing is confirmed
+SPECULATION_AGENTS = [
+    name.strip()
+    for name in os.getenv("SPECULATION_AGENTS", "greeting_agent").split(",")
+    if name.strip()
+]
+
+SPECULATIONS = REGISTRY.counter(
+    "routing_speculation_total",
+    "Specialist calls started before the LLM routing decision, by whether routing confirmed them.",
+    ["agent", "outcome"],
+)
+SPECULATION_WASTED_SECONDS = REGISTRY.histogram(
+    "routing_speculation_wasted_seconds",
+    "Seconds speculative specialist calls ran before a routing miss cancelled them.",
+    ["agent"],
+)
+
+_END = object()
+
 ROUTING_PROMPT_TEMPLATE = """
 You are an intelligent routing agent. Your job is to analyze a user's request and choose the correct specialist agent to handle it. You must respond with only the agent's name.
 
@@ -34,46 +92,283 @@ Chosen Agent:
 
 
 class ManagerAgent(A2AServer):
-    def __init__(self):
+    def __init__(
+        self,
+        speculation: str = MANAGER_SPECULATION,
+        speculation_agents: list[str] = SPECULATION_AGENTS,
+    ):
         super().__init__()
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.client = get_genai_client(os.getenv("GOOGLE_API_KEY"))
         self.specialists = {
-            "greeting_agent": A2AClient(endpoint_url="http://127.0.0.1:8001"),
-            "image_agent": A2AClient(endpoint_url="http://127.0.0.1:8003"),
+            "greeting_agent": SpecialistPool(
+                "greeting_agent",
+                hop="manager->greeting_agent",
+                default=["http://127.0.0.1:8001"],
+            ),
+            "image_agent": SpecialistPool(
+                "image_agent",
+                hop="manager->image_agent",
+                default=["http://127.0.0.1:8003"],
+            ),
         }
+        # Obvious queries are routed locally, only ambiguous ones cost an LLM call
+        self.local_router = LocalRouter()
+        self.routing_cache = make_cache(
+            ROUTING_CACHE_BACKEND,
+            path=ROUTING_CACHE_PATH,
+            max_entries=ROUTING_CACHE_SIZE,
+            ttl=ROUTING_CACHE_TTL,
+        )
+        self.speculation = speculation
+        self.speculation_agents = set(speculation_agents)
+        # LLM routing decisions so far, the prior for queries the keywords can't tell apart
+        self.llm_decisions = Counter()
+        REGISTRY.start_flusher("manager_agent")
         print("[ManagerAgent] Router initialized with research-capable greeting agent.")
 
+    def _fast_route(self, user_query: str) -> Optional[str]:
+        """Return the local or cached routing decision, or None when the LLM must decide."""
+        chosen_agent_name = self.local_router.classify(user_query)
+        if chosen_agent_name is not None:
+            print(
+                f"[ManagerAgent] Local routing decision: Call '{chosen_agent_name}' "
+                f"(short-circuit ratio {self.local_router.short_circuit_ratio:.0%})"
+            )
+            return chosen_agent_name
+
+        chosen_agent_name = self.routing_cache.get(normalize_text(user_query))
+        if chosen_agent_name is not None:
+            print(
+                f"[ManagerAgent] Cached routing decision: Call '{chosen_agent_name}' "
+                f"(cache stats {self.routing_cache.stats()})"
+            )
+        return chosen_agent_name
+
+    async def _cached_llm_route(self, user_query: str) -> str:
+        chosen_agent_name = await self._llm_route(user_query)
+        # Only cache valid decisions so a bad LLM answer is retried next time
+        if chosen_agent_name in self.specialists:
+            self.routing_cache.set(normalize_text(user_query), chosen_agent_name)
+            self.llm_decisions[chosen_agent_name] += 1
+        return chosen_agent_name
+
+    def _speculation_target(self, user_query: str) -> Optional[str]:
+        """Return the specialist to start before the LLM routes a query, if any."""
+        if self.speculation not in ("prior", "always"):
+            return None
+        scores = self.local_router.score(user_query)
+        # Stable sort: with no routing history yet, ties keep the specialists' order
+        ranked = sorted(
+            scores, key=lambda name: (scores[name], self.llm_decisions[name]), reverse=True
+        )
+        best, runner_up = ranked[0], ranked[1]
+        if self.speculation == "prior" and scores[best] - scores[runner_up] < SPECULATION_MIN_MARGIN:
+            return None
+        return best if best in self.speculation_agents else None
+
+    async def _route_speculatively(
+        self, user_query: str, start: Callable[[str], Awaitable]
+    ) -> tuple[str, Optional[asyncio.Future]]:
+        """Route a query, starting the likely specialist's work while the LLM decides.
+
+        Args:
+            user_query: The query to route.
+            start: Returns the specialist work for an agent name, as an awaitable.
+
+        Returns:
+            The chosen agent name and, when speculation picked the same agent, the
+            running speculative work. Speculative work for any other agent is cancelled.
+        """
+        chosen_agent_name = self._fast_route(user_query)
+        if chosen_agent_name is not None:
+            return chosen_agent_name, None
+        target = self._speculation_target(user_query)
+        if target is None:
+            return await self._cached_llm_route(user_query), None
+
+        print(f"[ManagerAgent] Speculatively calling '{target}' while routing")
+        started = time.monotonic()
+        speculative = asyncio.ensure_future(start(target))
+        finished = []
+        # Also marks a failure as retrieved, so a discarded call doesn't log it
+        speculative.add_done_callback(
+            lambda future: finished.append(time.monotonic())
+            or future.cancelled()
+            or future.exception()
+        )
+        try:
+            chosen_agent_name = await self._cached_llm_route(user_query)
+        except BaseException:
+            self._discard(speculative, target, started, finished)
+            raise
+        if chosen_agent_name == target:
+            SPECULATIONS.inc(agent=target, outcome="hit")
+            return chosen_agent_name, speculative
+        print(f"[ManagerAgent] Speculation missed, cancelling '{target}'")
+        self._discard(speculative, target, started, finished)
+        return chosen_agent_name, None
+
+    def _discard(
+        self, speculative: asyncio.Future, target: str, started: float, finished: list
+    ) -> None:
+        """Cancel speculative work routing did not confirm and record what it cost."""
+        speculative.cancel()
+        SPECULATIONS.inc(agent=target, outcome="miss")
+        wasted = (finished[0] if finished else time.monotonic()) - started
+        SPECULATION_WASTED_SECONDS.observe(wasted, agent=target)
+
+    async def _llm_route(self, user_query: str) -> str:
+        """Use Gemini to choose the specialist agent for a query."""
+        prompt = ROUTING_PROMPT_TEMPLATE.format(query=user_query)
+        response = await get_rate_limiter().acall(
+            "gemini-1.5-flash-latest",
+            "routing",
+            prompt,
+            lambda: self.client.aio.models.generate_content(
+                model="gemini-1.5-flash-latest", contents=prompt
+            ),
+        )
+        chosen_agent_name = (
+            response.text.strip().lower().replace("'", "").replace('"', "")
+        )
+        print(f"[ManagerAgent] Routing decision: Call '{chosen_agent_name}'")
+        return chosen_agent_name
+
+    async def _final_response(self, chunks) -> Message:
+        """Drain a specialist's stream into the response its ``final`` event carries."""
+        final = None
+        async for chunk in chunks:
+            event = parse_stream_event(chunk)
+            if event["event"] == "final":
+                final = event["data"]
+        if final is None:
+            raise RuntimeError("the specialist's stream ended without a final event")
+        # The same fields the specialist attaches to a non-streamed response
+        custom_fields = {k: v for k, v in final.items() if k != "text" and v}
+        if custom_fields.get("image_urls"):
+            custom_fields.setdefault("image_url", custom_fields["image_urls"][0])
+        return Message(
+            content=TextContent(text=final.get("text", "")),
+            role=MessageRole.AGENT,
+            metadata=Metadata(custom_fields=custom_fields) if custom_fields else None,
+        )
+
+    def _routing_error(self, chosen_agent_name: str) -> str:
+        return f"Routing error: Could not find a specialist named '{chosen_agent_name}'. Available agents: {', '.join(self.specialists.keys())}"
+
     async def handle_message(self, message: Message) -> Message:
         user_query = message.content.text
         print(f"\n[ManagerAgent] Received query: '{user_query}'")
 
-        try:
-            # 1. Use Gemini to make a routing decision
-            prompt = ROUTING_PROMPT_TEMPLATE.format(query=user_query)
-            response = await self.client.agenerate_content(
-                model="gemini-1.5-flash-latest", contents=prompt
-            )
-            chosen_agent_name = (
-                response.text.strip().lower().replace("'", "").replace('"', "")
+        message_to_specialist = Message(
+            content=TextContent(text=user_query), role=MessageRole.USER
+        )
+
+        def delegate(agent_name: str):
+            return self.specialists[agent_name].send_message(
+                message_to_specialist,
+                deadline=message_deadline(message),
+                token_budget=message_token_budget(message),
+                thread_id=message_thread_id(message),
             )
 
-            print(f"[ManagerAgent] Routing decision: Call '{chosen_agent_name}'")
+        def speculate(agent_name: str):
+            return self._final_response(
+                self.specialists[agent_name].stream_response(
+                    message_to_specialist,
+                    deadline=message_deadline(message),
+                    token_budget=message_token_budget(message),
+                    thread_id=message_thread_id(message),
+                )
+            )
 
-            # 2. Delegate the task to the chosen specialist
-            if chosen_agent_name in self.specialists:
-                specialist_client = self.specialists[chosen_agent_name]
-                message_to_specialist = Message(
-                    content=TextContent(text=user_query), role=MessageRole.USER
+        response_metadata = None
+        with start_span("manager.handle_message", carrier=trace_carrier(message)):
+            try:
+                # 1. Make a routing decision, possibly with the likely specialist already working
+                chosen_agent_name, speculative = await self._route_speculatively(
+                    user_query, speculate
                 )
 
-                final_response = await specialist_client.send_message(
-                    message_to_specialist
+                # 2. Delegate the task to the chosen specialist
+                if chosen_agent_name in self.specialists:
+                    if speculative is None:
+                        speculative = delegate(chosen_agent_name)
+                    final_response = await speculative
+                    response_text = final_response.content.text
+                    # Pass on what the specialist attached, e.g. a generated image's URL
+                    response_metadata = final_response.metadata
+                else:
+                    response_text = self._routing_error(chosen_agent_name)
+
+            except Exception as e:
+                response_text = f"An error occurred in the ManagerAgent: {e}"
+
+        return Message(
+            content=TextContent(text=response_text),
+            role=MessageRole.AGENT,
+            metadata=response_metadata,
+        )
+
+    async def stream_response(self, message: Message):
+        """Stream the routing decision, then forward the specialist's progress events."""
+        user_query = message.content.text
+        print(f"\n[ManagerAgent] Received streaming query: '{user_query}'")
+
+        message_to_specialist = Message(
+            content=TextContent(text=user_query), role=MessageRole.USER
+        )
+
+        def specialist_stream(agent_name: str):
+            return self.specialists[agent_name].stream_response(
+                message_to_specialist,
+                deadline=message_deadline(message),
+                token_budget=message_token_budget(message),
+                thread_id=message_thread_id(message),
+            )
+
+        # Speculative streams are buffered until routing confirms them; cancelling
+        # one closes its connection, which stops the specialist's work as well
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        async def buffer(agent_name: str):
+            try:
+                async for chunk in specialist_stream(agent_name):
+                    chunks.put_nowait(chunk)
+            except Exception as e:
+                chunks.put_nowait(e)
+            finally:
+                chunks.put_nowait(_END)
+
+        async def buffered():
+            while (chunk := await chunks.get()) is not _END:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+
+        speculative = None
+        with start_span("manager.stream_response", carrier=trace_carrier(message)):
+            try:
+                chosen_agent_name, speculative = await self._route_speculatively(
+                    user_query, buffer
                 )
-                response_text = final_response.content.text
-            else:
-                response_text = f"Routing error: Could not find a specialist named '{chosen_agent_name}'. Available agents: {', '.join(self.specialists.keys())}"
+                if chosen_agent_name not in self.specialists:
+                    yield stream_event(
+                        "final", text=self._routing_error(chosen_agent_name)
+                    )
+                    return
 
-        except Exception as e:
-            response_text = f"An error occurred in the ManagerAgent: {e}"
+                yield stream_event("routing", agent=chosen_agent_name)
+                stream = buffered() if speculative else specialist_stream(chosen_agent_name)
+                async for chunk in stream:
+                    # Specialists that don't stream return plain text, normalize it
+                    yield json.dumps(parse_stream_event(chunk))
 
-        return Message(content=TextContent(text=response_text), role=MessageRole.AGENT)
+            except Exception as e:
+                yield stream_event(
+                    "final", text=f"An error occurred in the ManagerAgent: {e}"
+                )
+            finally:
+                # The caller went away before the speculative stream was drained
+                if speculative is not None:
+                    speculative.cancel()
@@ -0,0 +1,125 @@
+# routing.py
+"""
+Fast local routing tier for the ManagerAgent.
+
+A small weighted keyword/regex model scores each query for the text/research
+specialist and the image specialist. Confident decisions are made locally in
+microseconds; only ambiguous queries fall back to the LLM routing prompt.
+"""
+
+import os
+import re
+import threading
+from typing import Optional
+
+# (pattern, weight) pairs. A query's score for an agent is the sum of the weights
+# of the patterns it matches.
+IMAGE_PATTERNS = [
+    (r"^\s*(please\s+)?(can you\s+)?(draw|paint|sketch|illustrate|render)\b", 3.0),
+    (
+        r"\b(generate|create|make|design|produce|give me)\b.{0,40}\b(image|picture|photo|drawing|illustration|logo|icon|artwork|painting|sketch|wallpaper|poster|visual|graphic|avatar)s?\b",
+        3.0,
+    ),
+    (r"\b(image|picture|photo|drawing|illustration|painting|sketch)s?\s+of\b", 1.5),
+    (r"\b(draw|paint|sketch|illustrate)\b", 1.5),
+    (r"\b(logo|artwork|wallpaper|poster|avatar)\b", 1.0),
+]
+
+TEXT_PATTERNS = [
+    (
+        r"^\s*(who|what|when|where|why|how|which|is|are|was|were|does|do|did|can|could|should)\b",
+        2.0,
+    ),
+    (r"\?\s*$", 1.0),
+    (
+        r"\b(latest|news|current|recent|today|winner|won|win|champion|score|results?|statistics|stats|price|explain|compare|research|tell me about|look up|find out|summari[sz]e)\b",
+        2.0,
+    ),
+    (
+        r"\b(write|draft|compose|translate)\b.{0,40}\b(email|message|letter|poem|story|essay|note|summary|post|reply|speech|toast|text)\b",
+        3.0,
+    ),
+    (r"\b(hello|hi|hey|thanks|thank you|good morning)\b", 1.0),
+]
+
+AGENT_PATTERNS = {
+    "greeting_agent": TEXT_PATTERNS,
+    "image_agent": IMAGE_PATTERNS,
+}
+
+# Queries containing any of these go to the research graph in the GreetingAgent
+RESEARCH_KEYWORDS = [
+    "who",
+    "what",
+    "when",
+    "where",
+    "why",
+    "how",
+    "latest",
+    "recent",
+    "current",
+    "news",
+    "update",
+    "winner",
+    "champion",
+    "result",
+    "score",
+    "data",
+    "statistics",
+    "facts",
+    "information",
+    "research",
+    "find",
+    "search",
+    "look up",
+    "tell me about",
+    "explain",
+    "compare",
+    "list",
+    "top",
+    "best",
+]
+
+# Minimum score margin between the best and the runner-up agent for a local decision
+LOCAL_ROUTER_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "2.0"))
+
+
+class LocalRouter:
+    """Scores queries against compiled per-agent patterns and decides the confident cases."""
+
+    def __init__(self, threshold: float = LOCAL_ROUTER_THRESHOLD):
+        self.threshold = threshold
+        self.patterns = {
+            agent: [(re.compile(p, re.IGNORECASE), w) for p, w in patterns]
+            for agent, patterns in AGENT_PATTERNS.items()
+        }
+        self._lock = threading.Lock()
+        self.stats = {"local": 0, "fallback": 0}
+
+    def score(self, query: str) -> dict[str, float]:
+        """Return the score of every agent for a query."""
+        return {
+            agent: sum(w for pattern, w in patterns if pattern.search(query))
+            for agent, patterns in self.patterns.items()
+        }
+
+    def classify(self, query: str) -> Optional[str]:
+        """Return the chosen agent name, or None when the query needs the LLM router."""
+        scores = sorted(self.score(query).items(), key=lambda item: -item[1])
+        (best, best_score), (_, runner_up) = scores[0], scores[1]
+        decided = best_score - runner_up >= self.threshold
+        with self._lock:
+            self.stats["local" if decided else "fallback"] += 1
+        return best if decided else None
+
+    @property
+    def short_circuit_ratio(self) -> float:
+        """Fraction of classified queries that were decided without the LLM."""
+        total = self.stats["local"] + self.stats["fallback"]
+        return self.stats["local"] / total if total else 0.0
+
+
+def is_research_query(query: str) -> bool:
+    """Determine if a text query requires research capabilities."""
+    query_lower = query.lower()
+    return any(keyword in query_lower for keyword in RESEARCH_KEYWORDS)
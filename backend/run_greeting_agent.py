@@ -3,18 +3,23 @@
 Standalone script to run the Greeting Agent server.
 """
 
-import asyncio
-from python_a2a import run_server
+import argparse
+
+from agent_server import run_agent_server
 from greeting_agent import GreetingAgent
 from loguru import logger
 
 
-async def main():
+def main():
     """Start the Greeting Agent server."""
-    logger.info("Starting Greeting Agent server on port 8001...")
+    parser = argparse.ArgumentParser(description="Run the Greeting Agent server.")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    logger.info(f"Starting Greeting Agent server on port {args.port}...")
     agent = GreetingAgent()
-    await run_server(agent, host="127.0.0.1", port=8001)
+    run_agent_server(agent, host="127.0.0.1", port=args.port)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
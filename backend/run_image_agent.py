@@ -3,18 +3,23 @@
 Standalone script to run the Image Agent server.
 """
 
-import asyncio
-from python_a2a import run_server
+import argparse
+
+from agent_server import run_agent_server
 from image_agent import ImageAgent
 from loguru import logger
 
 
-async def main():
+def main():
     """Start the Image Agent server."""
-    logger.info("Starting Image Agent server on port 8003...")
+    parser = argparse.ArgumentParser(description="Run the Image Agent server.")
+    parser.add_argument("--port", type=int, default=8003)
+    args = parser.parse_args()
+
+    logger.info(f"Starting Image Agent server on port {args.port}...")
     agent = ImageAgent()
-    await run_server(agent, host="127.0.0.1", port=8003)
+    run_agent_server(agent, host="127.0.0.1", port=args.port)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
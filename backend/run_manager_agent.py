@@ -3,18 +3,23 @@
 Standalone script to run the Manager Agent server.
 """
 
-import asyncio
-from python_a2a import run_server
+import argparse
+
+from agent_server import run_agent_server
 from manager_agent import ManagerAgent
 from loguru import logger
 
 
-async def main():
+def main():
     """Start the Manager Agent server."""
-    logger.info("Starting Manager Agent server on port 8002...")
+    parser = argparse.ArgumentParser(description="Run the Manager Agent server.")
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args()
+
+    logger.info(f"Starting Manager Agent server on port {args.port}...")
     agent = ManagerAgent()
-    await run_server(agent, host="127.0.0.1", port=8002)
+    run_agent_server(agent, host="127.0.0.1", port=args.port)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,288 @@
+# specialist_pool.py
+"""
+Load-balanced pools of agent replicas.
+
+A `SpecialistPool` maps one agent name (``greeting_agent``, ``image_agent``,
+``manager_agent``) to every replica serving it and spreads calls over them:
+
+- Selection is power-of-two-choices on outstanding requests by default (two
+  random healthy replicas, pick the less loaded), or least-outstanding-requests
+  over all replicas with ``LB_POLICY=least_outstanding``.
+- A background task polls every replica's ``/a2a/health`` and only healthy
+  replicas are picked.
+- Outlier ejection: a replica that fails OUTLIER_CONSECUTIVE_FAILURES calls in a
+  row is ejected for OUTLIER_EJECTION_SECONDS (doubling on every repeat
+  ejection), but never more than OUTLIER_MAX_EJECTION_PERCENT of the pool.
+- Membership comes from the registry file written by ``start_agents.sh``
+  (AGENT_REGISTRY_PATH) or else the ``endpoint`` of ``<name>_card.json``, and is
+  reloaded whenever the registry file changes.
+
+Calls that fail to connect are retried on another replica; calls that reached a
+replica are not, since the agent may already have done (and paid for) the work.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import httpx
+from python_a2a import Message
+
+from agent.metrics import REGISTRY
+from transport import AgentClient, get_http_client
+
+AGENT_REGISTRY_PATH = os.getenv("AGENT_REGISTRY_PATH", "/tmp/agent_registry.json")
+LB_POLICY = os.getenv("LB_POLICY", "p2c")
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+OUTLIER_CONSECUTIVE_FAILURES = int(os.getenv("OUTLIER_CONSECUTIVE_FAILURES", "3"))
+OUTLIER_EJECTION_SECONDS = float(os.getenv("OUTLIER_EJECTION_SECONDS", "30"))
+OUTLIER_MAX_EJECTION_PERCENT = float(os.getenv("OUTLIER_MAX_EJECTION_PERCENT", "50"))
+
+CARDS_DIR = Path(__file__).parent
+
+OUTSTANDING = REGISTRY.gauge(
+    "a2a_endpoint_outstanding_requests",
+    "In-flight A2A calls per agent replica.",
+    ["pool", "endpoint"],
+)
+EJECTIONS = REGISTRY.counter(
+    "a2a_endpoint_ejections_total",
+    "Outlier ejections of agent replicas.",
+    ["pool", "endpoint"],
+)
+HEALTHY = REGISTRY.gauge(
+    "a2a_endpoint_healthy",
+    "1 if the agent replica passes health checks.",
+    ["pool", "endpoint"],
+)
+
+
+def load_endpoints(name: str, default: Optional[list[str]] = None) -> list[str]:
+    """Resolve the replicas of an agent from the registry file or its agent card.
+
+    Args:
+        name: Agent name, e.g. ``greeting_agent``.
+        default: Endpoints used when neither the registry nor a card lists any.
+    """
+    try:
+        registry = json.loads(Path(AGENT_REGISTRY_PATH).read_text())
+        if registry.get(name):
+            return list(registry[name])
+    except (OSError, ValueError):
+        pass
+    try:
+        card = json.loads((CARDS_DIR / f"{name}_card.json").read_text())
+        if card.get("endpoint"):
+            return [card["endpoint"]]
+    except (OSError, ValueError):
+        pass
+    return list(default or [])
+
+
+class Endpoint:
+    """One replica of an agent and its load/health bookkeeping."""
+
+    def __init__(self, pool: str, url: str, hop: str):
+        self.url = url
+        self.pool = pool
+        self.client = AgentClient(url, hop=hop)
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and time.monotonic() >= self.ejected_until
+
+    def acquire(self) -> None:
+        self.outstanding += 1
+        OUTSTANDING.inc(pool=self.pool, endpoint=self.url)
+
+    def release(self) -> None:
+        self.outstanding -= 1
+        OUTSTANDING.inc(-1, pool=self.pool, endpoint=self.url)
+
+
+class SpecialistPool:
+    """Spreads A2A calls for one agent name over its replicas.
+
+    Has the same `send_message` / `stream_response` interface as `AgentClient`.
+
+    Args:
+        name: Agent name used to look up the replicas.
+        hop: Name of the hop in the A2A latency metrics.
+        default: Endpoints used when the registry and agent card list none.
+        policy: ``p2c`` or ``least_outstanding``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        hop: str,
+        default: Optional[list[str]] = None,
+        policy: str = LB_POLICY,
+    ):
+        self.name = name
+        self.hop = hop
+        self.default = default
+        self.policy = policy
+        self.endpoints: dict[str, Endpoint] = {}
+        self._registry_mtime: Optional[float] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Reload membership, keeping the state of replicas that stay."""
+        try:
+            mtime = os.stat(AGENT_REGISTRY_PATH).st_mtime
+        except OSError:
+            mtime = None
+        if self.endpoints and mtime == self._registry_mtime:
+            return
+        self._registry_mtime = mtime
+        urls = load_endpoints(self.name, self.default)
+        self.endpoints = {
+            url: self.endpoints.get(url) or Endpoint(self.name, url, self.hop)
+            for url in urls
+        }
+        print(f"[SpecialistPool] {self.name}: {', '.join(urls) or 'no endpoints'}")
+
+    def _ensure_health_checks(self) -> None:
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.get_running_loop().create_task(
+                self._health_loop()
+            )
+
+    async def _health_loop(self) -> None:
+        while True:
+            self.refresh()
+            await asyncio.gather(
+                *(self._check(endpoint) for endpoint in list(self.endpoints.values()))
+            )
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    async def _check(self, endpoint: Endpoint) -> None:
+        try:
+            response = await get_http_client().get(
+                f"{endpoint.url}/a2a/health", timeout=HEALTH_CHECK_INTERVAL
+            )
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy != endpoint.healthy:
+            print(
+                f"[SpecialistPool] {self.name} replica {endpoint.url} is "
+                f"{'healthy' if healthy else 'unhealthy'}"
+            )
+        endpoint.healthy = healthy
+        HEALTHY.set(int(healthy), pool=self.name, endpoint=endpoint.url)
+
+    def pick(self, exclude: tuple = ()) -> Endpoint:
+        """Choose the replica for the next call."""
+        candidates = [
+            e for e in self.endpoints.values() if e.available and e.url not in exclude
+        ]
+        if not candidates:
+            # Everything is ejected or failing health checks; try the rest
+            # rather than failing outright
+            candidates = [e for e in self.endpoints.values() if e.url not in exclude]
+        if not candidates:
+            raise ConnectionError(f"No reachable replicas for '{self.name}'")
+        if self.policy == "least_outstanding" or len(candidates) <= 2:
+            return min(candidates, key=lambda e: (e.outstanding, random.random()))
+        first, second = random.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+    def _record(self, endpoint: Endpoint, ok: bool) -> None:
+        if ok:
+            endpoint.consecutive_failures = 0
+            endpoint.ejections = max(0, endpoint.ejections - 1)
+            return
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures < OUTLIER_CONSECUTIVE_FAILURES:
+            return
+        ejected = sum(
+            time.monotonic() < e.ejected_until for e in self.endpoints.values()
+        )
+        if (ejected + 1) * 100 > OUTLIER_MAX_EJECTION_PERCENT * len(self.endpoints):
+            return
+        endpoint.ejections += 1
+        endpoint.consecutive_failures = 0
+        duration = OUTLIER_EJECTION_SECONDS * 2 ** (endpoint.ejections - 1)
+        endpoint.ejected_until = time.monotonic() + duration
+        EJECTIONS.inc(pool=self.name, endpoint=endpoint.url)
+        print(
+            f"[SpecialistPool] Ejected {self.name} replica {endpoint.url} "
+            f"for {duration:.0f}s"
+        )
+
+    async def send_message(
+        self,
+        message: Message,
+        deadline: Optional[float] = None,
+        token_budget: Optional[int] = None,
+        thread_id: Optional[str] = None,
+    ) -> Message:
+        """Send a message to the least loaded healthy replica."""
+        self._ensure_health_checks()
+        tried: tuple = ()
+        while True:
+            endpoint = self.pick(exclude=tried)
+            endpoint.acquire()
+            try:
+                response = await endpoint.client.send_message(
+                    message, deadline, token_budget, thread_id
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                self._record(endpoint, ok=False)
+                tried += (endpoint.url,)
+                if len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            except Exception:
+                self._record(endpoint, ok=False)
+                raise
+            finally:
+                endpoint.release()
+            self._record(endpoint, ok=True)
+            return response
+
+    async def stream_response(
+        self,
+        message: Message,
+        deadline: Optional[float] = None,
+        token_budget: Optional[int] = None,
+        thread_id: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Stream a response from the least loaded healthy replica."""
+        self._ensure_health_checks()
+        tried: tuple = ()
+        while True:
+            endpoint = self.pick(exclude=tried)
+            endpoint.acquire()
+            started = False
+            try:
+                async for chunk in endpoint.client.stream_response(
+                    message, deadline, token_budget, thread_id
+                ):
+                    started = True
+                    yield chunk
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                self._record(endpoint, ok=False)
+                tried += (endpoint.url,)
+                if started or len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            except Exception:
+                self._record(endpoint, ok=False)
+                raise
+            finally:
+                endpoint.release()
+            self._record(endpoint, ok=True)
+            return
@@ -1,9 +1,20 @@
 #!/bin/bash
 
 # start_agents.sh - Script to start all three agent servers
+#
+# Run several replicas of an agent with GREETING_REPLICAS, IMAGE_REPLICAS and
+# MANAGER_REPLICAS (default 1). Replica i listens on the agent's base port + 10*i
+# (greeting 8001, 8011, ...). The endpoints are written to the registry file
+# ($AGENT_REGISTRY_PATH, default /tmp/agent_registry.json) that the manager and
+# the FastAPI app load-balance over.
 
 set -e  # Exit on any error
 
+GREETING_REPLICAS=${GREETING_REPLICAS:-1}
+IMAGE_REPLICAS=${IMAGE_REPLICAS:-1}
+MANAGER_REPLICAS=${MANAGER_REPLICAS:-1}
+AGENT_REGISTRY_PATH=${AGENT_REGISTRY_PATH:-/tmp/agent_registry.json}
+
 echo "Starting agent servers..."
 
 # Function to check if a port is available
@@ -29,7 +40,7 @@ start_agent() {
     fi
     
     # Start the agent server in the background
-    python $script_file &
+    python $script_file --port $port &
     
     # Store the PID
     local pid=$!
@@ -37,13 +48,38 @@ start_agent() {
     echo $pid >> /tmp/agent_pids.txt
 }
 
+# Start `replicas` copies of an agent and print their endpoints as a JSON list
+start_replicas() {
+    local agent_name=$1
+    local base_port=$2
+    local script_file=$3
+    local replicas=$4
+    local endpoints=""
+
+    for ((i = 0; i < replicas; i++)); do
+        local port=$((base_port + 10 * i))
+        start_agent "$agent_name" $port "$script_file" >&2 || true
+        endpoints="$endpoints${endpoints:+, }\"http://127.0.0.1:$port\""
+    done
+    echo "[$endpoints]"
+}
+
 # Clean up any existing PID file
 rm -f /tmp/agent_pids.txt
 
 # Start all three agents
-start_agent "GreetingAgent" 8001 "run_greeting_agent.py"
-start_agent "ImageAgent" 8003 "run_image_agent.py" 
-start_agent "ManagerAgent" 8002 "run_manager_agent.py"
+greeting_endpoints=$(start_replicas "GreetingAgent" 8001 "run_greeting_agent.py" $GREETING_REPLICAS)
+image_endpoints=$(start_replicas "ImageAgent" 8003 "run_image_agent.py" $IMAGE_REPLICAS)
+manager_endpoints=$(start_replicas "ManagerAgent" 8002 "run_manager_agent.py" $MANAGER_REPLICAS)
+
+# Publish the replicas; running managers and the FastAPI app pick up changes
+cat > "$AGENT_REGISTRY_PATH" <<EOF_REGISTRY
+{
+    "greeting_agent": $greeting_endpoints,
+    "image_agent": $image_endpoints,
+    "manager_agent": $manager_endpoints
+}
+EOF_REGISTRY
 
 # Wait a moment for servers to start up
 sleep 3
@@ -51,9 +87,9 @@ sleep 3
 echo "All agent servers have been started!"
 echo "PIDs stored in /tmp/agent_pids.txt"
 echo ""
-echo "Agent endpoints:"
-echo "  - Greeting Agent: http://127.0.0.1:8001"
-echo "  - Image Agent: http://127.0.0.1:8003"
-echo "  - Manager Agent: http://127.0.0.1:8002"
+echo "Agent endpoints (registry: $AGENT_REGISTRY_PATH):"
+echo "  - Greeting Agent: $greeting_endpoints"
+echo "  - Image Agent: $image_endpoints"
+echo "  - Manager Agent: $manager_endpoints"
 echo ""
 echo "To stop all agents, run: ./stop_agents.sh" 
\ No newline at end of file
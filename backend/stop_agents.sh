@@ -2,14 +2,28 @@
 
 # stop_agents.sh - Script to stop all running agent servers
 
+AGENT_REGISTRY_PATH=${AGENT_REGISTRY_PATH:-/tmp/agent_registry.json}
+
 echo "Stopping agent servers..."
 
+# Ports of every replica: those published in the registry by start_agents.sh,
+# plus base port + 10*i for the replica counts in the environment (default 1)
+agent_ports() {
+    if [ -f "$AGENT_REGISTRY_PATH" ]; then
+        grep -o '127\.0\.0\.1:[0-9]*' "$AGENT_REGISTRY_PATH" | cut -d: -f2
+    fi
+    for ((i = 0; i < ${GREETING_REPLICAS:-1}; i++)); do echo $((8001 + 10 * i)); done
+    for ((i = 0; i < ${MANAGER_REPLICAS:-1}; i++)); do echo $((8002 + 10 * i)); done
+    for ((i = 0; i < ${IMAGE_REPLICAS:-1}; i++)); do echo $((8003 + 10 * i)); done
+}
+PORTS=$(agent_ports | sort -un)
+
 # Check if PID file exists
 if [ ! -f /tmp/agent_pids.txt ]; then
     echo "No PID file found. Attempting to kill processes by port..."
     
     # Try to kill processes by port
-    for port in 8001 8002 8003; do
+    for port in $PORTS; do
         pid=$(lsof -ti:$port)
         if [ ! -z "$pid" ]; then
             echo "Killing process on port $port (PID: $pid)"
@@ -35,7 +49,7 @@ sleep 2
 
 # Force kill if still running
 echo "Checking for remaining processes..."
-for port in 8001 8002 8003; do
+for port in $PORTS; do
     pid=$(lsof -ti:$port 2>/dev/null)
     if [ ! -z "$pid" ]; then
         echo "Force killing process on port $port (PID: $pid)"
@@ -43,4 +57,6 @@ for port in 8001 8002 8003; do
     fi
 done
 
+rm -f "$AGENT_REGISTRY_PATH"
+
 echo "All agent servers have been stopped." 
\ No newline at end of file
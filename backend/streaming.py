@@ -0,0 +1,28 @@
+# streaming.py
+"""
+Helpers for the progress events streamed from the agents to the `/query/stream` endpoint.
+
+Every chunk travelling over the A2A streaming hops is a JSON-encoded object with an
+``event`` name and a ``data`` payload, so the manager can forward specialist
+chunks untouched and `main.py` can write them out as NDJSON lines.
+"""
+
+import json
+
+
+def stream_event(event: str, **data) -> str:
+    """Encode a progress event as a JSON string chunk."""
+    return json.dumps({"event": event, "data": data})
+
+
+def parse_stream_event(chunk) -> dict:
+    """Decode a streamed chunk, wrapping plain text from non-streaming agents as a `final` event."""
+    if isinstance(chunk, dict):
+        return chunk if "event" in chunk else {"event": "final", "data": chunk}
+    try:
+        event = json.loads(chunk)
+    except (TypeError, ValueError):
+        event = None
+    if isinstance(event, dict) and "event" in event:
+        return event
+    return {"event": "final", "data": {"text": str(chunk)}}
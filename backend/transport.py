@@ -0,0 +1,224 @@
+# transport.py
+"""
+Shared async transport for agent-to-agent (A2A) calls.
+
+`python_a2a.A2AClient` opens a new HTTP connection for every message and runs
+synchronously (its `send_message_async` just hands the call to a thread pool),
+so every hop under concurrency pays connection setup and waits for a free
+worker thread. `AgentClient` instead posts to the agent's `/a2a` and `/stream`
+routes through one process-wide `httpx.AsyncClient` with a keep-alive
+connection pool, per-hop timeouts and deadline propagation. With
+``A2A_HTTP2=true`` (and the `h2` package installed) requests to HTTP/2 capable
+servers are multiplexed over a few connections instead of queueing for one.
+
+Deadlines travel as an absolute UNIX timestamp in the message metadata
+(``custom_fields["deadline"]``). Every hop caps its timeout at the time left and
+fails fast once the deadline has passed. A research token budget travels the
+same way (``custom_fields["token_budget"]``) down to the research graph, as does
+the research thread id (``custom_fields["thread_id"]``) that keys its checkpoints.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+from python_a2a import Message, Metadata
+
+from agent.instrumentation import A2A_HOP_SECONDS, inject_trace_context
+
+A2A_POOL_SIZE = int(os.getenv("A2A_POOL_SIZE", "200"))
+A2A_KEEPALIVE_CONNECTIONS = int(os.getenv("A2A_KEEPALIVE_CONNECTIONS", "100"))
+A2A_KEEPALIVE_EXPIRY = float(os.getenv("A2A_KEEPALIVE_EXPIRY", "30"))
+A2A_CONNECT_TIMEOUT = float(os.getenv("A2A_CONNECT_TIMEOUT", "5"))
+A2A_TIMEOUT = float(os.getenv("A2A_TIMEOUT", "300"))
+A2A_HTTP2 = os.getenv("A2A_HTTP2", "false").lower() == "true"
+
+DEADLINE_FIELD = "deadline"
+TOKEN_BUDGET_FIELD = "token_budget"
+THREAD_ID_FIELD = "thread_id"
+
+_client: Optional[httpx.AsyncClient] = None
+
+# httpx logs every request at INFO, which would mean a line per hop and health check
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("[transport] A2A_HTTP2 is set but 'h2' is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled HTTP client used for A2A calls."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=A2A_POOL_SIZE,
+                max_keepalive_connections=A2A_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=A2A_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(A2A_TIMEOUT, connect=A2A_CONNECT_TIMEOUT),
+            http2=A2A_HTTP2 and _http2_available(),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the pooled HTTP client (on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def message_deadline(message: Message) -> Optional[float]:
+    """Return the absolute deadline carried by a message, if any."""
+    custom_fields = getattr(message.metadata, "custom_fields", None) or {}
+    deadline = custom_fields.get(DEADLINE_FIELD)
+    return float(deadline) if deadline is not None else None
+
+
+def message_token_budget(message: Message) -> Optional[int]:
+    """Return the research token budget carried by a message, if any."""
+    custom_fields = getattr(message.metadata, "custom_fields", None) or {}
+    token_budget = custom_fields.get(TOKEN_BUDGET_FIELD)
+    return int(token_budget) if token_budget is not None else None
+
+
+def message_thread_id(message: Message) -> Optional[str]:
+    """Return the research thread id carried by a message, if any."""
+    custom_fields = getattr(message.metadata, "custom_fields", None) or {}
+    thread_id = custom_fields.get(THREAD_ID_FIELD)
+    return str(thread_id) if thread_id else None
+
+
+def _with_context(
+    message: Message,
+    deadline: Optional[float],
+    token_budget: Optional[int] = None,
+    thread_id: Optional[str] = None,
+) -> Message:
+    """Attach the trace context, deadline, token budget and thread id to an outgoing message."""
+    if message.metadata is None:
+        message.metadata = Metadata()
+    custom_fields = message.metadata.custom_fields
+    custom_fields.update(inject_trace_context())
+    if deadline is not None:
+        custom_fields[DEADLINE_FIELD] = deadline
+    if token_budget is not None:
+        custom_fields[TOKEN_BUDGET_FIELD] = token_budget
+    if thread_id is not None:
+        custom_fields[THREAD_ID_FIELD] = thread_id
+    return message
+
+
+def _parse_message(data: dict) -> Message:
+    if "error" in data and "content" not in data and "parts" not in data:
+        raise RuntimeError(f"Agent error: {data['error']}")
+    # Agents with Google A2A compatibility answer in the `parts` format
+    if "parts" in data and "content" not in data:
+        return Message.from_google_a2a(data)
+    return Message.from_dict(data)
+
+
+class AgentClient:
+    """Async A2A client for one agent endpoint on the shared connection pool.
+
+    Args:
+        endpoint_url: Base URL of the agent server, e.g. ``http://127.0.0.1:8002``.
+        hop: Name of the hop in the A2A latency metrics, e.g. ``main->manager``.
+        timeout: Timeout of this hop in seconds, defaults to A2A_TIMEOUT.
+    """
+
+    def __init__(self, endpoint_url: str, hop: str, timeout: float = A2A_TIMEOUT):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.hop = hop
+        self.timeout = timeout
+
+    def _timeout(self, deadline: Optional[float]) -> httpx.Timeout:
+        remaining = self.timeout
+        if deadline is not None:
+            remaining = min(remaining, deadline - time.time())
+            if remaining <= 0:
+                raise TimeoutError(f"Deadline exceeded before calling {self.hop}")
+        return httpx.Timeout(remaining, connect=min(A2A_CONNECT_TIMEOUT, remaining))
+
+    async def send_message(
+        self,
+        message: Message,
+        deadline: Optional[float] = None,
+        token_budget: Optional[int] = None,
+        thread_id: Optional[str] = None,
+    ) -> Message:
+        """Send a message to the agent and return its response.
+
+        Args:
+            message: The message to send.
+            deadline: Optional absolute UNIX time by which the answer is needed.
+            token_budget: Optional token budget of a research run.
+            thread_id: Optional id of the research run's checkpoints.
+        """
+        timeout = self._timeout(deadline)
+        payload = _with_context(message, deadline, token_budget, thread_id).to_dict()
+        started = time.perf_counter()
+        try:
+            response = await get_http_client().post(
+                f"{self.endpoint_url}/a2a", json=payload, timeout=timeout
+            )
+            response.raise_for_status()
+            return _parse_message(response.json())
+        finally:
+            A2A_HOP_SECONDS.observe(time.perf_counter() - started, hop=self.hop)
+
+    async def stream_response(
+        self,
+        message: Message,
+        deadline: Optional[float] = None,
+        token_budget: Optional[int] = None,
+        thread_id: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Stream the chunks of the agent's `stream_response` for a message.
+
+        Args:
+            message: The message to send.
+            deadline: Optional absolute UNIX time by which the stream must end.
+            token_budget: Optional token budget of a research run.
+            thread_id: Optional id of the research run's checkpoints.
+        """
+        timeout = self._timeout(deadline)
+        payload = _with_context(message, deadline, token_budget, thread_id).to_dict()
+        started = time.perf_counter()
+        try:
+            async with get_http_client().stream(
+                "POST",
+                f"{self.endpoint_url}/stream",
+                json=payload,
+                headers={"Accept": "text/event-stream"},
+                timeout=timeout,
+            ) as response:
+                response.raise_for_status()
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[len("event:") :].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[len("data:") :])
+                        if event == "error" or "error" in data:
+                            raise RuntimeError(f"Agent stream error: {data.get('error')}")
+                        if data.get("lastChunk"):
+                            return
+                        yield data["content"]
+                    elif not line:
+                        event = None
+        finally:
+            A2A_HOP_SECONDS.observe(
+                time.perf_counter() - started, hop=f"{self.hop}_stream"
+            )